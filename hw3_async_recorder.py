@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Asynchronous case recorder
+
+AsyncRecorder is a case recorder for the wing optimizations, used with
+"recorder_type": "async" in a case specification (om.SqliteRecorder is the
+default). The driver only copies the recorded arrays into a queue; a
+background thread writes them to an SQLite file in batched transactions,
+each array as the raw bytes of its values (dtype and shape are stored once
+per variable), instead of one pickled/JSON row per case.
+
+The file has its own schema, which om.CaseReader cannot open: it is read
+with read_async_records, hw3_restart.read_driver_cases or hw3_columnar.
+Every recorder writes its own file, named after the process and the
+recorder (e.g. aero_12345_0.db), so cases run at the same time never
+share a database.
+
+    python hw3_async_recorder.py
+
+prints the time per driver iteration added by each recorder.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import atexit
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from openmdao.core.driver import Driver
+from openmdao.core.problem import Problem
+from openmdao.recorders.case_recorder import CaseRecorder
+from openmdao.solvers.solver import Solver
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata(key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS variables(id INTEGER PRIMARY KEY, kind TEXT, name TEXT, dtype TEXT, shape TEXT,
+                                     UNIQUE(kind, name, dtype, shape));
+CREATE TABLE IF NOT EXISTS records(id INTEGER PRIMARY KEY, counter INTEGER, kind TEXT, source TEXT,
+                                   iteration_coordinate TEXT, timestamp REAL, success INTEGER, msg TEXT);
+CREATE TABLE IF NOT EXISTS vals(record_id INTEGER, var_id INTEGER, data BLOB,
+                                PRIMARY KEY(record_id, var_id)) WITHOUT ROWID;
+"""
+
+# Numbers the files of the recorders created by this process
+_file_ids = itertools.count()
+
+# Marks the end of the queue
+_STOP = object()
+
+
+def unique_filename(filename):
+    """
+    Return a file name unique to this process and call, e.g. aero.db -> aero_<pid>_<n>.db.
+
+    Parameters
+    ----------
+    filename : str
+        Base file name.
+
+    Returns
+    -------
+    str
+        Unique file name.
+    """
+    root, ext = os.path.splitext(filename)
+    return "%s_%d_%d%s" % (root, os.getpid(), next(_file_ids), ext or ".db")
+
+
+class AsyncRecorder(CaseRecorder):
+    """
+    Case recorder that writes to SQLite from a background thread.
+
+    The recorded values are copied when a case is recorded, so the model can
+    keep running while they are written. Call flush() to wait for the
+    pending cases; shutdown() (called by Problem.cleanup) also waits for
+    them and closes the file.
+
+    Parameters
+    ----------
+    filepath : str
+        Database file. Without a directory it goes to the outputs directory
+        of the problem, like the files of om.SqliteRecorder.
+    unique : bool
+        If True, add the process id and a counter to the file name, see unique_filename.
+    batch_size : int
+        Maximum number of cases written in one transaction.
+    flush_interval : float
+        Maximum time, in seconds, a case waits in the queue before a
+        transaction is written.
+    record_viewer_data : bool
+        Accepted for compatibility with om.SqliteRecorder, the viewer data is not recorded.
+    """
+
+    def __init__(self, filepath, unique=True, batch_size=64, flush_interval=0.5, record_viewer_data=False):
+        super().__init__(record_viewer_data=False)
+        self._filepath = unique_filename(filepath) if unique else filepath
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._error = None
+        self._abs2prom = {"input": {}, "output": {}}
+        self._voi = {"design_vars": {}, "objectives": {}, "constraints": {}}
+
+    @property
+    def filepath(self):
+        """
+        Path of the database file (final once the recorder is started).
+        """
+        return str(self._filepath)
+
+    def startup(self, recording_requester, comm=None):
+        """
+        Prepare for a new run and start the writer thread.
+
+        Parameters
+        ----------
+        recording_requester : object
+            Object to which this recorder is attached.
+        comm : MPI.Comm or <FakeComm> or None
+            The MPI communicator for the recorder (should be the comm for the Problem).
+        """
+        super().startup(recording_requester, comm)
+
+        if isinstance(recording_requester, Driver):
+            system = recording_requester._problem().model
+            driver = recording_requester
+        elif isinstance(recording_requester, Problem):
+            system = recording_requester.model
+            driver = recording_requester.driver
+        elif isinstance(recording_requester, Solver):
+            system = recording_requester._system()
+            driver = None
+        else:
+            system = recording_requester
+            driver = None
+
+        if self._thread is None:
+            if not os.path.dirname(self.filepath):
+                self._filepath = os.path.join(str(system.get_outputs_dir(mkdir=True)), self.filepath)
+            self._thread = threading.Thread(target=self._writer, name="AsyncRecorder", daemon=True)
+            self._thread.start()
+            # Pending cases are still written if the problem is not cleaned up
+            atexit.register(self.shutdown)
+
+        # Promoted names and design variables, objectives and constraints of the case
+        self._abs2prom["input"].update(system._resolver.abs2prom_iter("input"))
+        self._abs2prom["output"].update(system._resolver.abs2prom_iter("output"))
+        if driver is not None:
+            for key, vois in (("design_vars", driver._designvars), ("objectives", driver._objs),
+                              ("constraints", driver._cons)):
+                for name, meta in vois.items():
+                    self._voi[key][name] = {
+                        "source": meta["source"],
+                        "lower": _jsonable_bound(meta.get("lower")),
+                        "upper": _jsonable_bound(meta.get("upper")),
+                        "equals": _jsonable_bound(meta.get("equals")),
+                        "indices": None if meta.get("indices") is None else meta["indices"].as_array().tolist(),
+                    }
+        # Serialized here, the writer thread must not read dictionaries that can still change
+        metadata = {"abs2prom": self._abs2prom, **self._voi}
+        self._queue.put(("metadata", {key: json.dumps(val) for key, val in metadata.items()}))
+
+    def _put(self, kind, source, values, metadata):
+        if self._error is not None:
+            raise RuntimeError("AsyncRecorder failed writing '%s'." % self.filepath) from self._error
+        record = (self._counter, kind, source, self._iteration_coordinate,
+                  metadata.get("timestamp"), metadata.get("success"), metadata.get("msg"))
+        self._queue.put(("record", record, values))
+
+    def _copy_data(self, data):
+        values = []
+        for kind in ("output", "input", "residual"):
+            if data.get(kind):
+                values.extend((kind, name, np.array(val)) for name, val in data[kind].items())
+        return values
+
+    def record_iteration_driver(self, recording_requester, data, metadata):
+        """
+        Record data and metadata from a Driver.
+
+        Parameters
+        ----------
+        recording_requester : object
+            Driver in need of recording.
+        data : dict
+            Dictionary containing desvars, objectives, constraints, responses, and System vars.
+        metadata : dict
+            Dictionary containing execution metadata.
+        """
+        self._put("iteration", "driver", self._copy_data(data), metadata)
+
+    def record_iteration_system(self, recording_requester, data, metadata):
+        """
+        Record data and metadata from a System.
+
+        Parameters
+        ----------
+        recording_requester : System
+            System in need of recording.
+        data : dict
+            Dictionary containing inputs, outputs, and residuals.
+        metadata : dict
+            Dictionary containing execution metadata.
+        """
+        self._put("iteration", recording_requester.pathname, self._copy_data(data), metadata)
+
+    def record_iteration_solver(self, recording_requester, data, metadata):
+        """
+        Record data and metadata from a Solver.
+
+        Parameters
+        ----------
+        recording_requester : Solver
+            Solver in need of recording.
+        data : dict
+            Dictionary containing outputs, residuals, and errors.
+        metadata : dict
+            Dictionary containing execution metadata.
+        """
+        self._put("iteration", recording_requester.SOLVER, self._copy_data(data), metadata)
+
+    def record_iteration_problem(self, recording_requester, data, metadata):
+        """
+        Record data and metadata from a Problem.
+
+        Parameters
+        ----------
+        recording_requester : object
+            Problem in need of recording.
+        data : dict
+            Dictionary containing desvars, objectives, and constraints.
+        metadata : dict
+            Dictionary containing execution metadata.
+        """
+        self._put("iteration", "problem", self._copy_data(data), metadata)
+
+    def record_derivatives_driver(self, recording_requester, data, metadata):
+        """
+        Record derivatives data from a Driver.
+
+        Parameters
+        ----------
+        recording_requester : object
+            Driver in need of recording.
+        data : dict
+            Dictionary containing derivatives keyed by 'of!wrt' to be recorded.
+        metadata : dict
+            Dictionary containing execution metadata.
+        """
+        values = [("derivative", name, np.array(val)) for name, val in data.items()]
+        self._put("derivatives", "driver", values, metadata)
+
+    def record_metadata_system(self, system, run_number=None):
+        """
+        Record system metadata, not stored by this recorder.
+
+        Parameters
+        ----------
+        system : System
+            The System for which to record metadata.
+        run_number : int or None
+            Number indicating which run the metadata is associated with.
+        """
+        pass
+
+    def record_metadata_solver(self, solver, run_number=None):
+        """
+        Record solver metadata, not stored by this recorder.
+
+        Parameters
+        ----------
+        solver : Solver
+            The Solver for which to record metadata.
+        run_number : int or None
+            Number indicating which run the metadata is associated with.
+        """
+        pass
+
+    def record_viewer_data(self, model_viewer_data):
+        """
+        Record model viewer data, not stored by this recorder.
+
+        Parameters
+        ----------
+        model_viewer_data : dict
+            Data required to visualize the model.
+        """
+        pass
+
+    def flush(self):
+        """
+        Wait until every recorded case is written.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+        if self._error is not None:
+            raise RuntimeError("AsyncRecorder failed writing '%s'." % self.filepath) from self._error
+
+    def shutdown(self):
+        """
+        Write the pending cases and close the file.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._thread = None
+        atexit.unregister(self.shutdown)
+
+    def _writer(self):
+        try:
+            connection = sqlite3.connect(self.filepath)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+        except Exception as err:
+            # The queue is still emptied, so flush and shutdown return and raise the error
+            self._error = err
+            connection = None
+        var_ids = {}
+
+        stop = False
+        while not stop:
+            # Block for the first item, then take what is queued up to the batch size
+            items = [self._queue.get()]
+            try:
+                while len(items) < self._batch_size and items[-1] is not _STOP:
+                    items.append(self._queue.get(timeout=self._flush_interval))
+            except queue.Empty:
+                pass
+            # Decided before writing, a failed write must not leave the thread waiting forever
+            stop = any(item is _STOP for item in items)
+
+            try:
+                if self._error is None:
+                    with connection:
+                        for item in items:
+                            if item is _STOP:
+                                continue
+                            if item[0] == "metadata":
+                                connection.executemany("INSERT OR REPLACE INTO metadata(key, value) VALUES(?, ?)",
+                                                       list(item[1].items()))
+                            else:
+                                self._write_record(connection, var_ids, item[1], item[2])
+            except Exception as err:
+                self._error = err
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+        if connection is not None:
+            connection.close()
+
+    @staticmethod
+    def _write_record(connection, var_ids, record, values):
+        record_id = connection.execute(
+            "INSERT INTO records(counter, kind, source, iteration_coordinate, timestamp, success, msg) "
+            "VALUES(?, ?, ?, ?, ?, ?, ?)", record).lastrowid
+
+        rows = []
+        for kind, name, val in values:
+            key = (kind, name, val.dtype.str, json.dumps(val.shape))
+            var_id = var_ids.get(key)
+            if var_id is None:
+                connection.execute("INSERT OR IGNORE INTO variables(kind, name, dtype, shape) VALUES(?, ?, ?, ?)", key)
+                var_id = var_ids[key] = connection.execute(
+                    "SELECT id FROM variables WHERE kind=? AND name=? AND dtype=? AND shape=?", key).fetchone()[0]
+            rows.append((record_id, var_id, val.tobytes()))
+
+        connection.executemany("INSERT INTO vals(record_id, var_id, data) VALUES(?, ?, ?)", rows)
+
+
+def _jsonable_bound(val):
+    if val is None:
+        return None
+    val = np.asarray(val)
+    return val.item() if val.size == 1 else val.tolist()
+
+
+def read_async_records(path, kind="iteration", source="driver"):
+    """
+    Read the cases of an AsyncRecorder file.
+
+    Parameters
+    ----------
+    path : str
+        Database file.
+    kind : str
+        "iteration" for the recorded cases, "derivatives" for the recorded totals.
+    source : str
+        Recording source, "driver" for the driver cases.
+
+    Returns
+    -------
+    records : list of dict
+        Counter, iteration coordinate, timestamp, success and message of each case,
+        with its values in 'outputs', 'inputs', 'residuals' or 'derivatives' (by absolute name).
+    metadata : dict
+        Promoted names (abs2prom) and design variables, objectives and constraints.
+    """
+    connection = sqlite3.connect(path)
+    try:
+        metadata = {key: json.loads(val) for key, val in connection.execute("SELECT key, value FROM metadata")}
+        variables = {var_id: (var_kind, name, np.dtype(dtype), tuple(json.loads(shape)))
+                     for var_id, var_kind, name, dtype, shape in
+                     connection.execute("SELECT id, kind, name, dtype, shape FROM variables")}
+
+        records = {}
+        for row in connection.execute("SELECT id, counter, iteration_coordinate, timestamp, success, msg FROM records "
+                                      "WHERE kind=? AND source=? ORDER BY id", (kind, source)):
+            records[row[0]] = {"counter": row[1], "iteration_coordinate": row[2], "timestamp": row[3],
+                               "success": row[4], "msg": row[5],
+                               "outputs": {}, "inputs": {}, "residuals": {}, "derivatives": {}}
+
+        for record_id, var_id, data in connection.execute(
+                "SELECT vals.record_id, vals.var_id, vals.data FROM vals JOIN records ON records.id = vals.record_id "
+                "WHERE records.kind=? AND records.source=?", (kind, source)):
+            var_kind, name, dtype, shape = variables[var_id]
+            records[record_id][var_kind + "s"][name] = np.frombuffer(data, dtype=dtype).reshape(shape)
+    finally:
+        connection.close()
+
+    return list(records.values()), metadata
+
+
+def measure_recording_overhead(spec, repeats=3):
+    """
+    Measure the time per driver iteration added by recording a wing optimization.
+
+    Parameters
+    ----------
+    spec : dict
+        Case specification of hw3_wing_builder, with a driver.
+    repeats : int
+        Number of optimizations of each recorder, the median is reported.
+
+    Returns
+    -------
+    result : dict
+        For no recorder, "sqlite" and "async": median optimization time and time
+        per driver iteration.
+    """
+    from hw3_wing_builder import build_problem, complete_spec, set_case_values
+
+    recorders = (("none", None, "sqlite"), ("sqlite", "overhead.db", "sqlite"), ("async", "overhead.db", "async"))
+    times = {name: [] for name, _, _ in recorders}
+    iterations = {}
+    # The recorders take turns, so a slower machine state does not favour any of them
+    for _ in range(repeats):
+        for name, recorder, recorder_type in recorders:
+            case = complete_spec(spec)
+            case["recorder"] = recorder
+            case["recorder_type"] = recorder_type
+            prob = build_problem(case, headless=True, snapshot=False)
+            prob.setup()
+            set_case_values(prob, case)
+            prob.final_setup()
+
+            start = time.perf_counter()
+            prob.run_driver()
+            # Everything recorded must be on disk, so the time of the writer thread is counted
+            for recorder_obj in prob.driver._rec_mgr:
+                if isinstance(recorder_obj, AsyncRecorder):
+                    recorder_obj.flush()
+            times[name].append(time.perf_counter() - start)
+
+            iterations[name] = prob.driver.iter_count
+            prob.cleanup()
+
+    result = {}
+    for name, _, _ in recorders:
+        result[name] = {"time": float(np.median(times[name])), "iterations": iterations[name],
+                        "per_iteration": float(np.median(times[name])) / max(iterations[name], 1)}
+
+    return result
+
+
+if __name__ == "__main__":
+    # Twist and alpha optimization of hw3_p3b2.py
+    spec = {
+        "mesh": {"num_y": 21, "num_x": 5, "wing_type": "rect", "symmetry": True, "num_twist_cp": 5},
+        "surface": {"twist_cp": np.zeros(5)},
+        "design_vars": {"wing.twist_cp": {"lower": -50.0, "upper": 50.0},
+                        "alpha": {"lower": -50.0, "upper": 50.0}},
+        "constraints": {"aero_point_0.wing_perf.CL": {"equals": 0.5}},
+        "objective": {"aero_point_0.wing_perf.CD": {"scaler": 1e4}},
+    }
+
+    result = measure_recording_overhead(spec)
+    base = result["none"]["per_iteration"]
+    print("%10s %10s %6s %14s %14s %10s" % ("recorder", "time [s]", "iter", "per iter [ms]", "overhead [ms]",
+                                            "overhead"))
+    for name, entry in result.items():
+        print("%10s %10.3f %6d %14.3f %14.3f %9.1f%%" % (
+            name, entry["time"], entry["iterations"], 1e3 * entry["per_iteration"],
+            1e3 * (entry["per_iteration"] - base), 100.0 * (entry["per_iteration"] / base - 1.0)))
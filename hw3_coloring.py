@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Total derivative coloring and derivative mode of the wing cases
+
+The wing builder sets its problems up in the derivative mode of the case
+specification ("auto" by default: reverse when there are fewer responses
+than design variable entries, forward otherwise) and, with "coloring": True,
+computes the total Jacobian coloring once per case structure and keeps it
+in an on-disk cache, so it is not recomputed on every run_driver (as a
+dynamic coloring of the driver would be). A coloring that needs as many
+linear solves as the dense Jacobian is recorded as such and never applied.
+The cache files are keyed on the case structure, the derivative mode, the
+numpy, scipy, OpenMDAO and OpenAeroStruct versions and the source of the
+classes of the model, so a change of any of them computes a new coloring.
+
+    python hw3_coloring.py
+
+prints the compute_totals time of a wing case in both modes, with and
+without coloring.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import hashlib
+import inspect
+import os
+import time
+
+import numpy as np
+import openaerostruct
+import openmdao
+import scipy
+from openmdao.utils.coloring import Coloring, compute_total_coloring
+
+# Directory of the cached colorings, can be changed with the HW3_COLORING_CACHE
+# environment variable
+COLORING_DIR = os.environ.get("HW3_COLORING_CACHE", ".coloring_cache")
+
+# Suffix of the marker of a case structure without a useful coloring
+DENSE_MARKER = ".dense"
+
+
+def derivative_sizes(prob):
+    """
+    Return the sizes of the design variables and responses of a set-up problem.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Set-up problem.
+
+    Returns
+    -------
+    desvar_size : int
+        Total size of the design variables (columns of the total Jacobian).
+    response_size : int
+        Total size of the objectives and constraints (rows of the total Jacobian).
+    """
+    desvar_size = sum(meta["size"] for meta in prob.model.get_design_vars(get_sizes=True).values())
+    response_size = sum(meta["size"] for meta in prob.model.get_responses(get_sizes=True).values())
+    return desvar_size, response_size
+
+
+def derivative_mode(prob):
+    """
+    Return the derivative mode of a set-up problem.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Set-up problem, mode 'auto' is resolved at final_setup.
+
+    Returns
+    -------
+    str
+        'fwd' or 'rev'.
+    """
+    prob.final_setup()
+    return prob._mode
+
+
+def is_useful(coloring, dense_solves):
+    """
+    Return whether a coloring needs fewer linear solves than the dense total Jacobian.
+
+    Parameters
+    ----------
+    coloring : Coloring or None
+        Total coloring.
+    dense_solves : int
+        Linear solves of the dense total Jacobian in the derivative mode of the problem.
+
+    Returns
+    -------
+    bool
+        True if the coloring saves linear solves.
+    """
+    return coloring is not None and coloring.total_solves() < dense_solves
+
+
+def model_fingerprint(prob):
+    """
+    Return the hash of the package versions and of the source of the classes of a model.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Set-up problem.
+
+    Returns
+    -------
+    str
+        Hexadecimal hash of the numpy, scipy, OpenMDAO and OpenAeroStruct
+        versions and of the source files of every class of the systems of
+        the model (and of their base classes).
+    """
+    files = set()
+    for system in prob.model.system_iter(recurse=True, include_self=True):
+        for cls in type(system).__mro__[:-1]:
+            try:
+                files.add(inspect.getsourcefile(cls))
+            except TypeError:
+                pass
+
+    digest = hashlib.sha256()
+    for package in (np, scipy, openmdao, openaerostruct):
+        digest.update(("%s %s\n" % (package.__name__, package.__version__)).encode("utf-8"))
+    for path in sorted(path for path in files if path is not None):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:32]
+
+
+def coloring_file(key, mode, fingerprint):
+    """
+    Return the cache file of the coloring of a case structure.
+
+    Parameters
+    ----------
+    key : str
+        setup_key of the case.
+    mode : str
+        Derivative mode of the problem.
+    fingerprint : str
+        model_fingerprint of the problem.
+
+    Returns
+    -------
+    str
+        Pickle file in COLORING_DIR.
+    """
+    return os.path.join(COLORING_DIR, "%s_%s_%s.pkl" % (key, mode, fingerprint))
+
+
+def apply_total_coloring(prob, key):
+    """
+    Use the cached total coloring of a case structure on a problem, computing it if needed.
+
+    The coloring is computed from the current values of the problem (the
+    model is run once) and cached, or a marker is written if it saves no
+    linear solves, so the check is done once per case structure.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Set-up problem with its case values set.
+    key : str
+        setup_key of the case.
+
+    Returns
+    -------
+    Coloring or None
+        Coloring used by the driver, None if the dense total Jacobian is used.
+    """
+    mode = derivative_mode(prob)
+    path = coloring_file(key, mode, model_fingerprint(prob))
+
+    if os.path.isfile(path + DENSE_MARKER):
+        return None
+    if os.path.isfile(path):
+        coloring = Coloring.load(path)
+    else:
+        coloring = compute_total_coloring(prob, mode=mode, run_model=True)
+        os.makedirs(COLORING_DIR, exist_ok=True)
+        desvar_size, response_size = derivative_sizes(prob)
+        if is_useful(coloring, desvar_size if mode == "fwd" else response_size):
+            coloring.save(path)
+        else:
+            open(path + DENSE_MARKER, "w").close()
+            coloring = None
+
+    if coloring is not None:
+        prob.driver.use_fixed_coloring(coloring)
+    return coloring
+
+
+def measure_totals_speedup(spec, repeats=5):
+    """
+    Measure the compute_totals time of a wing case in both modes, with and without coloring.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification of hw3_wing_builder.
+    repeats : int
+        Number of compute_totals of each variant, the median is reported.
+
+    Returns
+    -------
+    result : dict
+        Design variable and response sizes, the 'auto' mode, and for every
+        (mode, coloring) variant the median time and the linear solves.
+    """
+    from hw3_wing_builder import build_problem, complete_spec, set_case_values
+
+    spec = complete_spec(spec)
+    spec["recorder"] = None
+
+    result = {"variants": {}}
+    for mode in ("fwd", "rev"):
+        for colored in (False, True):
+            prob = build_problem(spec, headless=True, snapshot=False)
+            prob.setup(mode=mode)
+            set_case_values(prob, spec)
+            prob.final_setup()
+            result["desvar_size"], result["response_size"] = derivative_sizes(prob)
+
+            solves = result["desvar_size"] if mode == "fwd" else result["response_size"]
+            coloring_time = 0.0
+            if colored:
+                start = time.perf_counter()
+                coloring = compute_total_coloring(prob, mode=mode, run_model=True)
+                coloring_time = time.perf_counter() - start
+                if coloring is not None:
+                    prob.driver.use_fixed_coloring(coloring)
+                    solves = coloring.total_solves()
+                prob.final_setup()
+
+            prob.run_model()
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                prob.driver._compute_totals()
+                samples.append(time.perf_counter() - start)
+
+            result["variants"][(mode, colored)] = {"time": float(np.median(samples)), "solves": solves,
+                                                   "coloring_time": coloring_time}
+            prob.cleanup()
+
+    result["auto_mode"] = "rev" if result["response_size"] < result["desvar_size"] else "fwd"
+    return result
+
+
+if __name__ == "__main__":
+    # Problem 3 d) on a 11 x 3 mesh
+    spec = {
+        "mesh": {"num_y": 11, "num_x": 3, "wing_type": "rect", "symmetry": True},
+        "surface": {"sweep": 10, "span": 10.0, "twist_cp": np.zeros(10), "chord_cp": np.ones(10)},
+        "sweep_constraint": {"lower": 0, "upper": 1},
+        "design_vars": {"wing.chord_cp": {"lower": 0.5, "upper": 1},
+                        "wing.twist_cp": {"lower": -15.0, "upper": 15.0},
+                        "alpha": {"lower": -50.0, "upper": 50.0},
+                        "wing.sweep": {"lower": 0, "upper": 15},
+                        "wing.span": {"lower": 0.1, "upper": 20}},
+        "constraints": {"aero_point_0.wing_perf.CL": {"equals": 0.5}},
+        "objective": {"aero_point_0.wing_perf.CD": {"scaler": 1e4}},
+    }
+
+    result = measure_totals_speedup(spec)
+    print("Design variables: %d, responses: %d, auto mode: %s" % (
+        result["desvar_size"], result["response_size"], result["auto_mode"]))
+    slowest = max(variant["time"] for variant in result["variants"].values())
+    for (mode, colored), variant in result["variants"].items():
+        print("%-4s %-12s %3d solves  %8.4f s  (%.1fx)  coloring %.3f s" % (
+            mode, "colored" if colored else "dense", variant["solves"], variant["time"],
+            slowest / variant["time"], variant["coloring_time"]))
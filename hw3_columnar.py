@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Columnar export of recorded optimization histories
+
+export_history turns the driver cases of a recorded run (AsyncRecorder or
+om.SqliteRecorder file) into one .npy file per variable, with the
+iterations along axis 0, plus a manifest.json. load_history opens them as
+memory maps, so a history is read without unpickling a single case:
+
+    history = load_history(export_history("hw3_p3b2_out/aero_1234_0.db"))
+    history["aero_point_0.wing_perf.CD"][:, 0]
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import json
+import os
+import re
+import sqlite3
+
+import numpy as np
+from hw3_async_recorder import read_async_records
+
+# Name of the manifest of an exported history
+MANIFEST = "manifest.json"
+
+# Columns of every export besides the variables
+COUNTER = "_counter"
+SUCCESS = "_success"
+
+
+def recorder_format(path):
+    """
+    Return the format of a recorder file.
+
+    Parameters
+    ----------
+    path : str
+        Recorder file.
+
+    Returns
+    -------
+    str
+        "async" for AsyncRecorder files, "sqlite" for om.SqliteRecorder files.
+    """
+    connection = sqlite3.connect(path)
+    try:
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    finally:
+        connection.close()
+
+    if "vals" in tables:
+        return "async"
+    if "driver_iterations" in tables:
+        return "sqlite"
+    raise ValueError("'%s' is not a case recorder file." % path)
+
+
+def _read_async(path, variables):
+    records, metadata = read_async_records(path)
+    abs2prom = metadata.get("abs2prom", {"input": {}, "output": {}})
+
+    # Variables of the driver, by the name they were added with
+    sources = {}
+    for key in ("design_vars", "objectives", "constraints"):
+        for name, meta in metadata.get(key, {}).items():
+            sources[name] = ("outputs", meta["source"])
+    if variables is None:
+        variables = list(sources)
+
+    prom2abs = {}
+    for io in ("input", "output"):
+        for abs_name, prom in abs2prom.get(io, {}).items():
+            prom2abs.setdefault(prom, (io + "s", abs_name))
+
+    columns = {COUNTER: [], SUCCESS: []}
+    columns.update((name, []) for name in variables)
+    for record in records:
+        columns[COUNTER].append(record["counter"])
+        columns[SUCCESS].append(record["success"])
+        for name in variables:
+            io, abs_name = sources.get(name) or prom2abs.get(name) or ("outputs", name)
+            if abs_name not in record[io] and io == "outputs":
+                io = "inputs"
+            if abs_name not in record[io]:
+                raise KeyError("Variable '%s' is not recorded in '%s'." % (name, path))
+            columns[name].append(record[io][abs_name])
+    return columns
+
+
+def _read_sqlite(path, variables):
+    import openmdao.api as om
+
+    reader = om.CaseReader(path)
+    cases = reader.get_cases("driver", recurse=False)
+
+    if variables is None:
+        variables = []
+        if cases:
+            for vois in (cases[0].get_design_vars(), cases[0].get_objectives(), cases[0].get_constraints()):
+                variables.extend(name for name in vois if name not in variables)
+
+    columns = {COUNTER: [], SUCCESS: []}
+    columns.update((name, []) for name in variables)
+    for case in cases:
+        columns[COUNTER].append(case.counter)
+        columns[SUCCESS].append(case.success)
+        for name in variables:
+            columns[name].append(case[name])
+    return columns
+
+
+def _filename(name):
+    return re.sub(r"[^A-Za-z0-9_.\-]", "_", name) + ".npy"
+
+
+def read_columns(path, variables=None):
+    """
+    Read the driver cases of a recorder file as one list of values per variable.
+
+    Parameters
+    ----------
+    path : str
+        AsyncRecorder or om.SqliteRecorder file.
+    variables : list of str or None
+        Promoted (or absolute) names of the variables. The design variables,
+        objectives and constraints of the driver if None.
+
+    Returns
+    -------
+    columns : dict
+        Values of every variable by name, one per case, with the iteration
+        counters in '_counter' and the success flags in '_success'.
+    """
+    if recorder_format(path) == "async":
+        return _read_async(path, variables)
+    return _read_sqlite(path, variables)
+
+
+def export_history(path, out_dir=None, variables=None):
+    """
+    Export the driver cases of a recorder file as one .npy file per variable.
+
+    Parameters
+    ----------
+    path : str
+        AsyncRecorder or om.SqliteRecorder file.
+    out_dir : str or None
+        Export directory, the recorder file name without extension if None.
+    variables : list of str or None
+        Promoted (or absolute) names of the exported variables. The design
+        variables, objectives and constraints of the driver if None.
+
+    Returns
+    -------
+    str
+        Export directory.
+    """
+    if out_dir is None:
+        out_dir = os.path.splitext(path)[0]
+
+    return write_columns(read_columns(path, variables), out_dir, source=os.path.abspath(path),
+                         fmt=recorder_format(path))
+
+
+def write_columns(columns, out_dir, source=None, fmt=None):
+    """
+    Write columns of values as one .npy file per variable and a manifest.
+
+    Parameters
+    ----------
+    columns : dict
+        Values of every variable by name, one per iteration, with '_counter' and '_success'.
+    out_dir : str
+        Export directory.
+    source : str or list of str or None
+        Recorder file(s) of the values, for the manifest.
+    fmt : str or None
+        Format of the recorder file, for the manifest.
+
+    Returns
+    -------
+    str
+        Export directory.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = {"source": source, "format": fmt, "num_iterations": len(columns[COUNTER]), "variables": {}}
+    for name, values in columns.items():
+        array = np.array(values)
+        filename = _filename(name)
+        np.save(os.path.join(out_dir, filename), array)
+        manifest["variables"][name] = {"file": filename, "shape": list(array.shape), "dtype": array.dtype.str}
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return out_dir
+
+
+def load_history(out_dir, mmap_mode="r"):
+    """
+    Open an exported history.
+
+    Parameters
+    ----------
+    out_dir : str
+        Export directory written by export_history.
+    mmap_mode : str or None
+        Memory-map mode of np.load, None to read the arrays into memory.
+
+    Returns
+    -------
+    history : dict
+        Array of every variable (iterations along axis 0), by name, with the
+        iteration counters in '_counter' and the success flags in '_success'.
+    """
+    with open(os.path.join(out_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    return {name: np.load(os.path.join(out_dir, entry["file"]), mmap_mode=mmap_mode)
+            for name, entry in manifest["variables"].items()}
+
+
+def merge_histories(out_dirs, out_dir):
+    """
+    Concatenate exported histories with the same variables into one.
+
+    Parameters
+    ----------
+    out_dirs : list of str
+        Export directories, in order.
+    out_dir : str
+        Export directory of the merged history.
+
+    Returns
+    -------
+    str
+        Export directory of the merged history.
+    """
+    histories = [load_history(path) for path in out_dirs]
+    sources = []
+    for path in out_dirs:
+        with open(os.path.join(path, MANIFEST)) as f:
+            sources.append(json.load(f)["source"])
+
+    histories = [history for history in histories if len(history[COUNTER])] or histories[:1]
+    columns = {name: np.concatenate([history[name] for history in histories]) for name in histories[0]}
+    return write_columns(columns, out_dir, source=sources, fmt="merged")
+
+
+def stack_histories(out_dirs, name, fill=np.nan):
+    """
+    Stack a variable of several exported histories in one array.
+
+    Parameters
+    ----------
+    out_dirs : list of str
+        Export directories.
+    name : str
+        Variable name.
+    fill : float
+        Value of the iterations after the end of the shorter runs.
+
+    Returns
+    -------
+    numpy array
+        Shape (num_runs, max_iterations, *variable_shape).
+    """
+    arrays = [load_history(out_dir)[name] for out_dir in out_dirs]
+    num_iterations = max(len(array) for array in arrays)
+
+    stacked = np.full((len(arrays), num_iterations) + arrays[0].shape[1:], fill)
+    for i, array in enumerate(arrays):
+        stacked[i, :len(array)] = array
+    return stacked
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("usage: python hw3_columnar.py <recorder file> [variable ...]")
+        sys.exit(1)
+
+    out_dir = export_history(sys.argv[1], variables=sys.argv[2:] or None)
+    for name, array in load_history(out_dir).items():
+        print("%-50s %s" % (name, array.shape))
+    print("History written to %s" % out_dir)
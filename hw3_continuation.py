@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Coarse-to-fine continuation of the wing optimizations
+
+The optimization is first run on a coarse mesh, and its optimum (control
+points and flight design variables) is the starting point of the same
+optimization on the next, finer mesh, so the expensive high-resolution
+optimization only needs a few iterations.
+
+Every level keeps the control points of the case, only the mesh changes,
+so the optimum of a level is a start of the next one with the same
+parametrization:
+
+    prob, history = run_continuation(spec, levels=[21, 101])
+
+Problem 3 b) iv) uses it: its 101 x 5 optimization takes 105 iterations
+from the 21 x 5 optimum instead of 174 from the flat design, to the same
+optimum. When the optimization of a level fails from the previous
+optimum, it is run again from the initial design of the case, and
+run_continuation raises an error when the finest level still fails. A
+mesh with fewer spanwise nodes than control points is a poor level: the
+11 x 5 optimization of problem 3 b) iv) stops at the iteration limit.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import copy
+import time
+import warnings
+
+import numpy as np
+from hw3_wing_builder import DEFAULT_SURFACE, GEOMETRY_INPUTS, build_case, complete_spec
+
+# Default mesh sizes (num_y) of the continuation
+LEVELS = [21, 101]
+
+
+def interpolate_cp(values, num_cp):
+    """
+    Interpolate control point values onto a different number of control points.
+
+    The control points are taken as equally spaced over the normalized span,
+    as in the B-splines of OpenAeroStruct.
+
+    Parameters
+    ----------
+    values : array_like
+        Control point values.
+    num_cp : int
+        Number of control points wanted.
+
+    Returns
+    -------
+    numpy array
+        Control point values, shape (num_cp,).
+    """
+    values = np.atleast_1d(np.asarray(values, dtype=float)).ravel()
+    if len(values) == num_cp:
+        return values.copy()
+    if len(values) == 1:
+        return np.full(num_cp, values[0])
+    return np.interp(np.linspace(0.0, 1.0, num_cp), np.linspace(0.0, 1.0, len(values)), values)
+
+
+def transfer_design(prob, spec):
+    """
+    Return a case specification starting from the design variables of an optimized problem.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Optimized problem.
+    spec : dict
+        Full case specification of the next level.
+
+    Returns
+    -------
+    dict
+        Copy of spec with the initial geometry and flight conditions taken
+        from the design variables of prob.
+    """
+    spec = copy.deepcopy(spec)
+    name = spec["surface"].get("name", DEFAULT_SURFACE["name"])
+
+    for var in spec["design_vars"]:
+        val = prob.get_val(var)
+        local = var[len(name) + 1:] if var.startswith(name + ".") else None
+        if local in GEOMETRY_INPUTS:
+            size = np.size(spec["surface"].get(local, DEFAULT_SURFACE.get(local, val)))
+            spec["surface"][local] = interpolate_cp(val, size) if size > 1 else float(np.ravel(val)[0])
+        elif var in spec["flight"]:
+            spec["flight"][var] = val.copy() if np.size(spec["flight"][var]) > 1 else float(np.ravel(val)[0])
+
+    return spec
+
+
+def run_continuation(spec, levels=LEVELS, coarse_tol=None, verbose=True):
+    """
+    Optimize a wing case on a sequence of meshes, each level starting from the previous optimum.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification of hw3_wing_builder, its mesh
+        num_y is replaced by the levels.
+    levels : list of int
+        num_y of each level, coarse to fine.
+    coarse_tol : float or None
+        Optimizer tolerance of all the levels but the last, the tolerance of spec if None.
+    verbose : bool
+        If True, print the result of every level.
+
+    Returns
+    -------
+    prob : om.Problem
+        Optimized problem of the finest level.
+    history : list of dict
+        num_y, transferred (True if started from the previous optimum), driver
+        iterations, time, C_D and success of every optimization run.
+
+    Raises
+    ------
+    RuntimeError
+        If the optimization of the finest level fails, its design is not a result.
+    """
+    spec = complete_spec(spec)
+    history = []
+    prob = None
+
+    for i, num_y in enumerate(levels):
+        level = copy.deepcopy(spec)
+        level["mesh"]["num_y"] = num_y
+        if coarse_tol is not None and i < len(levels) - 1:
+            level["driver"]["tol"] = coarse_tol
+        # The control points are the same on every level, only the mesh changes
+        starts = [level] if prob is None else [transfer_design(prob, level), level]
+
+        for transferred, start_spec in zip([prob is not None, False], starts):
+            start = time.perf_counter()
+            prob = build_case(start_spec)
+            prob.run_driver()
+            elapsed = time.perf_counter() - start
+
+            history.append({
+                "num_y": num_y,
+                "transferred": transferred,
+                "iterations": prob.driver.iter_count,
+                "time": elapsed,
+                "C_D": float(prob.get_val("aero_point_0.wing_perf.CD")[0]),
+                "success": bool(prob.driver.result.success),
+            })
+            if verbose:
+                print("num_y = %4d%s: %4d iterations, %8.2f s, C_D = %.8f" % (
+                    num_y, " (transferred start)" if transferred else "", history[-1]["iterations"], elapsed,
+                    history[-1]["C_D"]))
+            if history[-1]["success"]:
+                break
+            if transferred:
+                warnings.warn("The optimization of the num_y = %d level failed from the previous optimum, "
+                              "it is run again from the initial design of the case." % num_y)
+        if not history[-1]["success"] and i < len(levels) - 1:
+            warnings.warn("The optimization of the num_y = %d level failed, the next level starts from "
+                          "its last design." % num_y)
+
+    if not history[-1]["success"]:
+        raise RuntimeError("The optimization of the finest level (num_y = %d) failed after %d iterations "
+                           "(%s), its design is not an optimum." % (history[-1]["num_y"], history[-1]["iterations"],
+                                                                   prob.driver.result.exit_status))
+
+    return prob, history
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Benchmark of the derivative computation methods
+
+Problem 1 (the Rosenbrock function, run_benchmark) and the wing cases of
+problems 3 b) i) and 3 d) i) (run_wing_benchmark, through the wing builder).
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import datetime
+import json
+import os
+import time
+
+import numpy as np
+import openmdao
+import openmdao.api as om
+from hw3_rosenbrock import RosenbrockND, rosenbrock_start
+
+# File where the benchmark runs are appended, one entry per run
+BENCH_FILE = "derivative_bench.json"
+
+# Ways of computing the partials of the objective component
+METHODS = {
+    "fd_forward": {"method": "fd", "form": "forward"},
+    # Same settings as the backward finite differences of problem_1.py
+    "fd_backward": {"method": "fd", "form": "backward", "step": 1e-6, "step_calc": "abs", "minimum_step": 1e-6},
+    "fd_central": {"method": "fd", "form": "central"},
+    "cs": {"method": "cs"},
+    "exact": None,
+}
+
+# Ways of computing the total derivatives of the wing cases, as entries of the case specification
+WING_METHODS = {
+    "exact_fwd": {"mode": "fwd"},
+    "exact_rev": {"mode": "rev"},
+    "fd": {"approx_totals": {"method": "fd"}},
+    # Complex step ({"approx_totals": {"method": "cs"}}) is left out: some OpenAeroStruct
+    # components discard the imaginary part, and SLSQP does not converge on problem 3 b) i)
+}
+
+# Wing cases of the benchmark, see hw3_p3b1.py and hw3_p3d1.py
+WING_CASES = {
+    "p3b1": {
+        "mesh": {"num_y": 21, "num_x": 5, "wing_type": "rect", "symmetry": True},
+        "surface": {"twist_cp": np.zeros(10)},
+        "design_vars": {"alpha": {"lower": -50.0, "upper": 50.0}},
+        "constraints": {"aero_point_0.wing_perf.CL": {"equals": 0.5}},
+        "objective": {"aero_point_0.wing_perf.CD": {"scaler": 1e4}},
+    },
+    "p3d1": {
+        "mesh": {"num_y": 21, "num_x": 5, "wing_type": "rect", "symmetry": True},
+        "surface": {"sweep": 10, "span": 10.0, "twist_cp": np.zeros(10)},
+        "sweep_constraint": {"lower": 0, "upper": 1},
+        "design_vars": {"alpha": {"lower": -50.0, "upper": 50.0},
+                        "wing.sweep": {"lower": 0, "upper": 15},
+                        "wing.span": {"lower": 0.1, "upper": 20}},
+        "constraints": {"aero_point_0.wing_perf.CL": {"equals": 0.5}},
+        "objective": {"aero_point_0.wing_perf.CD": {"scaler": 1e4}},
+    },
+}
+
+
+class BenchRosenbrock(RosenbrockND):
+    """
+    RosenbrockND that counts its compute calls and can approximate its partials.
+
+    Options
+    -------
+    approx : dict or None
+        Keyword arguments of declare_partials (method, form, step, ...) to
+        approximate the partials, None to use the exact ones.
+
+    """
+
+    def initialize(self):
+        super().initialize()
+        self.options.declare("approx", default=None, types=(dict, type(None)))
+        self.num_compute = 0
+        self.num_compute_partials = 0
+
+    def setup_partials(self):
+        approx = self.options["approx"]
+        if approx is not None:
+            # Overrides the exact partials declared in setup
+            self.declare_partials("f", "x", **approx)
+
+    def compute(self, inputs, outputs):
+        self.num_compute += 1
+        super().compute(inputs, outputs)
+
+    def compute_partials(self, inputs, partials):
+        # Still called by OpenMDAO with approximated partials, which must not be overwritten
+        if self.options["approx"] is None:
+            self.num_compute_partials += 1
+            super().compute_partials(inputs, partials)
+
+
+def build_problem(n, method, constrained=False, tol=1e-9):
+    """
+    Build the Rosenbrock optimization of problem 1 with a given derivative method.
+
+    Parameters
+    ----------
+    n : int
+        Number of design variables.
+    method : str
+        Key of METHODS.
+    constrained : bool
+        If True, add the constraint sum(x) <= 1 (x + y <= 1 for n = 2).
+    tol : float
+        Optimizer tolerance.
+
+    Returns
+    -------
+    prob : om.Problem
+        Set-up problem.
+    """
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem("rosen", BenchRosenbrock(n=n, approx=METHODS[method]), promotes_inputs=["x"])
+    prob.model.add_subsystem("const", om.ExecComp("g = sum(x)", x=np.zeros((1, n))), promotes_inputs=["x"])
+    prob.model.set_input_defaults("x", rosenbrock_start(n).reshape(1, n))
+
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options["optimizer"] = "SLSQP"
+    prob.driver.options["tol"] = tol
+    prob.driver.options["maxiter"] = 1000
+    prob.driver.options["disp"] = False
+
+    prob.model.add_design_var("x", lower=-2, upper=2)
+    prob.model.add_objective("rosen.f")
+    if constrained:
+        prob.model.add_constraint("const.g", upper=1)
+
+    prob.setup(force_alloc_complex=(method == "cs"))
+    return prob
+
+
+def reference_optimum(n, constrained):
+    """
+    Return the optimum used to measure the error of each method.
+
+    Parameters
+    ----------
+    n : int
+        Number of design variables.
+    constrained : bool
+        True for the constrained problem.
+
+    Returns
+    -------
+    numpy array
+        (1, ..., 1) for the unconstrained problem, the optimum found with exact
+        partials and a tight tolerance for the constrained one.
+    """
+    if not constrained:
+        return np.ones(n)
+
+    prob = build_problem(n, "exact", constrained=True, tol=1e-12)
+    prob.run_driver()
+    return prob.get_val("x").ravel().copy()
+
+
+def run_case(n, method, constrained, x_ref, repeats=3):
+    """
+    Optimize with one derivative method and measure the cost.
+
+    Parameters
+    ----------
+    n : int
+        Number of design variables.
+    method : str
+        Key of METHODS.
+    constrained : bool
+        True for the constrained problem.
+    x_ref : numpy array
+        Reference optimum.
+    repeats : int
+        Number of runs, the median wall time is reported.
+
+    Returns
+    -------
+    result : dict
+        Wall time, compute and compute_partials calls, driver iterations and
+        distance of the optimum to the reference.
+    """
+    times = []
+    for _ in range(repeats):
+        prob = build_problem(n, method, constrained)
+        comp = prob.model.rosen
+
+        start = time.perf_counter()
+        prob.run_driver()
+        times.append(time.perf_counter() - start)
+
+    x = prob.get_val("x").ravel()
+    return {
+        "n": n,
+        "method": method,
+        "constrained": constrained,
+        "time": float(np.median(times)),
+        "compute_calls": comp.num_compute,
+        "compute_partials_calls": comp.num_compute_partials,
+        "driver_iterations": prob.driver.iter_count,
+        "success": bool(prob.driver.result.success),
+        "f": float(prob.get_val("rosen.f")[0]),
+        "error": float(np.linalg.norm(x - x_ref)),
+    }
+
+
+def run_benchmark(ns=(2, 10, 50), methods=tuple(METHODS), repeats=3, output=BENCH_FILE):
+    """
+    Run every derivative method on the unconstrained and constrained problems.
+
+    Parameters
+    ----------
+    ns : list of int
+        Numbers of design variables (2 is problem 1).
+    methods : list of str
+        Keys of METHODS to run.
+    repeats : int
+        Number of runs of each case.
+    output : str or None
+        JSON file where the run is appended to the previous ones, skipped if None.
+
+    Returns
+    -------
+    run : dict
+        Date, OpenMDAO version and the results of every case.
+    """
+    cases = []
+    for n in ns:
+        for constrained in (False, True):
+            x_ref = reference_optimum(n, constrained)
+            for method in methods:
+                cases.append(run_case(n, method, constrained, x_ref, repeats))
+
+    run = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "openmdao": openmdao.__version__,
+        "numpy": np.__version__,
+        "cases": cases,
+    }
+
+    if output is not None:
+        history = []
+        if os.path.exists(output):
+            with open(output) as f:
+                history = json.load(f)
+        history.append(run)
+        with open(output, "w") as f:
+            json.dump(history, f, indent=2)
+
+    return run
+
+
+def run_wing_case(case, method, repeats=3):
+    """
+    Optimize a wing case with one derivative method and measure the cost.
+
+    Parameters
+    ----------
+    case : str
+        Key of WING_CASES.
+    method : str
+        Key of WING_METHODS.
+    repeats : int
+        Number of runs, the median wall times are reported.
+
+    Returns
+    -------
+    result : dict
+        Wall time of the optimization and of one compute_totals at the
+        initial values, driver iterations and the design and objective found.
+    """
+    from hw3_wing_builder import build_case
+
+    spec = dict(WING_CASES[case], recorder=None, driver={"disp": False})
+    spec.update(WING_METHODS[method])
+
+    times = []
+    totals_times = []
+    for _ in range(repeats):
+        # Pooled problem, reset to the initial values of the case
+        prob = build_case(spec)
+        prob.run_model()
+        start = time.perf_counter()
+        prob.compute_totals()
+        totals_times.append(time.perf_counter() - start)
+
+        prob = build_case(spec)
+        start = time.perf_counter()
+        prob.run_driver()
+        times.append(time.perf_counter() - start)
+
+    return {
+        "case": case,
+        "method": method,
+        "time": float(np.median(times)),
+        "totals_time": float(np.median(totals_times)),
+        "driver_iterations": prob.driver.iter_count,
+        "success": bool(prob.driver.result.success),
+        "design": {var: prob.get_val(var).tolist() for var in spec["design_vars"]},
+        "f": float(prob.get_val(list(spec["objective"])[0])[0]),
+    }
+
+
+def run_wing_benchmark(cases=tuple(WING_CASES), methods=tuple(WING_METHODS), repeats=3, output=BENCH_FILE):
+    """
+    Run every derivative method on the wing cases.
+
+    The error of each method is the distance of its design to the one found
+    with the analytic derivatives in reverse mode.
+
+    Parameters
+    ----------
+    cases : list of str
+        Keys of WING_CASES.
+    methods : list of str
+        Keys of WING_METHODS to run.
+    repeats : int
+        Number of runs of each case.
+    output : str or None
+        JSON file where the run is appended to the previous ones, skipped if None.
+
+    Returns
+    -------
+    run : dict
+        Date, OpenMDAO version and the results of every case.
+    """
+    results = []
+    for case in cases:
+        reference = run_wing_case(case, "exact_rev", repeats=1)["design"]
+        for method in methods:
+            result = run_wing_case(case, method, repeats)
+            result["error"] = float(np.sqrt(sum(np.sum((np.array(result["design"][var]) - np.array(val))**2)
+                                                for var, val in reference.items())))
+            results.append(result)
+
+    run = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "openmdao": openmdao.__version__,
+        "numpy": np.__version__,
+        "wing_cases": results,
+    }
+
+    if output is not None:
+        history = []
+        if os.path.exists(output):
+            with open(output) as f:
+                history = json.load(f)
+        history.append(run)
+        with open(output, "w") as f:
+            json.dump(history, f, indent=2)
+
+    return run
+
+
+if __name__ == "__main__":
+    run = run_benchmark()
+
+    print("%5s %12s %6s %10s %9s %9s %6s %10s" % (
+        "n", "method", "const", "time [s]", "compute", "partials", "iter", "error"))
+    for case in run["cases"]:
+        print("%5d %12s %6s %10.4f %9d %9d %6d %10.2e" % (
+            case["n"], case["method"], case["constrained"], case["time"], case["compute_calls"],
+            case["compute_partials_calls"], case["driver_iterations"], case["error"]))
+
+    run = run_wing_benchmark()
+
+    print()
+    print("%5s %10s %10s %11s %6s %8s %10s" % ("case", "method", "time [s]", "totals [s]", "iter", "success",
+                                              "error"))
+    for case in run["wing_cases"]:
+        print("%5s %10s %10.4f %11.5f %6d %8s %10.2e" % (
+            case["case"], case["method"], case["time"], case["totals_time"], case["driver_iterations"],
+            case["success"], case["error"]))
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Parallel design of experiments of the wing cases
+
+run_doe evaluates a wing case (objective and constraints, no optimization)
+on the cases of an OpenMDAO DOE generator over some of its design
+variables, e.g. sweep x span x alpha of problem 3 d):
+
+    store = run_doe(spec, {"wing.sweep": (0, 15), "wing.span": (5, 20), "alpha": (0, 10)},
+                    method="fullfact", num=5)
+
+The cases are generated once (full factorial or Latin hypercube, see
+unit_design), split in chunks, and every chunk runs under an
+om.DOEDriver with an om.ListGenerator in a worker process, recording with
+an AsyncRecorder. Each finished chunk is exported to the columnar store
+as it arrives (see hw3_columnar), and the chunks are merged at the end:
+
+    history = load_history(store)
+
+feasibility_map and best_start then give the feasible region of two of the
+variables and the best feasible case, the starting point of the
+gradient-based optimization.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import copy
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import openmdao.api as om
+from hw3_async_recorder import AsyncRecorder
+from hw3_columnar import COUNTER, export_history, load_history, merge_histories, write_columns
+from hw3_restart import constraint_violation
+from hw3_wing_builder import build_problem, complete_spec, set_case_values
+
+# Default directory of the columnar store of a DOE
+STORE_DIR = "doe_store"
+
+# Columns of the store besides the recorded variables
+VIOLATION = "_violation"
+
+
+def doe_spec(spec, variables):
+    """
+    Return the case specification of a DOE, with its variables as the only design variables.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification of hw3_wing_builder.
+    variables : dict
+        (lower, upper) bounds of every DOE variable, by design variable name.
+
+    Returns
+    -------
+    dict
+        Full case specification, without recorder.
+    """
+    spec = complete_spec(spec)
+    spec["design_vars"] = {name: {"lower": lower, "upper": upper} for name, (lower, upper) in variables.items()}
+    spec["recorder"] = None
+    spec["warm_start"] = None
+    return spec
+
+
+def unit_design(method, num, size, seed=0):
+    """
+    Return the cases of a DOE in the unit hypercube.
+
+    The full factorial and Latin hypercube designs of om.FullFactorialGenerator
+    and om.LatinHypercubeGenerator, without their optional pydoe dependency.
+
+    Parameters
+    ----------
+    method : str
+        "fullfact" (num levels per variable) or "lhs" (num samples).
+    num : int
+        Number of levels or samples.
+    size : int
+        Number of variables.
+    seed : int
+        Seed of the Latin hypercube.
+
+    Returns
+    -------
+    numpy array
+        Cases of the DOE, shape (number of cases, size), in [0, 1].
+    """
+    if method == "fullfact":
+        levels = np.linspace(0.0, 1.0, num) if num > 1 else np.array([0.5])
+        grid = np.meshgrid(*[levels] * size, indexing="ij")
+        return np.stack([g.ravel() for g in grid], axis=1)
+    if method == "lhs":
+        rng = np.random.default_rng(seed)
+        strata = np.stack([rng.permutation(num) for _ in range(size)], axis=1)
+        return (strata + rng.random((num, size))) / num
+    raise ValueError("Unknown DOE method '%s', use 'fullfact' or 'lhs'." % method)
+
+
+def generate_cases(spec, method="fullfact", num=5, seed=0):
+    """
+    Generate the cases of a DOE over the design variables of a case.
+
+    Parameters
+    ----------
+    spec : dict
+        Specification returned by doe_spec.
+    method : str or DOE generator
+        "fullfact" (num levels per variable), "lhs" (num samples), or an
+        OpenMDAO generator (e.g. om.LatinHypercubeGenerator with pydoe).
+    num : int
+        Number of levels or samples.
+    seed : int
+        Seed of the Latin hypercube.
+
+    Returns
+    -------
+    list of list
+        (name, value) pairs of the design variables of every case, as
+        expected by om.ListGenerator.
+    """
+    # Sizes and bounds of the design variables as the driver sees them
+    prob = build_problem(spec, headless=True, snapshot=False)
+    prob.driver = om.DOEDriver()
+    prob.setup()
+    prob.final_setup()
+    design_vars = {name: (meta["size"], meta["lower"], meta["upper"])
+                   for name, meta in prob.driver._designvars.items()}
+    prob.cleanup()
+
+    if callable(method):
+        return [[(name, np.array(val)) for name, val in case]
+                for case in method(prob.driver._designvars, prob.model)]
+
+    size = sum(dv_size for dv_size, _, _ in design_vars.values())
+    design = unit_design(method, num, size, seed)
+    cases = []
+    for row in design:
+        case, start = [], 0
+        for name, (dv_size, lower, upper) in design_vars.items():
+            unit = row[start:start + dv_size]
+            case.append((name, lower + unit * (upper - lower)))
+            start += dv_size
+        cases.append(case)
+    return cases
+
+
+def run_doe_chunk(spec, cases, recorder="doe.db"):
+    """
+    Run a chunk of DOE cases under a DOEDriver.
+
+    This is the function executed by the worker processes.
+
+    Parameters
+    ----------
+    spec : dict
+        Specification returned by doe_spec.
+    cases : list of list
+        (name, value) pairs of the design variables of every case.
+    recorder : str
+        Name of the AsyncRecorder file, made unique for the process.
+
+    Returns
+    -------
+    str
+        Recorder file of the chunk.
+    """
+    prob = build_problem(spec, headless=True, snapshot=False)
+    prob.driver = om.DOEDriver(om.ListGenerator(cases))
+    recorder = AsyncRecorder(recorder)
+    prob.driver.add_recorder(recorder)
+    prob.setup()
+    set_case_values(prob, spec)
+    prob.run_driver()
+    prob.cleanup()
+    return os.path.abspath(recorder.filepath)
+
+
+def run_doe(spec, variables, method="fullfact", num=5, seed=0, max_workers=None, chunks_per_worker=2,
+            store=STORE_DIR, verbose=True):
+    """
+    Run a DOE of a wing case in parallel and store its results in a columnar store.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification of hw3_wing_builder, its objective
+        and constraints are evaluated.
+    variables : dict
+        (lower, upper) bounds of every DOE variable, by design variable name.
+    method : str or DOE generator
+        "fullfact", "lhs" or an OpenMDAO generator, see generate_cases.
+    num : int
+        Number of levels or samples.
+    seed : int
+        Seed of the Latin hypercube.
+    max_workers : int or None
+        Number of worker processes, defaults to the number of cores.
+    chunks_per_worker : int
+        Number of chunks of cases per worker process.
+    store : str
+        Directory of the columnar store, replaced if it exists.
+    verbose : bool
+        If True, print the progress of the chunks.
+
+    Returns
+    -------
+    str
+        Directory of the columnar store, with the constraint violation of
+        every case in '_violation'.
+    """
+    spec = doe_spec(spec, variables)
+    cases = generate_cases(spec, method, num, seed)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    num_chunks = min(len(cases), max_workers * chunks_per_worker)
+    edges = np.linspace(0, len(cases), num_chunks + 1).astype(int)
+    chunks = [cases[start:end] for start, end in zip(edges[:-1], edges[1:])]
+
+    if os.path.isdir(store):
+        shutil.rmtree(store)
+    chunk_dirs = [None] * num_chunks
+    files = [None] * num_chunks
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_doe_chunk, spec, chunk): i
+                   for i, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            i = futures[future]
+            files[i] = future.result()
+            chunk_dirs[i] = export_history(files[i], os.path.join(store, "chunk_%03d" % i))
+            if verbose:
+                print("DOE chunk %d/%d done (%d cases)" % (sum(d is not None for d in chunk_dirs), num_chunks,
+                                                            len(chunks[i])))
+
+    merge_histories(chunk_dirs, store)
+    history = load_history(store, mmap_mode=None)
+    history[VIOLATION] = violations(history, spec)
+    return write_columns(history, store, source=files, fmt="doe")
+
+
+def constraint_bounds(spec):
+    """
+    Return the bounds of the constraints of a case.
+
+    Parameters
+    ----------
+    spec : dict
+        Full case specification.
+
+    Returns
+    -------
+    dict
+        Lower, upper and equals bounds of every constraint, by name.
+    """
+    bounds = {}
+    constraints = dict(spec["constraints"])
+    if spec["sweep_constraint"] is not None:
+        constraints["sweep_times_span"] = spec["sweep_constraint"]
+    for name, options in constraints.items():
+        bounds[name] = {key: options.get(key) for key in ("lower", "upper", "equals")}
+    return bounds
+
+
+def violations(history, spec):
+    """
+    Return the largest constraint violation of every case of a DOE.
+
+    Parameters
+    ----------
+    history : dict
+        DOE store opened with load_history.
+    spec : dict
+        Full case specification of the DOE.
+
+    Returns
+    -------
+    numpy array
+        Largest violation of a bound of every case, 0 for a feasible case.
+    """
+    bounds = constraint_bounds(spec)
+    return np.array([constraint_violation({"constraints": {name: history[name][i] for name in bounds}}, bounds)
+                     for i in range(len(history[COUNTER]))])
+
+
+def feasibility_map(history, x, y, objective, tol=1e-6, bins=None):
+    """
+    Return the fraction of feasible cases and their best objective on a grid of two DOE variables.
+
+    Parameters
+    ----------
+    history : dict
+        DOE store opened with load_history.
+    x : str
+        Variable along the first axis of the map.
+    y : str
+        Variable along the second axis of the map.
+    objective : str
+        Objective of the DOE.
+    tol : float
+        Constraint violation allowed in a feasible case (an equality
+        constraint is seldom met exactly by a DOE case).
+    bins : int or None
+        Number of bins of each variable, its distinct values if None (full factorial).
+
+    Returns
+    -------
+    x_values : numpy array
+        Centers of the cells along x.
+    y_values : numpy array
+        Centers of the cells along y.
+    fraction : numpy array
+        Fraction of feasible cases of every cell, shape (len(x_values), len(y_values)), nan if empty.
+    best : numpy array
+        Lowest objective of the feasible cases of every cell, nan if none.
+    """
+    xs = np.asarray(history[x], dtype=float)[:, 0]
+    ys = np.asarray(history[y], dtype=float)[:, 0]
+    feasible = np.asarray(history[VIOLATION]) <= tol
+    objective = np.asarray(history[objective], dtype=float).reshape(len(xs), -1)[:, 0]
+
+    def cells(values):
+        if bins is None:
+            centers = np.unique(values)
+            return centers, np.searchsorted(centers, values)
+        edges = np.linspace(values.min(), values.max(), bins + 1)
+        index = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, bins - 1)
+        return 0.5 * (edges[:-1] + edges[1:]), index
+
+    x_values, ix = cells(xs)
+    y_values, iy = cells(ys)
+    count = np.zeros((len(x_values), len(y_values)))
+    num_feasible = np.zeros_like(count)
+    best = np.full_like(count, np.nan)
+    for i, j, ok, f in zip(ix, iy, feasible, objective):
+        count[i, j] += 1
+        if ok:
+            num_feasible[i, j] += 1
+            best[i, j] = f if np.isnan(best[i, j]) else min(best[i, j], f)
+
+    with np.errstate(invalid="ignore"):
+        fraction = num_feasible / count
+    return x_values, y_values, fraction, best
+
+
+def best_start(history, spec, tol=1e-6):
+    """
+    Return the best case of a DOE, the starting point of the gradient-based optimization.
+
+    Parameters
+    ----------
+    history : dict
+        DOE store opened with load_history.
+    spec : dict
+        Compact or full case specification of the DOE, for its variables and objective.
+    tol : float
+        Constraint violation allowed in a feasible case.
+
+    Returns
+    -------
+    dict
+        Value of every design variable, objective and violation of the
+        feasible case with the lowest objective (the least infeasible case if
+        none is feasible).
+    """
+    spec = complete_spec(spec)
+    objective = np.asarray(history[list(spec["objective"])[0]], dtype=float).reshape(len(history[COUNTER]), -1)[:, 0]
+    violation = np.asarray(history[VIOLATION])
+
+    feasible = np.nonzero(violation <= tol)[0]
+    i = feasible[np.argmin(objective[feasible])] if len(feasible) else int(np.argmin(violation))
+    start = {name: np.array(history[name][i]) for name in spec["design_vars"]}
+    start["objective"] = float(objective[i])
+    start["violation"] = float(violation[i])
+    return start
+
+
+def start_spec(spec, start):
+    """
+    Return a case specification starting from a DOE case.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification of hw3_wing_builder.
+    start : dict
+        Case returned by best_start.
+
+    Returns
+    -------
+    dict
+        Full case specification with the initial values of the DOE variables.
+    """
+    from hw3_wing_builder import DEFAULT_SURFACE
+
+    spec = copy.deepcopy(complete_spec(spec))
+    name = spec["surface"].get("name", DEFAULT_SURFACE["name"])
+    for var, val in start.items():
+        if var in spec["flight"]:
+            spec["flight"][var] = float(np.ravel(val)[0]) if np.size(val) == 1 else val
+        elif var.startswith(name + "."):
+            spec["surface"][var[len(name) + 1:]] = float(np.ravel(val)[0]) if np.size(val) == 1 else val
+    return spec
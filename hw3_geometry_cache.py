@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Geometry group that skips its work when its inputs are unchanged
+
+CachedGeometry is the Geometry group of OpenAeroStruct (B-splines, mesh
+transformations, t_over_c) keyed on its input vector: when the inputs are
+bitwise the same as in the previous solve, the outputs of that solve are
+restored instead of running the group, and when they are the same as in
+the previous linearization, the partials its components still hold are
+reused. In the wing optimizations this skips the geometry on every
+evaluation that only moves the flight conditions (e.g. alpha, the only
+design variable of problem 3 b) i)), and on the run_model that starts a
+run_driver of a pooled problem.
+
+CachedGeometry overrides private methods of om.Group and reads private
+attributes of OpenMDAO, so it is only used with the OpenMDAO versions it
+was checked against (OPENMDAO_VERSIONS): with any other, the wing builder
+falls back to Geometry with a warning. It is off by default, since the
+wing cases compared by this script run no faster with it; a case selects it with
+"geometry_cache": True, see hw3_wing_builder.
+
+    python hw3_geometry_cache.py
+
+compares the run_driver time and cache hits of wing cases with and without it.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import time
+import warnings
+
+import numpy as np
+import openmdao
+import openmdao.api as om
+from openaerostruct.geometry.geometry_group import Geometry
+
+# Versions (major.minor) of OpenMDAO whose internals CachedGeometry was checked against
+OPENMDAO_VERSIONS = ("3.45",)
+
+
+def same_bits(cached, current):
+    """
+    Return True if two arrays hold the same bits.
+
+    Parameters
+    ----------
+    cached : numpy array or None
+        Copy of a previous vector, None if there is none.
+    current : numpy array
+        Current vector.
+
+    Returns
+    -------
+    bool
+        True if the arrays have the same dtype, size and bytes.
+    """
+    if cached is None or cached.dtype != current.dtype or cached.size != current.size:
+        return False
+    # Unsigned integer view of the same item size, valid on the strided real part
+    # of the complex vectors OpenMDAO allocates for complex step
+    bits = np.dtype("u%d" % current.itemsize)
+    return np.array_equal(cached.view(bits), current.view(bits))
+
+
+def geometry_cache_supported():
+    """
+    Return True if CachedGeometry can be used with the installed OpenMDAO.
+
+    Warns when it cannot: its version is not one of OPENMDAO_VERSIONS, or
+    om.Group lacks the private methods CachedGeometry overrides.
+
+    Returns
+    -------
+    bool
+        True if CachedGeometry can be used.
+    """
+    version = ".".join(openmdao.__version__.split(".")[:2])
+    if version in OPENMDAO_VERSIONS and hasattr(om.Group, "_solve_nonlinear") and hasattr(om.Group, "_linearize"):
+        return True
+    warnings.warn("CachedGeometry relies on internals of OpenMDAO %s, not %s: the plain Geometry group is used."
+                  % (" or ".join(OPENMDAO_VERSIONS), openmdao.__version__))
+    return False
+
+
+class CachedGeometry(Geometry):
+    """
+    Geometry group that reuses its outputs and partials when its inputs are unchanged.
+
+    The group is a function of its inputs only (the mesh of the surface is
+    an option), so outputs and partials computed for the same inputs are
+    still valid. OpenMDAO may only run part of the group (e.g. the
+    subsystems that do not depend on the design variables, run once before
+    the optimization), so the relevant subsystems are part of the key.
+    Complex step runs are never cached.
+
+    Attributes
+    ----------
+    hits : dict
+        Number of skipped 'solve' and 'linearize' calls.
+    misses : dict
+        Number of 'solve' and 'linearize' calls that ran the group.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.hits = {"solve": 0, "linearize": 0}
+        self.misses = {"solve": 0, "linearize": 0}
+        self._solve_inputs = None
+        self._solve_outputs = None
+        self._solve_relevance = None
+        self._linearize_inputs = None
+        self._linearize_relevance = None
+
+    def _relevance_key(self):
+        """
+        Return the state of the relevance of the model, which selects the subsystems that run.
+        """
+        return self._relevance._active, self._relevance._current_rel_sarray
+
+    @staticmethod
+    def _same_relevance(cached, current):
+        return cached is not None and cached[0] == current[0] and cached[1] is current[1]
+
+    def _solve_nonlinear(self):
+        inputs = self._inputs.asarray()
+        relevance = self._relevance_key()
+        if (not self.under_complex_step and self._same_relevance(self._solve_relevance, relevance)
+                and same_bits(self._solve_inputs, inputs)):
+            # Outputs of the previous solve, in case they were changed since
+            self._outputs.set_val(self._solve_outputs)
+            self.hits["solve"] += 1
+            return
+
+        self.misses["solve"] += 1
+        self._solve_inputs = None
+        super()._solve_nonlinear()
+        if not self.under_complex_step:
+            # Inputs after the solve: the connected ones inside the group are set by it
+            self._solve_inputs = self._inputs.asarray(copy=True)
+            self._solve_outputs = self._outputs.asarray(copy=True)
+            self._solve_relevance = relevance
+
+    def _linearize(self, sub_do_ln=True):
+        inputs = self._inputs.asarray()
+        relevance = self._relevance_key()
+        if (not self.under_complex_step and not self._first_call_to_linearize
+                and self._same_relevance(self._linearize_relevance, relevance)
+                and same_bits(self._linearize_inputs, inputs)):
+            self.hits["linearize"] += 1
+            return
+
+        self.misses["linearize"] += 1
+        self._linearize_inputs = None
+        super()._linearize(sub_do_ln)
+        if not self.under_complex_step:
+            self._linearize_inputs = self._inputs.asarray(copy=True)
+            self._linearize_relevance = relevance
+
+
+def compare_geometry_cache(spec, repeats=3):
+    """
+    Compare the run_driver of a wing case with and without CachedGeometry.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification of hw3_wing_builder.
+    repeats : int
+        Number of runs of each, the fastest is kept.
+
+    Returns
+    -------
+    dict
+        For False (Geometry) and True (CachedGeometry), the fastest run_driver
+        time, the objective, and the hits and misses of the cache.
+    """
+    from hw3_wing_builder import build_problem, complete_spec, set_case_values
+
+    results = {}
+    for cached in (False, True):
+        case = complete_spec(spec)
+        case["recorder"] = None
+        case["geometry_cache"] = cached
+        case["driver"]["disp"] = False
+        prob = build_problem(case, headless=True, snapshot=False)
+        prob.setup(mode=case["mode"])
+
+        times = []
+        for _ in range(repeats):
+            set_case_values(prob, case)
+            start = time.perf_counter()
+            prob.run_driver()
+            times.append(time.perf_counter() - start)
+
+        geometry = prob.model._get_subsystem(case["surface"].get("name", "wing"))
+        results[cached] = {"time": min(times),
+                           "objective": float(np.ravel(list(prob.driver.get_objective_values().values())[0])[0]),
+                           "hits": dict(getattr(geometry, "hits", {})),
+                           "misses": dict(getattr(geometry, "misses", {}))}
+        prob.cleanup()
+    return results
+
+
+if __name__ == "__main__":
+    from hw3_p3d_doe import spec as spec_p3d1
+
+    cases = {
+        # Problem 3 b) i): alpha is the only design variable
+        "alpha only": {
+            "mesh": {"num_y": 21, "num_x": 5, "wing_type": "rect", "symmetry": True},
+            "surface": {"twist_cp": np.zeros(10)},
+            "design_vars": {"alpha": {"lower": -10.0, "upper": 15.0}},
+            "constraints": {"aero_point_0.wing_perf.CL": {"equals": 0.5}},
+            "objective": {"aero_point_0.wing_perf.CD": {"scaler": 1e4}},
+        },
+        # Problem 3 d) i): alpha, sweep and span
+        "alpha, sweep, span": spec_p3d1,
+    }
+    for label, spec in cases.items():
+        results = compare_geometry_cache(spec)
+        plain, cached = results[False], results[True]
+        print("%s: %.4f s -> %.4f s (%.2fx), objective %r -> %r, hits %s, misses %s" % (
+            label, plain["time"], cached["time"], plain["time"] / cached["time"], plain["objective"],
+            cached["objective"], cached["hits"], cached["misses"]))
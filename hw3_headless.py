@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Headless run mode: no HTML reports, no blocking plots
+
+Run any case script with the environment variable HW3_HEADLESS=1:
+
+    HW3_HEADLESS=1 python hw3_p3b1.py
+
+The problems are then created with reports=False, so nothing is written to
+reports/<script>/, and the figures are saved as PNG files instead of shown.
+The problems of the wing builder instead record a compact model snapshot
+(a case recorder file with only the viewer data), from which the N2 diagram
+is rendered on demand:
+
+    python hw3_headless.py n2 snapshots/hw3_p3b1_0.db
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import openmdao.api as om
+
+# Headless mode, switched on with the HW3_HEADLESS environment variable
+HEADLESS = os.environ.get("HW3_HEADLESS", "").lower() not in ("", "0", "false", "no")
+
+# Directory of the model snapshots
+SNAPSHOT_DIR = os.environ.get("HW3_SNAPSHOT_DIR", "snapshots")
+
+# Numbers the snapshots written by this process
+_snapshot_ids = itertools.count()
+
+
+def is_headless(headless=None):
+    """
+    Return whether a run is headless.
+
+    Parameters
+    ----------
+    headless : bool or None
+        Explicit mode, None to use the HW3_HEADLESS environment variable.
+
+    Returns
+    -------
+    bool
+        True for a headless run.
+    """
+    return HEADLESS if headless is None else bool(headless)
+
+
+def new_problem(headless=None, **kwargs):
+    """
+    Create a Problem, without reports in headless mode.
+
+    Parameters
+    ----------
+    headless : bool or None
+        Explicit mode, None to use the HW3_HEADLESS environment variable.
+    **kwargs : dict
+        Other arguments of om.Problem.
+
+    Returns
+    -------
+    om.Problem
+        New problem.
+    """
+    if is_headless(headless):
+        kwargs["reports"] = False
+    return om.Problem(**kwargs)
+
+
+def snapshot_path(name=None):
+    """
+    Return a new snapshot file name.
+
+    Parameters
+    ----------
+    name : str or None
+        Base name, defaults to the name of the running script.
+
+    Returns
+    -------
+    str
+        Path in SNAPSHOT_DIR, unique within this process.
+    """
+    if name is None:
+        name = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "problem"
+    return os.path.join(SNAPSHOT_DIR, "%s_%d.db" % (name, next(_snapshot_ids)))
+
+
+class SnapshotRecorder(om.SqliteRecorder):
+    """
+    SqliteRecorder of the model viewer data and options, recorded once.
+
+    OpenMDAO records the viewer data of the model at every final_setup
+    (for as long as a recorder asks for it) and the options of every system
+    and solver at every run, i.e. at every run_model or run_driver of a
+    set-up problem. The model of a set-up problem does not change, so only
+    the first record of each is kept.
+
+    Parameters
+    ----------
+    filepath : str
+        Snapshot file.
+    """
+
+    def __init__(self, filepath):
+        super().__init__(filepath, record_viewer_data=True)
+
+    def record_viewer_data(self, model_viewer_data, key="Driver"):
+        """
+        Record the model viewer data, the first time only.
+
+        Parameters
+        ----------
+        model_viewer_data : dict
+            Data required to visualize the model.
+        key : str, optional
+            The unique ID to use for this data in the table.
+        """
+        super().record_viewer_data(model_viewer_data, key)
+        self._record_viewer_data = False
+
+    def record_metadata_system(self, system, run_number=None):
+        """
+        Record the options of a system, for the first run only.
+
+        Parameters
+        ----------
+        system : System
+            The System for which to record metadata.
+        run_number : int or None
+            Number indicating which run the metadata is associated with, None for the first run.
+        """
+        if run_number is None:
+            super().record_metadata_system(system, run_number)
+
+    def record_metadata_solver(self, solver, run_number=None):
+        """
+        Record the options of a solver, for the first run only.
+
+        Parameters
+        ----------
+        solver : Solver
+            The Solver for which to record metadata.
+        run_number : int or None
+            Number indicating which run the metadata is associated with, None for the first run.
+        """
+        if run_number is None:
+            super().record_metadata_solver(solver, run_number)
+
+
+def add_snapshot(prob, path=None):
+    """
+    Record the model of a problem in a snapshot file when it is set up.
+
+    The snapshot is a case recorder file with only the viewer data of the
+    model, written at the first final_setup. Must be called before setup.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Problem, not set up yet.
+    path : str or None
+        Snapshot file, a new name from snapshot_path if None.
+
+    Returns
+    -------
+    str
+        Snapshot file.
+    """
+    if path is None:
+        path = snapshot_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    prob.add_recorder(SnapshotRecorder(path))
+    return path
+
+
+def render_n2(snapshot, outfile=None):
+    """
+    Render the N2 diagram of a model snapshot.
+
+    Parameters
+    ----------
+    snapshot : str
+        Snapshot file written by add_snapshot.
+    outfile : str or None
+        HTML file, the snapshot name ending in _n2.html if None.
+
+    Returns
+    -------
+    str
+        HTML file.
+    """
+    if outfile is None:
+        outfile = os.path.splitext(snapshot)[0] + "_n2.html"
+    om.n2(snapshot, outfile=outfile, show_browser=False)
+    return outfile
+
+
+def render_scaling_report(spec, outfile="driver_scaling_report.html"):
+    """
+    Render the driver scaling report of a wing case.
+
+    The report needs a live driver, so the case is built again (from the
+    mesh cache) without reports and run once.
+
+    Parameters
+    ----------
+    spec : dict
+        Case specification of hw3_wing_builder.
+    outfile : str
+        HTML file.
+
+    Returns
+    -------
+    str
+        HTML file.
+    """
+    from hw3_wing_builder import build_problem, complete_spec, set_case_values
+
+    spec = complete_spec(spec)
+    spec["recorder"] = None
+    prob = build_problem(spec, headless=True, snapshot=False)
+    prob.setup()
+    set_case_values(prob, spec)
+    prob.run_model()
+    prob.driver.scaling_report(outfile=outfile, show_browser=False)
+    prob.cleanup()
+    return outfile
+
+
+def show(fig, filename):
+    """
+    Show a figure, or save it in headless mode.
+
+    Parameters
+    ----------
+    fig : matplotlib Figure
+        Figure.
+    filename : str
+        File of the figure in headless mode.
+    """
+    import matplotlib.pyplot as plt
+
+    if HEADLESS:
+        fig.savefig(filename, dpi=150)
+        plt.close(fig)
+        print("Figure saved to %s" % filename)
+    else:
+        plt.show()
+
+
+def measure_setup_savings(spec=None, repeats=3):
+    """
+    Measure the time saved by the headless mode on the setup of a wing case.
+
+    Times setup, final_setup, run_model and one compute_totals (which
+    triggers the scaling report) with the default reports and headless,
+    without the model snapshot.
+
+    Parameters
+    ----------
+    spec : dict or None
+        Case specification of hw3_wing_builder, its defaults if None.
+    repeats : int
+        Number of builds of each mode, the median is reported.
+
+    Returns
+    -------
+    result : dict
+        Median time with reports, headless, and the difference.
+    """
+    from hw3_wing_builder import build_problem, complete_spec, set_case_values
+
+    spec = complete_spec(spec or {})
+    spec["recorder"] = None
+    if not spec["objective"]:
+        spec["objective"] = {"aero_point_0.wing_perf.CD": {"scaler": 1e4}}
+        spec["design_vars"] = {"alpha": {"lower": -10.0, "upper": 10.0}}
+
+    times = {}
+    for headless in (False, True):
+        samples = []
+        for _ in range(repeats):
+            prob = build_problem(spec, headless=headless, snapshot=False)
+            start = time.perf_counter()
+            prob.setup()
+            set_case_values(prob, spec)
+            prob.final_setup()
+            prob.run_model()
+            prob.compute_totals()
+            samples.append(time.perf_counter() - start)
+            prob.cleanup()
+        times["headless" if headless else "reports"] = float(np.median(samples))
+
+    times["saved"] = times["reports"] - times["headless"]
+    return times
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "n2":
+        print("N2 diagram written to %s" % render_n2(sys.argv[2]))
+    else:
+        result = measure_setup_savings()
+        print("Setup with reports: %.3f s" % result["reports"])
+        print("Setup headless:     %.3f s" % result["headless"])
+        print("Saved:              %.3f s (%.0f%%)" % (result["saved"], 100.0 * result["saved"] / result["reports"]))
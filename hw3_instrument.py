@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Per-component call counts and execution time of the wing cases
+
+instrument_problem wraps the compute, partials and linear solve methods of
+every component of a set-up problem (and the solve of the non-default
+linear solvers of its groups) to count their calls and add up their wall
+time per driver iteration. The wrappers are instance attributes, the
+classes are untouched, and only take two perf_counter calls and a dict
+update per call.
+
+With "instrument": "<name>" in a case specification, the wing builder
+instruments its problems, and every run_driver writes <name>_summary.txt
+(calls and time per subsystem and method) and <name>_trace.csv (the same
+per driver iteration) to the outputs directory of the problem:
+
+    prob = build_case(dict(spec, instrument="instrument"))
+    prob.run_driver()
+    print(get_instrument(prob).summary(depth=2))
+
+    python hw3_instrument.py
+
+prints the summary of problem 3 d) i) and the overhead of the instrumentation.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import csv
+import os
+import time
+import weakref
+
+import openmdao.api as om
+from openmdao.utils.class_util import overrides_method
+
+# Methods instrumented on the components, by base class
+COMPONENT_METHODS = {
+    om.ExplicitComponent: ["compute", "compute_partials", "compute_jacvec_product"],
+    om.ImplicitComponent: ["apply_nonlinear", "solve_nonlinear", "linearize", "apply_linear", "solve_linear"],
+}
+
+# Kind of work of every instrumented method, the columns of the summary
+METHOD_KINDS = {
+    "compute": "nonlinear",
+    "apply_nonlinear": "nonlinear",
+    "solve_nonlinear": "nonlinear",
+    "compute_partials": "partials",
+    "linearize": "partials",
+    "compute_jacvec_product": "linear",
+    "apply_linear": "linear",
+    "solve_linear": "linear",
+    "linear_solver": "linear",
+}
+
+# Instrumentation of the problems, by problem
+_instruments = weakref.WeakKeyDictionary()
+
+
+class Instrument(object):
+    """
+    Call counts and exclusive wall time of the methods of a problem, per driver iteration.
+
+    The time of a call excludes the instrumented calls made from it (e.g.
+    the component solve_linear calls of a group linear solver), so the
+    times of all the entries add up to the instrumented time.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Set-up problem.
+
+    Attributes
+    ----------
+    records : dict
+        [calls, time] of every (driver iteration, subsystem, method).
+    wrapped : list
+        (object, method name) of every wrapper installed.
+    """
+
+    def __init__(self, prob):
+        self._problem = weakref.ref(prob)
+        self.records = {}
+        self.wrapped = []
+        self._children = []
+
+    def _iteration(self):
+        prob = self._problem()
+        return prob.driver.iter_count if prob is not None else 0
+
+    def wrap(self, obj, method, path, label=None):
+        """
+        Replace a method of an object by its instrumented version.
+
+        Parameters
+        ----------
+        obj : object
+            Component or solver.
+        method : str
+            Name of the method.
+        path : str
+            Subsystem the calls are recorded under.
+        label : str or None
+            Method name in the records, method if None.
+        """
+        func = getattr(obj, method)
+        label = label or method
+        records = self.records
+        children = self._children
+        iteration = self._iteration
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            children.append(0.0)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                exclusive = elapsed - children.pop()
+                if children:
+                    children[-1] += elapsed
+                key = (iteration(), path, label)
+                entry = records.get(key)
+                if entry is None:
+                    records[key] = [1, exclusive]
+                else:
+                    entry[0] += 1
+                    entry[1] += exclusive
+
+        setattr(obj, method, wrapper)
+        self.wrapped.append((obj, method))
+
+    def remove(self):
+        """
+        Remove every wrapper, restoring the methods of the classes.
+        """
+        for obj, method in self.wrapped:
+            obj.__dict__.pop(method, None)
+        self.wrapped = []
+
+    def reset(self):
+        """
+        Forget the records.
+        """
+        self.records.clear()
+
+    def totals(self, depth=None, by_iteration=False):
+        """
+        Add up the records per subsystem and method.
+
+        Parameters
+        ----------
+        depth : int or None
+            Number of levels of the subsystem paths kept (e.g. 2 for
+            'aero_point_0.aero_states'), the components if None.
+        by_iteration : bool
+            If True, keep the driver iterations apart.
+
+        Returns
+        -------
+        dict
+            [calls, time] by (subsystem, method), or by (iteration, subsystem, method).
+        """
+        totals = {}
+        for (iteration, path, method), (calls, elapsed) in self.records.items():
+            if depth is not None:
+                path = ".".join(path.split(".")[:depth])
+            key = (iteration, path, method) if by_iteration else (path, method)
+            entry = totals.setdefault(key, [0, 0.0])
+            entry[0] += calls
+            entry[1] += elapsed
+        return totals
+
+    def summary(self, depth=None, limit=None):
+        """
+        Return the table of calls and time per subsystem and method, most expensive first.
+
+        Parameters
+        ----------
+        depth : int or None
+            Number of levels of the subsystem paths kept, the components if None.
+        limit : int or None
+            Maximum number of rows, all if None.
+
+        Returns
+        -------
+        str
+            Summary table.
+        """
+        totals = self.totals(depth)
+        total_time = sum(elapsed for _, elapsed in totals.values()) or 1.0
+        iterations = len({iteration for iteration, _, _ in self.records})
+        rows = sorted(totals.items(), key=lambda item: -item[1][1])[:limit]
+
+        width = max([len("subsystem")] + [len(path) for path, _ in totals])
+        lines = ["Instrumented time %.4f s over %d driver iterations" % (sum(e for _, e in totals.values()),
+                                                                        iterations),
+                 "%-*s  %-22s  %8s  %10s  %10s  %6s" % (width, "subsystem", "method", "calls", "time (s)",
+                                                        "per call", "%")]
+        for (path, method), (calls, elapsed) in rows:
+            lines.append("%-*s  %-22s  %8d  %10.4f  %8.1fus  %6.1f" % (
+                width, path, method, calls, elapsed, 1e6 * elapsed / calls, 100.0 * elapsed / total_time))
+
+        kinds = {}
+        for (_, method), (_, elapsed) in totals.items():
+            kind = METHOD_KINDS.get(method, "other")
+            kinds[kind] = kinds.get(kind, 0.0) + elapsed
+        lines.append("By kind: " + ", ".join("%s %.4f s (%.1f %%)" % (kind, elapsed, 100.0 * elapsed / total_time)
+                                             for kind, elapsed in sorted(kinds.items(), key=lambda item: -item[1])))
+        return "\n".join(lines)
+
+    def write(self, name, directory=None, depth=None):
+        """
+        Write the summary table and the per-iteration trace.
+
+        Parameters
+        ----------
+        name : str
+            Prefix of the files, <name>_summary.txt and <name>_trace.csv.
+        directory : str or None
+            Directory of the files, the outputs directory of the problem if None.
+        depth : int or None
+            Number of levels of the subsystem paths kept, the components if None.
+
+        Returns
+        -------
+        summary : str
+            Summary file.
+        trace : str
+            Trace file, one row per driver iteration, subsystem and method.
+        """
+        if directory is None:
+            directory = str(self._problem().get_outputs_dir(mkdir=True))
+        os.makedirs(directory, exist_ok=True)
+        summary = os.path.join(directory, name + "_summary.txt")
+        trace = os.path.join(directory, name + "_trace.csv")
+
+        with open(summary, "w") as f:
+            f.write(self.summary(depth) + "\n")
+        with open(trace, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["iteration", "subsystem", "method", "calls", "time"])
+            for (iteration, path, method), (calls, elapsed) in sorted(self.totals(depth, by_iteration=True).items()):
+                writer.writerow([iteration, path, method, calls, "%.9f" % elapsed])
+        return summary, trace
+
+
+def instrument_problem(prob, name=None):
+    """
+    Instrument the components and linear solvers of a set-up problem.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Set-up problem.
+    name : str or None
+        If given, the records are reset at the start of every run_driver
+        and written with Instrument.write at its end.
+
+    Returns
+    -------
+    Instrument
+        Instrumentation of the problem, also returned by get_instrument.
+    """
+    instrument = _instruments.get(prob)
+    if instrument is not None:
+        instrument.remove()
+    instrument = Instrument(prob)
+
+    for system in prob.model.system_iter(recurse=True, include_self=True):
+        for base, methods in COMPONENT_METHODS.items():
+            if isinstance(system, base):
+                for method in methods:
+                    # Only the methods the component implements, OpenMDAO skips the others
+                    if overrides_method(method, system, base):
+                        instrument.wrap(system, method, system.pathname or "model")
+        solver = system.linear_solver
+        if solver is not None and not isinstance(solver, om.LinearRunOnce):
+            instrument.wrap(solver, "solve", system.pathname or "model", "linear_solver")
+
+    if name is not None:
+        run_driver = prob.run_driver
+
+        def instrumented_run_driver(*args, **kwargs):
+            instrument.reset()
+            try:
+                return run_driver(*args, **kwargs)
+            finally:
+                instrument.write(name)
+
+        prob.run_driver = instrumented_run_driver
+        instrument.wrapped.append((prob, "run_driver"))
+
+    _instruments[prob] = instrument
+    return instrument
+
+
+def get_instrument(prob):
+    """
+    Return the instrumentation of a problem.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Problem given to instrument_problem.
+
+    Returns
+    -------
+    Instrument or None
+        Instrumentation of the problem, None if it is not instrumented.
+    """
+    return _instruments.get(prob)
+
+
+def measure_overhead(spec, repeats=3):
+    """
+    Measure the run_driver time of a wing case with and without instrumentation.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification of hw3_wing_builder.
+    repeats : int
+        Number of runs of each, the fastest is kept.
+
+    Returns
+    -------
+    plain : float
+        Fastest run_driver time without instrumentation, in seconds.
+    instrumented : float
+        Fastest run_driver time with instrumentation, in seconds.
+    instrument : Instrument
+        Records of the last instrumented run.
+    """
+    from hw3_wing_builder import build_problem, complete_spec, set_case_values
+
+    spec = complete_spec(spec)
+    spec["recorder"] = None
+    spec["instrument"] = None
+    prob = build_problem(spec, headless=True, snapshot=False)
+    prob.setup(mode=spec["mode"])
+
+    times = {False: [], True: []}
+    instrument = None
+    for _ in range(repeats):
+        for instrumented in (False, True):
+            if instrumented:
+                instrument = instrument_problem(prob)
+            set_case_values(prob, spec)
+            prob.driver.iter_count = 0
+            start = time.perf_counter()
+            prob.run_driver()
+            times[instrumented].append(time.perf_counter() - start)
+            if instrumented:
+                instrument.remove()
+    prob.cleanup()
+    return min(times[False]), min(times[True]), instrument
+
+
+if __name__ == "__main__":
+    from hw3_p3d_doe import spec
+
+    plain, instrumented, instrument = measure_overhead(spec)
+    print(instrument.summary(depth=2))
+    print()
+    print(instrument.summary(limit=10))
+    print()
+    print("run_driver: %.4f s, instrumented %.4f s (overhead %+.1f %%)" % (
+        plain, instrumented, 100.0 * (instrumented / plain - 1.0)))
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - On-disk cache of the generate_mesh outputs
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+from openaerostruct.geometry.utils import generate_mesh
+
+# Default location and size of the cache, the directory can be changed with
+# the HW3_MESH_CACHE environment variable (e.g. to share it between workers)
+CACHE_DIR = os.environ.get("HW3_MESH_CACHE", ".mesh_cache")
+MAX_BYTES = 256 * 1024**2
+
+# Options of the mesh dictionary used by generate_mesh and their default values
+MESH_DEFAULTS = {
+    "num_x": 3,
+    "num_y": 5,
+    "span_cos_spacing": 0.0,
+    "chord_cos_spacing": 0.0,
+    "wing_type": "rect",
+    "symmetry": True,
+    "offset": [0.0, 0.0, 0.0],
+    "span": 10.0,
+    "root_chord": 1.0,
+    "num_twist_cp": 2,
+}
+
+
+def normalize_mesh_dict(mesh_dict):
+    """
+    Return the mesh dictionary with defaults filled in and unused options removed.
+
+    Two mesh dictionaries that generate the same mesh have the same normalized
+    form: missing options take the generate_mesh defaults, options ignored by
+    generate_mesh (e.g. num_chord_cp) are dropped, and so are the CRM-only
+    options (num_twist_cp) for a rectangular wing.
+
+    Parameters
+    ----------
+    mesh_dict : dict
+        Mesh dictionary as given to generate_mesh.
+
+    Returns
+    -------
+    normalized : dict
+        JSON serializable normalized mesh dictionary.
+    """
+    normalized = dict(MESH_DEFAULTS)
+    normalized.update({key: val for key, val in mesh_dict.items() if key in MESH_DEFAULTS})
+
+    if "CRM" not in normalized["wing_type"]:
+        del normalized["num_twist_cp"]
+
+    for key, val in normalized.items():
+        if isinstance(val, np.ndarray):
+            normalized[key] = val.tolist()
+        elif isinstance(val, np.generic):
+            normalized[key] = val.item()
+    normalized["offset"] = [float(val) for val in normalized["offset"]]
+
+    return normalized
+
+
+def mesh_key(mesh_dict):
+    """
+    Return the content hash of a mesh dictionary.
+
+    Parameters
+    ----------
+    mesh_dict : dict
+        Mesh dictionary as given to generate_mesh.
+
+    Returns
+    -------
+    str
+        Hexadecimal key of the normalized mesh dictionary.
+    """
+    text = json.dumps(normalize_mesh_dict(mesh_dict), sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class MeshCache(object):
+    """
+    Content-addressed on-disk cache of the generate_mesh outputs.
+
+    Each entry is stored as ``<key>.mesh.npy`` (and ``<key>.twist_cp.npy`` for
+    the CRM wings) and is loaded memory-mapped. The modification time of the
+    files is used as the last access time, the least recently used entries
+    are removed when the cache grows over max_bytes.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the cache.
+    max_bytes : int
+        Maximum size of the cache on disk.
+    mmap : bool
+        If True, return read-only memory-mapped arrays instead of loading them.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, mmap=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+
+    def _path(self, key, name):
+        return os.path.join(self.directory, "%s.%s.npy" % (key, name))
+
+    def get(self, mesh_dict):
+        """
+        Return the cached generate_mesh output of a mesh dictionary.
+
+        Parameters
+        ----------
+        mesh_dict : dict
+            Mesh dictionary as given to generate_mesh.
+
+        Returns
+        -------
+        mesh or (mesh, twist_cp) or None
+            Same output as generate_mesh, or None if the entry is not cached.
+        """
+        key = mesh_key(mesh_dict)
+        mesh_path = self._path(key, "mesh")
+        twist_path = self._path(key, "twist_cp")
+        mmap_mode = "r" if self.mmap else None
+
+        try:
+            mesh = np.load(mesh_path, mmap_mode=mmap_mode)
+            os.utime(mesh_path)
+            if os.path.exists(twist_path):
+                twist_cp = np.load(twist_path, mmap_mode=mmap_mode)
+                os.utime(twist_path)
+                return mesh, twist_cp
+        except (OSError, ValueError):
+            # Missing entry, or one evicted by another process while loading
+            return None
+
+        return mesh
+
+    def put(self, mesh_dict, result):
+        """
+        Store a generate_mesh output in the cache.
+
+        Parameters
+        ----------
+        mesh_dict : dict
+            Mesh dictionary given to generate_mesh.
+        result : mesh or (mesh, twist_cp)
+            Output of generate_mesh.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        key = mesh_key(mesh_dict)
+
+        arrays = {"mesh": result}
+        if isinstance(result, tuple):
+            arrays = {"mesh": result[0], "twist_cp": result[1]}
+
+        # The twist is written first, so a mesh file on disk is always complete
+        for name in sorted(arrays, reverse=True):
+            self._write(self._path(key, name), arrays[name])
+
+        self.evict()
+
+    def _write(self, path, array):
+        # Write to a temporary file and rename it, so concurrent readers never
+        # see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(array))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def generate_mesh(self, mesh_dict):
+        """
+        Cached version of generate_mesh.
+
+        Parameters
+        ----------
+        mesh_dict : dict
+            Mesh dictionary as given to generate_mesh.
+
+        Returns
+        -------
+        mesh or (mesh, twist_cp)
+            Same output as generate_mesh.
+        """
+        result = self.get(mesh_dict)
+        if result is None:
+            result = generate_mesh(mesh_dict)
+            self.put(mesh_dict, result)
+        return result
+
+    def _entries(self):
+        entries = []
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".npy"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        """
+        Return the size of the cache on disk.
+
+        Returns
+        -------
+        int
+            Size in bytes of all the cached arrays.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            # Remove the whole entry (mesh and twist) of the oldest file
+            key = os.path.basename(path).split(".")[0]
+            for name in ["mesh", "twist_cp"]:
+                entry_path = self._path(key, name)
+                try:
+                    entry_size = os.path.getsize(entry_path)
+                    os.remove(entry_path)
+                    total -= entry_size
+                except OSError:
+                    pass
+
+    def clear(self):
+        """
+        Remove every entry of the cache.
+        """
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_cache = MeshCache()
+
+
+def cached_generate_mesh(mesh_dict):
+    """
+    Drop-in replacement of generate_mesh that uses the default on-disk cache.
+
+    Parameters
+    ----------
+    mesh_dict : dict
+        Mesh dictionary as given to generate_mesh.
+
+    Returns
+    -------
+    mesh or (mesh, twist_cp)
+        Same output as generate_mesh.
+    """
+    return _cache.generate_mesh(mesh_dict)
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Mesh Convergence Study - Parallel study runner
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import openmdao.api as om
+from hw3_headless import new_problem
+from hw3_mesh_cache import cached_generate_mesh
+from openaerostruct.geometry.utils import generate_mesh
+from openaerostruct.geometry.geometry_group import Geometry
+from openaerostruct.aerodynamics.aero_groups import AeroPoint
+from hw3_timing import PhaseTimer
+
+# Mesh sizes of the convergence study (spanwise) and fixed chordwise size
+NUM_Y_VALUES = [5, 7, 11, 21, 25, 51, 101, 201, 301, 401, 501]
+NUM_X = 5
+
+# File where the results of the study are stored
+RESULTS_FILE = "mesh_study.json"
+
+
+def generate_study_mesh(num_y, num_x=NUM_X, cached=True):
+    """
+    Generate the rectangular wing mesh of one case of the convergence study.
+
+    Parameters
+    ----------
+    num_y : int
+        Number of spanwise mesh points.
+    num_x : int
+        Number of chordwise mesh points.
+    cached : bool
+        If True, use the on-disk mesh cache (see hw3_mesh_cache), otherwise
+        always call generate_mesh (e.g. to time it).
+
+    Returns
+    -------
+    mesh : np.ndarray
+        Mesh of shape (num_x, num_y, 3).
+    """
+    # Create a dictionary to store options about the mesh
+    mesh_dict = {
+        "num_y": num_y,
+        "num_x": num_x,
+        "wing_type": "rect",
+        "symmetry": True,
+    }
+
+    # Generate the aerodynamic mesh based on the mesh dictionary
+    if not cached:
+        return generate_mesh(mesh_dict)
+    return cached_generate_mesh(mesh_dict)
+
+
+def build_mesh_problem(mesh):
+    """
+    Build the rectangular wing analysis problem used in the convergence study.
+
+    Parameters
+    ----------
+    mesh : np.ndarray
+        Mesh returned by generate_study_mesh.
+
+    Returns
+    -------
+    prob : om.Problem
+        Problem ready to be set up.
+    """
+    # Create a dictionary with info and options about the aerodynamic lifting surface
+    surface = {
+        # Wing definition
+        "name": "wing",  # name of the surface
+        "symmetry": True,  # if true, model one half of wing reflected across the plane y = 0
+        "S_ref_type": "projected",  # how we compute the wing area, can be 'wetted' or 'projected'
+        "span": 11.0,
+        "root_chord": (16.2 / 11.0),
+        "fem_model_type": "tube",
+        "mesh": mesh,
+        "CL0": 0.0,  # CL of the surface at alpha=0
+        "CD0": 0.015,  # CD of the surface at alpha=0
+        # Airfoil properties for viscous drag calculation
+        "k_lam": 0.05,  # percentage of chord with laminar flow, used for viscous drag
+        "t_over_c_cp": np.array([0.12, 0.08, 0.06, 0.06, 0.05, 0.05, 0.04, 0.04, 0.03, 0.03]),
+        "c_max_t": 0.3,  # chordwise location of maximum (NACA2412) thickness
+        "with_viscous": True,  # if true, compute viscous drag
+        "with_wave": False,  # if true, compute wave drag
+    }
+
+    # Create the OpenMDAO problem
+    prob = new_problem()
+
+    # Create an independent variable component that will supply the flow conditions to the problem
+    indep_var_comp = om.IndepVarComp()
+    indep_var_comp.add_output("v", val=63, units="m/s")
+    indep_var_comp.add_output("alpha", val=5.0, units="deg")
+    indep_var_comp.add_output("rho", val=1.00649, units="kg/m**3")
+    indep_var_comp.add_output("cg", val=np.zeros((3)), units="m")
+    prob.model.add_subsystem("prob_vars", indep_var_comp, promotes=["*"])
+
+    # Create and add a group that handles the geometry for the aerodynamic lifting surface
+    geom_group = Geometry(surface=surface)
+    prob.model.add_subsystem(surface["name"], geom_group)
+
+    # Create the aero point group, which contains the actual aerodynamic analyses
+    aero_group = AeroPoint(surfaces=[surface])
+    point_name = "aero_point_0"
+    prob.model.add_subsystem(point_name, aero_group, promotes_inputs=["v", "alpha", "rho", "cg"])
+
+    name = surface["name"]
+    prob.model.connect(name + ".mesh", point_name + "." + name + ".def_mesh")
+    prob.model.connect(name + ".mesh", point_name + ".aero_states." + name + "_def_mesh")
+    prob.model.connect(name + ".t_over_c", point_name + "." + name + "_perf." + "t_over_c")
+
+    return prob
+
+
+def run_mesh_case(num_y, num_x=NUM_X):
+    """
+    Run a single mesh size of the study.
+
+    This is the function executed by the worker processes, so it only takes
+    and returns plain picklable values.
+
+    Parameters
+    ----------
+    num_y : int
+        Number of spanwise mesh points.
+    num_x : int
+        Number of chordwise mesh points.
+
+    Returns
+    -------
+    result : dict
+        Mesh size, C_D, C_L, total wall time and wall time of each phase.
+    """
+    timer = PhaseTimer()
+    with timer.phase("mesh"):
+        mesh = generate_study_mesh(num_y, num_x)
+    with timer.phase("build"):
+        prob = build_mesh_problem(mesh)
+    with timer.phase("setup"):
+        prob.setup()
+    with timer.phase("final_setup"):
+        prob.final_setup()
+    with timer.phase("solve"):
+        prob.run_driver()
+
+    result = {
+        "num_y": num_y,
+        "num_x": num_x,
+        "C_D": float(prob["aero_point_0.wing_perf.CD"][0]),
+        "C_L": float(prob["aero_point_0.wing_perf.CL"][0]),
+        "time": timer.total(),
+        "phases": dict(timer.wall),
+    }
+    prob.cleanup()
+    return result
+
+
+def run_mesh_study(num_y_values=NUM_Y_VALUES, num_x=NUM_X, max_workers=None, output=RESULTS_FILE):
+    """
+    Run every mesh size of the study on a pool of worker processes.
+
+    The cases are submitted from the most to the least expensive one, so the
+    large meshes start first and the small ones fill the remaining cores at
+    the end of the run.
+
+    Parameters
+    ----------
+    num_y_values : list of int
+        Spanwise mesh sizes to run.
+    num_x : int
+        Chordwise mesh size used for every case.
+    max_workers : int or None
+        Number of worker processes, defaults to the number of cores.
+    output : str or None
+        JSON file where the results are written, skipped if None.
+
+    Returns
+    -------
+    results : list of dict
+        One entry per mesh size (see run_mesh_case), sorted by num_y.
+    """
+    # Largest meshes first, the cost of the VLM solve grows quickly with num_y
+    order = sorted(num_y_values, key=lambda num_y: num_y * num_x, reverse=True)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_mesh_case, num_y, num_x) for num_y in order]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    results.sort(key=lambda result: result["num_y"])
+
+    if output is not None:
+        save_mesh_study(results, output, num_y_values, num_x)
+
+    return results
+
+
+def save_mesh_study(results, path=RESULTS_FILE, num_y_values=NUM_Y_VALUES, num_x=NUM_X):
+    """
+    Write the results of the study and its parameters to a JSON file.
+
+    Parameters
+    ----------
+    results : list of dict
+        Results returned by run_mesh_study.
+    path : str
+        Output file.
+    num_y_values : list of int
+        Spanwise mesh sizes of the study.
+    num_x : int
+        Chordwise mesh size of the study.
+    """
+    with open(path, "w") as f:
+        json.dump({"num_y_values": sorted(num_y_values), "num_x": num_x, "cases": results}, f, indent=2)
+
+
+def load_mesh_study(path=RESULTS_FILE, num_y_values=NUM_Y_VALUES, num_x=NUM_X):
+    """
+    Load the results of the study, running it first if they are not stored yet.
+
+    The study is also run again if the stored results are of other mesh sizes.
+
+    Parameters
+    ----------
+    path : str
+        JSON file with the results.
+    num_y_values : list of int
+        Spanwise mesh sizes of the study.
+    num_x : int
+        Chordwise mesh size of the study.
+
+    Returns
+    -------
+    results : list of dict
+        One entry per mesh size, sorted by num_y.
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            stored = json.load(f)
+        if stored.get("num_y_values") == sorted(num_y_values) and stored.get("num_x") == num_x:
+            return stored["cases"]
+
+    return run_mesh_study(num_y_values, num_x, output=path)
+
+
+def refine(num, ratio=2):
+    """
+    Return the size of the nested refinement of a mesh dimension.
+
+    Parameters
+    ----------
+    num : int
+        Number of mesh points.
+    ratio : int
+        Refinement ratio of the panel size.
+
+    Returns
+    -------
+    int
+        ratio * (num - 1) + 1, every point of the coarse mesh is a point of the fine one.
+    """
+    return ratio * (num - 1) + 1
+
+
+def richardson(f_fine, f_medium, f_coarse, ratio=2):
+    """
+    Estimate the converged value of three solutions on nested meshes.
+
+    Parameters
+    ----------
+    f_fine : float
+        Solution on the finest mesh.
+    f_medium : float
+        Solution on the medium mesh.
+    f_coarse : float
+        Solution on the coarsest mesh.
+    ratio : float
+        Refinement ratio between the meshes.
+
+    Returns
+    -------
+    f_exact : float
+        Extrapolated value, f_fine + (f_fine - f_medium) / (ratio**p - 1).
+    p : float or None
+        Observed order of convergence, ln((f_coarse - f_medium) / (f_medium - f_fine)) / ln(ratio),
+        None if the solutions do not converge monotonically (then f_exact is f_fine).
+    """
+    d_fine = f_medium - f_fine
+    d_coarse = f_coarse - f_medium
+    if d_fine == 0.0:
+        return f_fine, None
+    if d_coarse / d_fine <= 1.0:
+        # Oscillating or not yet in the asymptotic range
+        return f_fine, None
+
+    p = float(np.log(d_coarse / d_fine) / np.log(ratio))
+    return float(f_fine + (f_fine - f_medium) / (ratio**p - 1.0)), p
+
+
+def run_adaptive_study(tol=1e-5, num_y=5, num_x=NUM_X, refine_x=False, max_num_y=513, ratio=2):
+    """
+    Refine the mesh until the C_D discretization error estimate is below a tolerance.
+
+    Every level refines num_y (and num_x if refine_x) by nesting, n -> ratio*(n - 1) + 1.
+    From the third level on, the error of the finest C_D is estimated by
+    Richardson extrapolation of the last three levels; with non-monotonic
+    convergence the difference to the previous level is used instead.
+
+    Parameters
+    ----------
+    tol : float
+        Tolerance of the C_D error.
+    num_y : int
+        Spanwise mesh size of the first level.
+    num_x : int
+        Chordwise mesh size of the first level.
+    refine_x : bool
+        If True, also refine num_x.
+    max_num_y : int
+        Largest spanwise mesh size run.
+    ratio : int
+        Refinement ratio.
+
+    Returns
+    -------
+    study : dict
+        Every level (see run_mesh_case, with its error estimate), the extrapolated
+        C_D and observed order, whether the tolerance was met and the smallest
+        level (num_y x num_x) whose C_D is within the tolerance of the extrapolated C_D.
+    """
+    levels = []
+    f_exact, order = None, None
+
+    while num_y <= max_num_y:
+        result = run_mesh_case(num_y, num_x)
+        levels.append(result)
+
+        values = [level["C_D"] for level in levels]
+        if len(levels) >= 3:
+            f_exact, order = richardson(values[-1], values[-2], values[-3], ratio)
+        if order is not None:
+            result["error"] = float(abs(values[-1] - f_exact))
+        elif len(levels) >= 2:
+            f_exact = values[-1]
+            result["error"] = float(abs(values[-1] - values[-2]))
+        else:
+            result["error"] = None
+
+        if result["error"] is not None and result["error"] <= tol:
+            break
+
+        num_y = refine(num_y, ratio)
+        if refine_x:
+            num_x = refine(num_x, ratio)
+
+    converged = levels[-1]["error"] is not None and levels[-1]["error"] <= tol
+
+    # Smallest mesh close enough to the best estimate of the converged C_D, the measured
+    # time (noisy, and including caches warmed by the previous levels) only breaks ties
+    recommended = levels[-1]
+    if f_exact is not None:
+        for level in sorted(levels, key=lambda level: (level["num_y"] * level["num_x"], level["time"])):
+            if abs(level["C_D"] - f_exact) <= tol:
+                recommended = level
+                break
+
+    return {
+        "tol": tol,
+        "levels": levels,
+        "C_D_extrapolated": f_exact,
+        "order": order,
+        "converged": converged,
+        "recommended": {"num_y": recommended["num_y"], "num_x": recommended["num_x"], "C_D": recommended["C_D"]},
+    }
+
+
+if __name__ == "__main__":
+    results = run_mesh_study()
+
+    for result in results:
+        print("num_y = %4d   C_D = %.8f   time = %8.3f s" % (result["num_y"], result["C_D"], result["time"]))
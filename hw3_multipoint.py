@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Flight points of a multipoint case evaluated in worker processes
+
+Without MPI, the om.ParallelGroup of the aero points of a multipoint case
+runs them one after the other. ProcessAeroPoints evaluates them in local
+worker processes instead: every point is a single-point case of the wing
+builder (its own geometry and aero point, at the flight conditions of the
+point), set up once per worker process, and every evaluation sends the
+geometry inputs and the flight conditions of all the points to the
+workers at once and collects the outputs of the points and their total
+derivatives.
+
+The wing builder uses it for the points of a multipoint case with
+"point_execution": "processes" (the default), with "point_workers" worker
+processes (the number of cores by default, at most one per point). The
+model-level names are those of the om.ParallelGroup version
+("point_execution": "mpi"): <point>.alpha, <point>.wing_perf.CD, ...
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import copy
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openmdao.api as om
+from hw3_geometry_cache import same_bits
+from hw3_surrogate import local_name
+
+# Outputs of every point and their sizes, relative to the point
+POINT_OUTPUTS = {
+    "wing_perf.CL": 1,
+    "wing_perf.CD": 1,
+    "wing_perf.CDi": 1,
+    "wing_perf.CDv": 1,
+    "CM": 3,
+}
+
+# Set-up problems of the points in a worker process, by setup_key
+_problems = {}
+
+
+def point_spec(spec, i):
+    """
+    Return the single-point case of a point of a multipoint case.
+
+    Parameters
+    ----------
+    spec : dict
+        Full specification of the multipoint case.
+    i : int
+        Index of the point.
+
+    Returns
+    -------
+    dict
+        Full case specification with the geometry of the multipoint case and
+        the flight conditions of the point, without driver responses.
+    """
+    from hw3_wing_builder import point_flights
+
+    case = copy.deepcopy(spec)
+    case.update(flight=point_flights(spec)[i][1], points=None, design_vars={}, constraints={}, objective={},
+                sweep_constraint=None, recorder=None, mode="rev", approx_totals=None, coloring=False,
+                instrument=None, warm_start=None)
+    return case
+
+
+def evaluate_point(spec, values, outputs, derivatives):
+    """
+    Run a single-point case and compute the total derivatives of its outputs.
+
+    This is the function executed by the worker processes, its problem is
+    set up on the first call and reused by the next ones.
+
+    Parameters
+    ----------
+    spec : dict
+        Full case specification returned by point_spec.
+    values : dict
+        Values of the geometry inputs and flight conditions, by model-level
+        name, in the units of the model.
+    outputs : list of str
+        Outputs returned, e.g. 'aero_point_0.wing_perf.CD'.
+    derivatives : list of str
+        Outputs whose total derivatives with respect to all the values are returned.
+
+    Returns
+    -------
+    vals : dict
+        Value of every output.
+    totals : dict
+        Total derivatives {output: {name: array}}, empty without derivatives.
+    """
+    from hw3_wing_builder import build_problem, set_case_values, setup_key
+
+    key = setup_key(spec)
+    prob = _problems.get(key)
+    if prob is None:
+        prob = build_problem(spec, headless=True, snapshot=False)
+        prob.setup(mode=spec["mode"])
+        set_case_values(prob, spec)
+        _problems[key] = prob
+
+    for name, val in values.items():
+        prob.set_val(name, val)
+    prob.run_model()
+
+    vals = {name: prob.get_val(name).copy() for name in outputs}
+    totals = {}
+    if derivatives:
+        totals = prob.compute_totals(of=derivatives, wrt=list(values), return_format="dict")
+    return vals, totals
+
+
+class ProcessAeroPoints(om.ExplicitComponent):
+    """
+    Aero points of a multipoint case, evaluated in parallel in local worker processes.
+
+    The inputs are the geometry inputs of the surface and the flight
+    conditions of every point, the outputs are the POINT_OUTPUTS of every
+    point. Every compute also computes the total derivatives of the point
+    outputs the case uses (its C_D and its responses), which compute_partials
+    returns when the inputs have not changed since.
+    """
+
+    def initialize(self):
+        self.options.declare("spec", types=dict, desc="Full specification of the multipoint case")
+        self.options.declare("max_workers", default=None, types=int, allow_none=True,
+                             desc="Number of worker processes, the number of cores if None")
+        self._executor = None
+        self._cached_inputs = None
+        self._cached_totals = None
+
+    @staticmethod
+    def variables(spec):
+        """
+        Return the inputs and outputs of the points of a multipoint case.
+
+        Parameters
+        ----------
+        spec : dict
+            Full specification of the multipoint case.
+
+        Returns
+        -------
+        geometry : dict
+            Initial value of every geometry input, by model-level name.
+        flights : list of tuple
+            (point, flight conditions) of every point.
+        derivatives : list of str
+            Point outputs (relative to the point) with derivatives: the C_D
+            of the weighted objective and the point outputs of the responses.
+        """
+        from hw3_wing_builder import GEOMETRY_INPUTS, build_surface, point_flights
+
+        surface = build_surface(spec)
+        geometry = {surface["name"] + "." + var: surface[var] for var in GEOMETRY_INPUTS if var in surface}
+
+        derivatives = ["wing_perf.CD"]
+        flights = point_flights(spec)
+        for name in list(spec["constraints"]) + list(spec["objective"]):
+            for point, _ in flights:
+                if name.startswith(point + "."):
+                    output = name[len(point) + 1:]
+                    if output not in POINT_OUTPUTS:
+                        raise ValueError("'%s' is not an output of the points evaluated in worker processes, "
+                                         "use one of %s." % (name, sorted(POINT_OUTPUTS)))
+                    if output not in derivatives:
+                        derivatives.append(output)
+        return geometry, flights, derivatives
+
+    @staticmethod
+    def promotes(spec):
+        """
+        Return the promotions of the inputs and outputs to their model-level names.
+
+        Parameters
+        ----------
+        spec : dict
+            Full specification of the multipoint case.
+
+        Returns
+        -------
+        inputs : list of tuple
+            (local name, model-level name) of every input.
+        outputs : list of tuple
+            (local name, model-level name) of every output.
+        """
+        geometry, flights, _ = ProcessAeroPoints.variables(spec)
+        inputs = [(local_name(name), name) for name in geometry]
+        outputs = []
+        for point, flight in flights:
+            inputs.extend((local_name(point + "." + var), point + "." + var) for var in flight)
+            outputs.extend((local_name(point + "." + output), point + "." + output) for output in POINT_OUTPUTS)
+        return inputs, outputs
+
+    def setup(self):
+        from hw3_wing_builder import FLIGHT_UNITS
+
+        spec = self.options["spec"]
+        self._geometry, self._flights, derivatives = self.variables(spec)
+        # Without derivatives when the model approximates its totals
+        self._derivatives = derivatives if spec["approx_totals"] is None else []
+        self._specs = [point_spec(spec, i) for i in range(len(self._flights))]
+
+        for name, val in self._geometry.items():
+            self.add_input(local_name(name), val=val)
+        for point, flight in self._flights:
+            for var, val in flight.items():
+                self.add_input(local_name(point + "." + var), val=val, units=FLIGHT_UNITS.get(var))
+            for output, size in POINT_OUTPUTS.items():
+                self.add_output(local_name(point + "." + output), val=np.zeros(size) if size > 1 else 0.0)
+
+    def setup_partials(self):
+        for point, flight in self._flights:
+            wrt = [local_name(name) for name in self._geometry] + [local_name(point + "." + var) for var in flight]
+            for output in self._derivatives:
+                self.declare_partials(local_name(point + "." + output), wrt)
+
+    def _evaluate(self, inputs):
+        if self._executor is None:
+            max_workers = self.options["max_workers"] or os.cpu_count() or 1
+            self._executor = ProcessPoolExecutor(max_workers=min(max_workers, len(self._flights)))
+            weakref.finalize(self, self._executor.shutdown, wait=False)
+
+        futures = []
+        for (point, flight), spec in zip(self._flights, self._specs):
+            values = {name: inputs[local_name(name)] for name in self._geometry}
+            values.update((var, inputs[local_name(point + "." + var)]) for var in flight)
+            # Every point runs in its single-point problem, where it is aero_point_0
+            outputs = ["aero_point_0." + output for output in POINT_OUTPUTS]
+            derivatives = ["aero_point_0." + output for output in self._derivatives]
+            futures.append(self._executor.submit(evaluate_point, spec, values, outputs, derivatives))
+        return [future.result() for future in futures]
+
+    def compute(self, inputs, outputs):
+        results = self._evaluate(inputs)
+        for (point, _), (vals, _) in zip(self._flights, results):
+            for output in POINT_OUTPUTS:
+                outputs[local_name(point + "." + output)] = vals["aero_point_0." + output]
+        self._cached_inputs = inputs.asarray(copy=True)
+        self._cached_totals = [totals for _, totals in results]
+
+    def compute_partials(self, inputs, partials):
+        if not same_bits(self._cached_inputs, inputs.asarray()):
+            self._cached_inputs = inputs.asarray(copy=True)
+            self._cached_totals = [totals for _, totals in self._evaluate(inputs)]
+
+        for (point, flight), totals in zip(self._flights, self._cached_totals):
+            for output in self._derivatives:
+                of = totals["aero_point_0." + output]
+                for name in self._geometry:
+                    partials[local_name(point + "." + output), local_name(name)] = of[name]
+                for var in flight:
+                    partials[local_name(point + "." + output), local_name(point + "." + var)] = of[var]
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Problem 1 - Parallel multi-start optimization
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openmdao.api as om
+from hw3_rosenbrock import RosenbrockND
+
+# Bounds of the design variables of problem 1
+LOWER = -2.0
+UPPER = 2.0
+
+
+def start_points(method, num, n=2, lower=LOWER, upper=UPPER, seed=0):
+    """
+    Generate the starting points of a multi-start optimization.
+
+    Parameters
+    ----------
+    method : str
+        "grid" (num points per dimension), "lhs" (Latin hypercube) or "random".
+    num : int
+        Number of points (per dimension for the grid).
+    n : int
+        Number of design variables.
+    lower : float
+        Lower bound of every design variable.
+    upper : float
+        Upper bound of every design variable.
+    seed : int
+        Seed of the random generators.
+
+    Returns
+    -------
+    numpy array
+        Starting points, shape (num_points, n).
+    """
+    if method == "grid":
+        axis = np.linspace(lower, upper, num)
+        return np.array(list(itertools.product(axis, repeat=n)))
+    if method == "lhs":
+        from scipy.stats import qmc
+        sample = qmc.LatinHypercube(d=n, seed=seed).random(num)
+        return lower + (upper - lower) * sample
+    if method == "random":
+        return np.random.default_rng(seed).uniform(lower, upper, (num, n))
+
+    raise ValueError("Unknown start point method '%s', use 'grid', 'lhs' or 'random'." % method)
+
+
+def build_problem(n=2, constrained=False, optimizer="SLSQP"):
+    """
+    Build the Rosenbrock optimization of problem 1, with exact derivatives.
+
+    Parameters
+    ----------
+    n : int
+        Number of design variables.
+    constrained : bool
+        If True, add the constraint sum(x) <= 1 (x + y <= 1 for n = 2).
+    optimizer : str
+        ScipyOptimizeDriver optimizer.
+
+    Returns
+    -------
+    prob : om.Problem
+        Set-up problem.
+    """
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem("rosen", RosenbrockND(n=n), promotes_inputs=["x"])
+
+    # define the component whose output will be constrained
+    prob.model.add_subsystem("const", om.ExecComp("g = sum(x)", x=np.zeros((1, n)), has_diag_partials=False),
+                             promotes_inputs=["x"])
+    prob.model.set_input_defaults("x", np.zeros((1, n)))
+
+    # setup the optimization
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options["optimizer"] = optimizer
+    prob.driver.options["tol"] = 1e-9
+    prob.driver.options["disp"] = False
+
+    prob.model.add_design_var("x", lower=LOWER, upper=UPPER)
+    prob.model.add_objective("rosen.f")
+    if constrained:
+        prob.model.add_constraint("const.g", upper=1)
+
+    prob.setup()
+    return prob
+
+
+def run_start(x0, constrained=False, optimizer="SLSQP"):
+    """
+    Run one optimization from a starting point.
+
+    This is the function executed by the worker processes.
+
+    Parameters
+    ----------
+    x0 : array_like
+        Starting point.
+    constrained : bool
+        If True, add the constraint sum(x) <= 1.
+    optimizer : str
+        ScipyOptimizeDriver optimizer.
+
+    Returns
+    -------
+    result : dict
+        Starting point, optimum, function value, success flag and number of iterations.
+    """
+    x0 = np.asarray(x0, dtype=float)
+    prob = build_problem(len(x0), constrained, optimizer)
+    prob.set_val("x", x0.reshape(1, -1))
+    prob.run_driver()
+
+    x = prob.get_val("x").ravel()
+    return {
+        "x0": x0.tolist(),
+        "x": x.tolist(),
+        "f": float(prob.get_val("rosen.f")[0]),
+        "g": float(prob.get_val("const.g")[0]),
+        "constrained": constrained,
+        "success": bool(prob.driver.result.success),
+        "iterations": prob.driver.iter_count,
+    }
+
+
+def dedupe_optima(results, tol=1e-3):
+    """
+    Group the converged optimizations that reached the same optimum.
+
+    Parameters
+    ----------
+    results : list of dict
+        Results returned by run_start.
+    tol : float
+        Two optima closer than tol (Euclidean distance) are the same.
+
+    Returns
+    -------
+    optima : list of dict
+        Distinct optima sorted by function value, with the number of starts
+        that converged to each one.
+    """
+    optima = []
+    for result in sorted(results, key=lambda result: result["f"]):
+        if not result["success"]:
+            continue
+        x = np.array(result["x"])
+        for optimum in optima:
+            if np.linalg.norm(x - optimum["x"]) < tol:
+                optimum["count"] += 1
+                break
+        else:
+            optima.append({"x": x, "f": result["f"], "g": result["g"], "count": 1})
+
+    for optimum in optima:
+        optimum["x"] = optimum["x"].tolist()
+    return optima
+
+
+def run_multistart(points, configurations=({"constrained": False}, {"constrained": True}), max_workers=None):
+    """
+    Run every starting point of every configuration as one parallel batch.
+
+    Parameters
+    ----------
+    points : array_like
+        Starting points, shape (num_points, n).
+    configurations : list of dict
+        Keyword arguments of run_start (constrained, optimizer) of each
+        problem to solve from all the starting points.
+    max_workers : int or None
+        Number of worker processes, defaults to the number of cores.
+
+    Returns
+    -------
+    summary : list of dict
+        For each configuration, its results, distinct optima and best solution.
+    """
+    points = np.atleast_2d(points)
+    tasks = [(i, x0) for i in range(len(configurations)) for x0 in points]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_start, x0, **configurations[i]) for i, x0 in tasks]
+        results = [future.result() for future in futures]
+
+    summary = []
+    for i, config in enumerate(configurations):
+        config_results = [result for (j, _), result in zip(tasks, results) if j == i]
+        optima = dedupe_optima(config_results)
+        summary.append({
+            "configuration": dict(config),
+            "results": config_results,
+            "optima": optima,
+            "best": optima[0] if optima else None,
+        })
+
+    return summary
+
+
+if __name__ == "__main__":
+    # Unconstrained and constrained problem 1 from a Latin hypercube of starting points
+    summary = run_multistart(start_points("lhs", 16))
+
+    for entry in summary:
+        name = "Constrained" if entry["configuration"]["constrained"] else "Unconstrained"
+        converged = sum(result["success"] for result in entry["results"])
+        print("%s optimization: %d of %d starts converged, %d distinct optima" % (
+            name, converged, len(entry["results"]), len(entry["optima"])))
+        for optimum in entry["optima"]:
+            print("    f = %.6e at x = %s (%d starts)" % (optimum["f"], np.round(optimum["x"], 6), optimum["count"]))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Mesh Convergence Study - Adaptive refinement with Richardson extrapolation
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+   
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+   
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+from hw3_mesh_study import run_adaptive_study
+
+# Tolerance of the C_D discretization error
+TOL = 1e-5
+
+if __name__ == "__main__":
+    study = run_adaptive_study(tol=TOL)
+
+    for level in study["levels"]:
+        error = "%.2e" % level["error"] if level["error"] is not None else "-"
+        print("num_y = %4d   num_x = %2d   C_D = %.8f   error = %9s   time = %8.3f s" % (
+            level["num_y"], level["num_x"], level["C_D"], error, level["time"]))
+
+    if study["order"] is not None:
+        print("Extrapolated C_D = %.8f (observed order p = %.2f)" % (study["C_D_extrapolated"], study["order"]))
+    if not study["converged"]:
+        print("Tolerance %.1e not met before the largest mesh" % study["tol"])
+
+    recommended = study["recommended"]
+    print("Cheapest mesh within %.1e of the converged C_D: num_y = %d, num_x = %d (C_D = %.8f)" % (
+        study["tol"], recommended["num_y"], recommended["num_x"], recommended["C_D"]))
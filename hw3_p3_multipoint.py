@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Problem 3 - Twist optimization for cruise and climb
+
+Multipoint version of problem 3 b) ii): one twist distribution minimizing
+the weighted C_D of a cruise and a climb point, each with its own angle of
+attack and lift constraint. The points are solved at the same time in local
+worker processes, see hw3_multipoint.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import numpy as np
+
+from hw3_wing_builder import build_case
+
+# Rectangular wing, 21 x 5 mesh (left half-wing only). The root twist is fixed,
+# a uniform twist would otherwise do the same as the angles of attack
+spec = {
+    "mesh": {"num_y": 21, "num_x": 5, "wing_type": "rect", "symmetry": True},
+    "surface": {"twist_cp": np.zeros(10)},
+    "points": [{"flight": {"v": 63.0}, "weight": 0.7},  # cruise
+               {"flight": {"v": 45.0, "alpha": 8.0}, "weight": 0.3}],  # climb
+    "design_vars": {"wing.twist_cp": {"lower": -10.0, "upper": 15.0, "indices": list(range(9))},
+                    "aero_point_0.alpha": {"lower": -10.0, "upper": 15.0},
+                    "aero_point_1.alpha": {"lower": -10.0, "upper": 15.0}},
+    "constraints": {"aero_point_0.wing_perf.CL": {"equals": 0.5},
+                    "aero_point_1.wing_perf.CL": {"equals": 0.9}},
+    "objective": {"CD_weighted": {"scaler": 1e4}},
+}
+
+if __name__ == "__main__":
+    # Build the problem (aerodynamic points in worker processes, SLSQP driver and recorder) and set it up
+    prob = build_case(spec)
+
+    # Run the optimization
+    prob.run_driver()
+
+    # Output the results
+    for i, name in enumerate(["cruise", "climb"]):
+        point = "aero_point_%d" % i
+        print("%s: alpha = %.4f, C_L = %.4f, C_D = %.6f" % (
+            name, prob[point + ".alpha"][0], prob[point + ".wing_perf.CL"][0], prob[point + ".wing_perf.CD"][0]))
+    print("weighted C_D =", prob["CD_weighted"])
+    print("twist_cp =", prob["wing.twist_cp"])
+
+    # Clean up
+    prob.cleanup()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Problem 3 b) i) - Drag polar of the rectangular wing
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+from hw3_headless import show
+from hw3_polar import drag_polar
+
+# Rectangular wing of problem 3 b) i), 21 x 5 mesh (left half-wing only)
+spec = {
+    "mesh": {"num_y": 21, "num_x": 5, "wing_type": "rect", "symmetry": True},
+    "surface": {"twist_cp": np.zeros(10)},
+}
+
+if __name__ == "__main__":
+    # 100 angles of attack on one set-up problem
+    polar = drag_polar(spec, alpha=np.linspace(-5.0, 15.0, 100))
+    print("Polar of %d points in %.2f s (%.1f ms per point)" % (
+        len(polar["alpha"]), polar["time"], 1e3 * polar["time"] / len(polar["alpha"])))
+
+    # Plot C_L versus C_D and C_L versus alpha
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 4))
+    ax1.plot(polar["CD"], polar["CL"])
+    ax1.set_xlabel('C_D')
+    ax1.set_ylabel('C_L')
+    ax1.set_title('Drag polar')
+    ax2.plot(polar["alpha"], polar["CL"])
+    ax2.set_xlabel('alpha (deg)')
+    ax2.set_ylabel('C_L')
+    ax2.set_title('Lift curve')
+    show(fig, "polar_p3b1.png")
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Problem 3 d) i) from a design of experiments
+
+A full factorial DOE over sweep x span x alpha maps where the SweepTimesSpan
+and C_L constraints of problem 3 d) i) are met, then the gradient-based
+optimization starts from the best feasible case of the DOE and is compared
+with the optimization from the initial values of the case.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+from hw3_columnar import load_history
+from hw3_doe import best_start, feasibility_map, run_doe, start_spec
+from hw3_headless import show
+from hw3_wing_builder import build_case
+
+# Case of problem 3 d) i), see hw3_p3d1.py
+spec = {
+    "mesh": {"num_y": 21, "num_x": 5, "wing_type": "rect", "symmetry": True},
+    "surface": {"sweep": 10, "span": 10.0, "twist_cp": np.zeros(10)},
+    "sweep_constraint": {"lower": 0, "upper": 1},
+    "design_vars": {"alpha": {"lower": -50.0, "upper": 50.0},
+                    "wing.sweep": {"lower": 0, "upper": 15},
+                    "wing.span": {"lower": 0.1, "upper": 20}},
+    "constraints": {"aero_point_0.wing_perf.CL": {"equals": 0.5}},
+    "objective": {"aero_point_0.wing_perf.CD": {"scaler": 1e4}},
+}
+
+# DOE variables and their ranges
+variables = {"wing.sweep": (1.0, 15.0), "wing.span": (2.0, 20.0), "alpha": (0.0, 10.0)}
+
+# Constraint violation of a feasible DOE case, C_L = 0.5 is only met
+# approximately by the cases of a grid
+TOL = 0.05
+
+
+def optimize(case_spec):
+    """
+    Optimize a case and return its design, objective and number of iterations.
+    """
+    prob = build_case(case_spec)
+    start = time.perf_counter()
+    prob.run_driver()
+    result = {"time": time.perf_counter() - start,
+              "iterations": prob.driver.iter_count,
+              "alpha": prob.get_val("alpha")[0],
+              "sweep": prob.get_val("wing.sweep")[0],
+              "span": prob.get_val("wing.span")[0],
+              "CD": prob.get_val("aero_point_0.wing_perf.CD")[0]}
+    prob.cleanup()
+    return result
+
+
+if __name__ == "__main__":
+    # Sweep x span x alpha grid of 6 levels, in parallel
+    start = time.perf_counter()
+    store = run_doe(spec, variables, method="fullfact", num=6)
+    print("DOE in %.2f s, stored in %s" % (time.perf_counter() - start, store))
+    history = load_history(store)
+
+    # Feasibility map of sweep and span (any alpha)
+    sweeps, spans, fraction, best = feasibility_map(history, "wing.sweep", "wing.span",
+                                                    "aero_point_0.wing_perf.CD", tol=TOL)
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(11, 4))
+    image = ax1.pcolormesh(sweeps, spans, fraction.T, shading="nearest", vmin=0.0, vmax=1.0)
+    fig.colorbar(image, ax=ax1, label="fraction of feasible cases")
+    ax1.set_xlabel("sweep (deg)")
+    ax1.set_ylabel("span (m)")
+    ax1.set_title("Feasible region")
+    image = ax2.pcolormesh(sweeps, spans, best.T, shading="nearest")
+    fig.colorbar(image, ax=ax2, label="C_D")
+    ax2.set_xlabel("sweep (deg)")
+    ax2.set_ylabel("span (m)")
+    ax2.set_title("Best feasible C_D")
+    show(fig, "doe_feasibility.png")
+
+    # Gradient-based optimization from the best case of the DOE and from the initial values
+    doe_start = best_start(history, spec, tol=TOL)
+    print("DOE start: sweep = %.3f, span = %.3f, alpha = %.3f, C_D = %.6f, violation = %.3g" % (
+        doe_start["wing.sweep"][0], doe_start["wing.span"][0], doe_start["alpha"][0],
+        doe_start["objective"], doe_start["violation"]))
+    for label, case_spec in (("initial values", spec), ("DOE start", start_spec(spec, doe_start))):
+        result = optimize(case_spec)
+        print("From %s: %d iterations in %.2f s, sweep = %.4f, span = %.4f, alpha = %.4f, C_D = %.8f" % (
+            label, result["iterations"], result["time"], result["sweep"], result["span"],
+            result["alpha"], result["CD"]))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Drag polar of a wing case on one set-up problem
+
+drag_polar evaluates a case at an array of angles of attack (and
+optionally of velocities and densities) on a single set-up problem of the
+wing builder: the setup does not depend on the flight conditions, so only
+run_model is repeated. The geometry group is the one the case selects
+(Geometry unless "geometry_cache" is True, see hw3_geometry_cache).
+
+    polar = drag_polar(spec, alpha=np.linspace(-5.0, 10.0, 100))
+    plt.plot(polar["CD"], polar["CL"])
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import copy
+import time
+
+import numpy as np
+from hw3_wing_builder import FLIGHT_UNITS, POINT_NAME, build_case, complete_spec
+
+# Outputs of the polar, by name
+POLAR_OUTPUTS = {
+    "CL": POINT_NAME + ".wing_perf.CL",
+    "CD": POINT_NAME + ".wing_perf.CD",
+    "CM": POINT_NAME + ".CM",
+}
+
+
+def drag_polar(spec, alpha, v=None, rho=None, outputs=POLAR_OUTPUTS):
+    """
+    Evaluate a wing case at an array of flight conditions.
+
+    The geometry is taken at the initial values of the case (or at the
+    values of a warm start), the design variables are not optimized.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification of hw3_wing_builder.
+    alpha : array_like
+        Angles of attack (deg).
+    v : array_like or None
+        Velocities (m/s), broadcast against alpha, the velocity of the case if None.
+    rho : array_like or None
+        Densities (kg/m**3), broadcast against alpha, the density of the case if None.
+    outputs : dict
+        Outputs of the aerodynamic point by name in the polar.
+
+    Returns
+    -------
+    polar : dict
+        Arrays of 'alpha', 'v', 'rho' and of every output, with the flight
+        conditions along axis 0, and the 'time' of the evaluation.
+    """
+    spec = complete_spec(spec)
+    if spec["points"] is not None:
+        raise ValueError("drag_polar does not support multipoint cases, give the flight conditions of one point.")
+    spec["recorder"] = None
+
+    conditions = {"alpha": alpha,
+                  "v": spec["flight"]["v"] if v is None else v,
+                  "rho": spec["flight"]["rho"] if rho is None else rho}
+    names = list(conditions)
+    values = np.broadcast_arrays(*[np.asarray(conditions[name], dtype=float) for name in names])
+    values = {name: np.ravel(val) for name, val in zip(names, values)}
+    num_points = len(values["alpha"])
+
+    start = time.perf_counter()
+    prob = build_case(spec)
+
+    polar = copy.deepcopy(values)
+    for name in outputs:
+        polar[name] = None
+    for i in range(num_points):
+        for name in names:
+            prob.set_val(name, values[name][i], units=FLIGHT_UNITS[name])
+        prob.run_model()
+        for name, var in outputs.items():
+            val = prob.get_val(var)
+            if polar[name] is None:
+                polar[name] = np.zeros((num_points,) + np.shape(val))
+            polar[name][i] = val
+
+    for name in outputs:
+        if polar[name] is not None and polar[name].shape[1:] == (1,):
+            polar[name] = polar[name][:, 0]
+    polar["time"] = time.perf_counter() - start
+
+    # Leave the pooled problem at the flight conditions of the case
+    for name in names:
+        prob.set_val(name, spec["flight"][name], units=FLIGHT_UNITS[name])
+    return polar
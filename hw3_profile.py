@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Hotspot report of the openmdao.devtools.iprofile dumps
+
+Profile a case script:
+
+    python hw3_profile.py run [-n 20] [--methods openmdao] [-o iprof.0] [--collapsed stacks.txt] hw3_p3b1.py
+
+Report an existing dump:
+
+    python hw3_profile.py report iprof.0 [-n 20] [--collapsed stacks.txt]
+
+The collapsed stacks can be drawn with flamegraph.pl or loaded in speedscope.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Default dump written by iprofile on rank 0
+IPROF_FILE = "iprof.0"
+
+# Instance number of a call name, e.g. the '#1' of '<Problem#1.run_driver>'
+_INSTANCE_RE = re.compile(r"#\d+")
+
+
+class CallNode(object):
+    """
+    Call path of the profile, with the calls made from it as children.
+
+    Parameters
+    ----------
+    name : str
+        Name of the call, last entry of its path.
+    path : str
+        Full call path, names separated by '|'.
+
+    Attributes
+    ----------
+    count : int
+        Number of calls along this path.
+    time : float
+        Inclusive time of the calls, in seconds.
+    children : dict
+        Child nodes, by name.
+    """
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.count = 0
+        self.time = 0.0
+        self.children = {}
+
+    @property
+    def self_time(self):
+        """
+        Time spent in the call itself, not in the profiled calls it made.
+        """
+        # Timer resolution can make the children add up to slightly more than the parent
+        return max(self.time - sum(child.time for child in self.children.values()), 0.0)
+
+    def walk(self):
+        """
+        Iterate over this node and all its descendants, depth first.
+        """
+        yield self
+        for child in self.children.values():
+            yield from child.walk()
+
+
+def function_name(name):
+    """
+    Return the function of a call name, without the system path and instance number.
+
+    Parameters
+    ----------
+    name : str
+        Call name, e.g. 'model.parab.<System._setup_procs>' or '<Problem#1.run_driver>'.
+
+    Returns
+    -------
+    str
+        Function name, e.g. 'System._setup_procs' or 'Problem.run_driver'.
+    """
+    start = name.find("<")
+    if start >= 0 and name.endswith(">"):
+        name = name[start + 1:-1]
+    return _INSTANCE_RE.sub("", name)
+
+
+def parse_iprof(path=IPROF_FILE):
+    """
+    Read an iprofile dump into a call tree.
+
+    Every line of the dump is 'call_path count time', where call_path is the
+    '|' separated list of the calls from '$total' and time is inclusive.
+
+    Parameters
+    ----------
+    path : str
+        Dump file.
+
+    Returns
+    -------
+    root : CallNode
+        The '$total' node.
+    """
+    nodes = {}
+
+    def get_node(call_path):
+        node = nodes.get(call_path)
+        if node is None:
+            parent_path, _, name = call_path.rpartition("|")
+            node = nodes[call_path] = CallNode(name, call_path)
+            if parent_path:
+                get_node(parent_path).children[name] = node
+        return node
+
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            call_path, count, elapsed = line.rsplit(None, 2)
+            node = get_node(call_path)
+            node.count += int(count)
+            node.time += float(elapsed)
+
+    if "$total" not in nodes:
+        raise ValueError("'%s' is not an iprofile dump, it has no '$total' entry." % path)
+    return nodes["$total"]
+
+
+def hotspots(root, top=20):
+    """
+    Aggregate the profile by function and sort it by self time.
+
+    Parameters
+    ----------
+    root : CallNode
+        Root of the call tree.
+    top : int or None
+        Number of functions returned, None for all.
+
+    Returns
+    -------
+    table : list of dict
+        Function name, calls, self time, inclusive time and fraction of the
+        total time of the most expensive functions.
+    """
+    total = root.time
+    funcs = {}
+    for node in root.walk():
+        if node is root:
+            continue
+        func = funcs.setdefault(function_name(node.name), {"calls": 0, "self": 0.0, "inclusive": 0.0})
+        func["calls"] += node.count
+        func["self"] += node.self_time
+        # Recursive calls would count the same time twice
+        if not any(function_name(name) == function_name(node.name) for name in node.path.split("|")[:-1]):
+            func["inclusive"] += node.time
+
+    table = [{"function": name, "calls": func["calls"], "self": func["self"], "inclusive": func["inclusive"],
+              "fraction": func["self"] / total if total > 0 else 0.0}
+             for name, func in funcs.items()]
+    table.sort(key=lambda row: row["self"], reverse=True)
+
+    # Time of '$total' outside of any profiled function
+    untracked = root.self_time
+    if untracked > 0:
+        table.append({"function": "(not profiled)", "calls": root.count, "self": untracked,
+                      "inclusive": untracked, "fraction": untracked / total if total > 0 else 0.0})
+        table.sort(key=lambda row: row["self"], reverse=True)
+
+    return table if top is None else table[:top]
+
+
+def collapsed_stacks(root, units=1e6):
+    """
+    Return the collapsed stacks of the call tree, the input of flamegraph.pl and speedscope.
+
+    Parameters
+    ----------
+    root : CallNode
+        Root of the call tree.
+    units : float
+        Factor converting seconds to the integer sample counts (microseconds by default).
+
+    Returns
+    -------
+    list of str
+        One 'frame;frame;frame count' line per call path with self time.
+    """
+    lines = []
+    for node in root.walk():
+        count = int(round(node.self_time * units))
+        if count > 0:
+            # ';' separates the frames and the spaces the count
+            frames = [name.replace(";", ":").replace(" ", "_") for name in node.path.split("|")]
+            lines.append("%s %d" % (";".join(frames), count))
+    return lines
+
+
+def write_collapsed(root, path):
+    """
+    Write the collapsed stacks of a call tree to a file.
+
+    Parameters
+    ----------
+    root : CallNode
+        Root of the call tree.
+    path : str
+        Output file.
+    """
+    with open(path, "w") as f:
+        for line in collapsed_stacks(root):
+            f.write(line + "\n")
+
+
+def print_hotspots(root, top=20, out=sys.stdout):
+    """
+    Print the hotspot table of a call tree.
+
+    Parameters
+    ----------
+    root : CallNode
+        Root of the call tree.
+    top : int or None
+        Number of functions printed, None for all.
+    out : file
+        Output stream.
+    """
+    print("Total profiled time: %.6f s" % root.time, file=out)
+    print("%10s %10s %6s %8s  %s" % ("self [s]", "incl [s]", "self%", "calls", "function"), file=out)
+    for row in hotspots(root, top):
+        print("%10.6f %10.6f %5.1f%% %8d  %s" % (
+            row["self"], row["inclusive"], 100.0 * row["fraction"], row["calls"], row["function"]), file=out)
+
+
+def profile_script(script, args=(), methods=None, output=None):
+    """
+    Run a script under iprofile and return the call tree of its profile.
+
+    The script is profiled by the 'openmdao iprof_totals' command in a
+    separate process, whose working directory is a temporary directory:
+    the dump (and any file the script writes in its working directory) is
+    not left in the current directory.
+
+    Parameters
+    ----------
+    script : str
+        Python script, run as __main__.
+    args : list of str
+        Command line arguments of the script.
+    methods : str or None
+        iprofile function group (e.g. 'openmdao', 'solver'), None for 'openmdao'.
+    output : str or None
+        File where the dump is copied, discarded if None.
+
+    Returns
+    -------
+    root : CallNode
+        Root of the call tree.
+    """
+    script = os.path.abspath(script)
+    command = [sys.executable, "-m", "openmdao", "iprof_totals", "-o", os.devnull,
+               "-g", methods or "openmdao", script]
+    if args:
+        command += ["--"] + list(args)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, OPENMDAO_WORKDIR=workdir)
+        subprocess.run(command, cwd=workdir, env=env, check=True)
+
+        dump = os.path.join(workdir, IPROF_FILE)
+        root = parse_iprof(dump)
+        if output is not None:
+            shutil.copyfile(dump, output)
+
+    return root
+
+
+def _main(argv=None):
+    parser = argparse.ArgumentParser(description="Hotspot report of openmdao iprofile dumps.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="profile a script and report its hotspots")
+    run.add_argument("script", help="Python script to profile")
+    run.add_argument("args", nargs=argparse.REMAINDER, help="arguments of the script")
+    run.add_argument("--methods", default=None, help="iprofile function group (default 'openmdao')")
+    run.add_argument("-o", "--output", default=None, help="file where the dump is kept (default: discarded)")
+
+    report = commands.add_parser("report", help="report the hotspots of an existing dump")
+    report.add_argument("file", nargs="?", default=IPROF_FILE, help="iprofile dump (default iprof.0)")
+
+    for sub in (run, report):
+        sub.add_argument("-n", "--top", type=int, default=20, help="number of functions in the table")
+        sub.add_argument("--collapsed", default=None, help="file for the collapsed stacks (flame graph)")
+
+    options = parser.parse_args(argv)
+
+    if options.command == "run":
+        root = profile_script(options.script, options.args, options.methods, options.output)
+    else:
+        root = parse_iprof(options.file)
+
+    print_hotspots(root, options.top)
+    if options.collapsed:
+        write_collapsed(root, options.collapsed)
+        print("Collapsed stacks written to %s" % options.collapsed)
+
+
+if __name__ == "__main__":
+    _main()
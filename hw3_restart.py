@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Warm start of an optimization from a recorded case
+
+warm_start loads the last (or best feasible) driver case of a recorder
+file, AsyncRecorder or om.SqliteRecorder, and sets its design variables on
+a set-up problem, so a killed or modified optimization continues from where
+the previous run stopped:
+
+    prob = build_case(spec)
+    warm_start(prob, "hw3_p3b4*_out/aero*.db", which="best")
+    prob.run_driver()
+
+With the wing builder the same is done by the "warm_start" entry of the
+case specification.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import glob
+import os
+
+import numpy as np
+from hw3_async_recorder import read_async_records
+from hw3_columnar import recorder_format
+
+
+def find_recorder_file(pattern):
+    """
+    Return the most recently modified recorder file matching a pattern.
+
+    Parameters
+    ----------
+    pattern : str
+        File name or glob pattern, e.g. 'hw3_p3b4*_out/aero*.db'.
+
+    Returns
+    -------
+    str
+        Recorder file.
+    """
+    files = [path for path in glob.glob(pattern) if os.path.isfile(path)]
+    if not files:
+        raise FileNotFoundError("No recorder file matches '%s'." % pattern)
+    return max(files, key=os.path.getmtime)
+
+
+def _select(values, indices):
+    values = np.asarray(values)
+    return values if indices is None else values.ravel()[indices]
+
+
+def read_driver_cases(path):
+    """
+    Read the design variables, objectives and constraints of the driver cases of a recorder file.
+
+    Parameters
+    ----------
+    path : str
+        AsyncRecorder or om.SqliteRecorder file.
+
+    Returns
+    -------
+    cases : list of dict
+        Counter and 'design_vars', 'objectives' and 'constraints' values of every case.
+    bounds : dict
+        Lower, upper and equals bounds of every constraint, by name.
+    """
+    cases = []
+    bounds = {}
+
+    if recorder_format(path) == "async":
+        records, metadata = read_async_records(path)
+        for name, meta in metadata.get("constraints", {}).items():
+            bounds[name] = {key: meta[key] for key in ("lower", "upper", "equals")}
+
+        for record in records:
+            case = {"counter": record["counter"]}
+            # Full values of the design variables, as in the sqlite branch, so warm_start can set them
+            case["design_vars"] = {name: np.asarray(record["outputs"][meta["source"]])
+                                   for name, meta in metadata.get("design_vars", {}).items()}
+            for key in ("objectives", "constraints"):
+                case[key] = {name: _select(record["outputs"][meta["source"]], meta.get("indices"))
+                             for name, meta in metadata.get(key, {}).items()}
+            cases.append(case)
+    else:
+        import openmdao.api as om
+
+        reader = om.CaseReader(path)
+        variables = reader.problem_metadata["variables"]
+        for case in reader.get_cases("driver", recurse=False):
+            constraints = case.get_constraints(scaled=False)
+            for name in constraints:
+                meta = variables.get(name, {})
+                bounds[name] = {key: meta.get(key) for key in ("lower", "upper", "equals")}
+            cases.append({
+                "counter": case.counter,
+                # Full values, get_design_vars only returns the indices of the design variables
+                "design_vars": {name: case.get_val(name) for name in case.get_design_vars()},
+                "objectives": dict(case.get_objectives(scaled=False)),
+                "constraints": dict(constraints),
+            })
+
+    return cases, bounds
+
+
+def constraint_violation(case, bounds):
+    """
+    Return the largest constraint violation of a case.
+
+    Parameters
+    ----------
+    case : dict
+        Case returned by read_driver_cases.
+    bounds : dict
+        Bounds returned by read_driver_cases.
+
+    Returns
+    -------
+    float
+        Largest violation of a bound, 0 for a feasible case.
+    """
+    violation = 0.0
+    for name, val in case["constraints"].items():
+        val = np.asarray(val, dtype=float)
+        bound = bounds.get(name, {})
+        if bound.get("equals") is not None:
+            violation = max(violation, np.max(np.abs(val - bound["equals"])))
+        if bound.get("lower") is not None:
+            violation = max(violation, np.max(bound["lower"] - val))
+        if bound.get("upper") is not None:
+            violation = max(violation, np.max(val - bound["upper"]))
+    return float(violation)
+
+
+def select_case(path, which="last", tol=1e-6):
+    """
+    Return the driver case of a recorder file to restart from.
+
+    Parameters
+    ----------
+    path : str
+        AsyncRecorder or om.SqliteRecorder file, or a glob pattern (the newest match is used).
+    which : str
+        "last" for the last case, "best" for the feasible case with the lowest
+        objective (the least infeasible case if none is feasible).
+    tol : float
+        Constraint violation allowed in a feasible case.
+
+    Returns
+    -------
+    case : dict
+        Case returned by read_driver_cases, with its 'violation' and 'file'.
+    """
+    if not os.path.isfile(path):
+        path = find_recorder_file(path)
+
+    cases, bounds = read_driver_cases(path)
+    if not cases:
+        raise ValueError("'%s' has no driver cases." % path)
+    for case in cases:
+        case["violation"] = constraint_violation(case, bounds)
+        case["file"] = path
+
+    if which == "last":
+        return cases[-1]
+    if which == "best":
+        feasible = [case for case in cases if case["violation"] <= tol]
+        if not feasible:
+            return min(cases, key=lambda case: case["violation"])
+        return min(feasible, key=lambda case: float(np.sum(list(case["objectives"].values())[0])))
+
+    raise ValueError("Unknown case '%s', use 'last' or 'best'." % which)
+
+
+def warm_start(prob, path, which="last", tol=1e-6):
+    """
+    Set the design variables of a set-up problem from a recorded driver case.
+
+    Only the design variables of the problem are set, the ones missing from
+    the recorded case keep their values.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Set-up problem.
+    path : str
+        AsyncRecorder or om.SqliteRecorder file, or a glob pattern (the newest match is used).
+    which : str
+        "last" or "best", see select_case.
+    tol : float
+        Constraint violation allowed in a feasible case.
+
+    Returns
+    -------
+    case : dict
+        Case the problem was started from, see select_case.
+    """
+    case = select_case(path, which, tol)
+
+    for name in prob.model.get_design_vars(get_sizes=False):
+        if name in case["design_vars"]:
+            prob.set_val(name, case["design_vars"][name])
+
+    return case
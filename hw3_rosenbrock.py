@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - N-dimensional Rosenbrock component and optimizer scaling study
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import json
+import time
+
+import numpy as np
+import openmdao.api as om
+
+# File where the results of the scaling study are stored
+SCALING_FILE = "rosenbrock_scaling.json"
+
+
+class RosenbrockND(om.ExplicitComponent):
+    """
+    N-dimensional Rosenbrock function with analytic sparse partials.
+
+    f(x) = sum_i 100*(x[i+1] - x[i]**2)**2 + (1 - x[i])**2, i = 0..n-2
+
+    With vec_size > 1 the component evaluates a batch of vec_size points at
+    once. Each f only depends on the x of its own point, so row k of the
+    jacobian (the dense gradient of f[k]) has its n non-zeros in columns
+    k*n .. (k+1)*n - 1.
+
+    Options
+    -------
+    n : int
+        Number of dimensions (design variables per point).
+    vec_size : int
+        Number of points evaluated at once.
+
+    Parameters
+    ----------
+    x : numpy array
+        Points, shape (vec_size, n).
+
+    Returns
+    -------
+    f : numpy array
+        Rosenbrock function of each point, shape (vec_size,).
+
+    """
+
+    def initialize(self):
+        self.options.declare("n", types=int, default=2, lower=2)
+        self.options.declare("vec_size", types=int, default=1, lower=1)
+
+    def setup(self):
+        n = self.options["n"]
+        vec_size = self.options["vec_size"]
+
+        self.add_input("x", val=np.zeros((vec_size, n)))
+        self.add_output("f", val=np.zeros(vec_size))
+
+        rows = np.repeat(np.arange(vec_size), n)
+        cols = np.arange(vec_size * n)
+        self.declare_partials("f", "x", rows=rows, cols=cols)
+
+    def compute(self, inputs, outputs):
+        x = inputs["x"]
+        x0 = x[:, :-1]
+        x1 = x[:, 1:]
+
+        outputs["f"] = np.sum(100.0 * (x1 - x0**2)**2 + (1.0 - x0)**2, axis=1)
+
+    def compute_partials(self, inputs, partials):
+        x = inputs["x"]
+        x0 = x[:, :-1]
+        x1 = x[:, 1:]
+
+        grad = np.zeros_like(x)
+        grad[:, :-1] = -400.0 * x0 * (x1 - x0**2) - 2.0 * (1.0 - x0)
+        grad[:, 1:] += 200.0 * (x1 - x0**2)
+
+        partials["f", "x"] = grad.ravel()
+
+
+def rosenbrock_start(n):
+    """
+    Return the classic starting point (-1.2, 1.0, -1.2, 1.0, ...).
+
+    Parameters
+    ----------
+    n : int
+        Number of dimensions.
+
+    Returns
+    -------
+    numpy array
+        Starting point of shape (n,).
+    """
+    x0 = np.ones(n)
+    x0[::2] = -1.2
+    return x0
+
+
+def default_maxiter(n):
+    """
+    Return the iteration limit of the Rosenbrock optimization with n design variables.
+
+    The coupling of x[i] and x[i+1] makes the iterations of a quasi-Newton
+    method grow about linearly with n (L-BFGS-B needs about 5800 iterations
+    at n = 1000 and 58000 at n = 10^4), so the limit scales with n.
+
+    Parameters
+    ----------
+    n : int
+        Number of design variables.
+
+    Returns
+    -------
+    int
+        Maximum number of optimizer iterations.
+    """
+    return max(1000, 10 * n)
+
+
+def build_rosenbrock_problem(n, optimizer="SLSQP", maxiter=None, tol=1e-9):
+    """
+    Build the unconstrained N-dimensional Rosenbrock optimization.
+
+    Parameters
+    ----------
+    n : int
+        Number of design variables.
+    optimizer : str
+        ScipyOptimizeDriver optimizer.
+    maxiter : int or None
+        Maximum number of optimizer iterations, default_maxiter(n) if None.
+    tol : float
+        Optimizer tolerance.
+
+    Returns
+    -------
+    prob : om.Problem
+        Set-up problem.
+    """
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem("rosen", RosenbrockND(n=n), promotes_inputs=["x"])
+    prob.model.set_input_defaults("x", rosenbrock_start(n).reshape(1, n))
+
+    prob.driver = om.ScipyOptimizeDriver()
+    prob.driver.options["optimizer"] = optimizer
+    if maxiter is None:
+        maxiter = default_maxiter(n)
+    prob.driver.options["maxiter"] = maxiter
+    prob.driver.options["tol"] = tol
+    prob.driver.options["disp"] = False
+    if optimizer == "L-BFGS-B":
+        # Function evaluations are limited separately (15000 by default)
+        prob.driver.opt_settings["maxfun"] = 2 * maxiter
+
+    prob.model.add_design_var("x", lower=-2, upper=2)
+    prob.model.add_objective("rosen.f")
+
+    prob.setup()
+    return prob
+
+
+def evaluate_batch(points):
+    """
+    Evaluate the Rosenbrock function on a batch of points in a single compute call.
+
+    Parameters
+    ----------
+    points : array_like
+        Points, shape (num_points, n).
+
+    Returns
+    -------
+    numpy array
+        Function value of each point.
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    vec_size, n = points.shape
+
+    prob = om.Problem(reports=False)
+    prob.model.add_subsystem("rosen", RosenbrockND(n=n, vec_size=vec_size), promotes_inputs=["x"])
+    prob.setup()
+    prob.set_val("x", points)
+    prob.run_model()
+
+    return prob.get_val("rosen.f").copy()
+
+
+def run_rosenbrock(n, optimizer="SLSQP", maxiter=None):
+    """
+    Optimize the N-dimensional Rosenbrock function and measure the cost.
+
+    Parameters
+    ----------
+    n : int
+        Number of design variables.
+    optimizer : str
+        ScipyOptimizeDriver optimizer.
+    maxiter : int or None
+        Maximum number of optimizer iterations, default_maxiter(n) if None.
+
+    Returns
+    -------
+    result : dict
+        Final function value, distance to the optimum (1, ..., 1), number of
+        iterations, success of the optimizer, optimization time and time of
+        one compute_totals.
+    """
+    prob = build_rosenbrock_problem(n, optimizer, maxiter)
+
+    start = time.perf_counter()
+    prob.run_driver()
+    opt_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prob.compute_totals()
+    totals_time = time.perf_counter() - start
+
+    x = prob.get_val("x").ravel()
+    return {
+        "n": n,
+        "optimizer": optimizer,
+        "f": float(prob.get_val("rosen.f")[0]),
+        "error": float(np.linalg.norm(x - 1.0)),
+        "iterations": prob.driver.iter_count,
+        "success": bool(prob.driver.result.success),
+        "time": opt_time,
+        "totals_time": totals_time,
+    }
+
+
+def run_scaling_study(ns=(2, 10, 100, 1000, 10000), optimizers=("SLSQP", "L-BFGS-B"), max_dense_n=1000,
+                      output=SCALING_FILE):
+    """
+    Run the Rosenbrock optimization for increasing numbers of design variables.
+
+    Parameters
+    ----------
+    ns : list of int
+        Numbers of design variables.
+    optimizers : list of str
+        ScipyOptimizeDriver optimizers to compare.
+    max_dense_n : int
+        SLSQP works with dense matrices, so it is only run up to this size.
+    output : str or None
+        JSON file where the results are written, skipped if None.
+
+    Returns
+    -------
+    results : list of dict
+        One entry per optimizer and size, see run_rosenbrock.
+    """
+    results = []
+    for optimizer in optimizers:
+        for n in ns:
+            if optimizer == "SLSQP" and n > max_dense_n:
+                continue
+            results.append(run_rosenbrock(n, optimizer))
+
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump({"cases": results}, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    print("%10s %7s %12s %10s %6s %10s %12s %7s" % ("optimizer", "n", "f", "|x - 1|", "iter", "time [s]",
+                                                     "totals [s]", "solved"))
+    for result in run_scaling_study():
+        # A failed optimization (e.g. at its iteration limit) is reported as such, not as a solution
+        print("%10s %7d %12.4e %10.2e %6d %10.3f %12.6f %7s" % (
+            result["optimizer"], result["n"], result["f"], result["error"], result["iterations"],
+            result["time"], result["totals_time"], "yes" if result["success"] else "FAILED"))
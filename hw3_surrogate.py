@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Surrogate of the aerodynamic point trained from recorded cases
+
+SurrogateAeroPoint replaces the Geometry group and the AeroPoint of a wing
+case by Kriging (or RBF) surrogates of the outputs of the point, trained on
+the driver cases of recorder files (AsyncRecorder or om.SqliteRecorder).
+With the wing builder it is selected by the "surrogate" entry of a case:
+
+    spec["surrogate"] = {
+        "files": ["hw3_p3b2*_out/aero*.db"],
+        "inputs": ["alpha", "wing.twist_cp"],
+        "outputs": ["aero_point_0.wing_perf.CD", "aero_point_0.wing_perf.CL"],
+    }
+
+The inputs are model-level names (flight conditions or geometry inputs),
+the outputs keep the names they have with AeroPoint. The Kriging surrogates
+also output the estimated error of every output, '<output>_rmse', and
+run_surrogate_case checks it (and the real VLM) at the optimum, falling
+back to the optimization of the real case when it is too high.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import copy
+import glob
+import time
+
+import numpy as np
+import openmdao.api as om
+from hw3_columnar import read_columns
+
+# Surrogate models by name
+SURROGATES = ("kriging", "rbf")
+
+# Default surrogate options of a case
+DEFAULT_SURROGATE = {
+    "files": [],
+    "inputs": ["alpha"],
+    "outputs": ["aero_point_0.wing_perf.CD", "aero_point_0.wing_perf.CL"],
+    "surrogate": "kriging",
+    # Largest number of training points, the recorded cases nearest to the
+    # initial design are used (Kriging training grows as num_points**3)
+    "max_points": 200,
+    # Largest error allowed at the optimum, relative to the output value
+    "max_error": 1e-3,
+}
+
+
+def complete_surrogate(options):
+    """
+    Return a copy of surrogate options with the missing entries taken from DEFAULT_SURROGATE.
+
+    Parameters
+    ----------
+    options : dict
+        Surrogate options of a case.
+
+    Returns
+    -------
+    dict
+        Full surrogate options.
+    """
+    full = copy.deepcopy(DEFAULT_SURROGATE)
+    full.update(copy.deepcopy(options))
+    return full
+
+
+def training_data(files, inputs, outputs, center=None, max_points=None):
+    """
+    Read the training data of a surrogate from recorder files.
+
+    Patterns that match no file, files without one of the variables, or
+    where it has another size, are skipped, and repeated points are kept
+    only once.
+
+    Parameters
+    ----------
+    files : list of str
+        AsyncRecorder or om.SqliteRecorder files or glob patterns.
+    inputs : list of str
+        Model-level names of the surrogate inputs.
+    outputs : list of str
+        Names of the surrogate outputs.
+    center : dict or None
+        Values of the inputs around which the training points are selected.
+    max_points : int or None
+        Largest number of training points, the nearest to center (in input
+        space scaled by the spread of every input) or the last recorded
+        ones without center. All of them if None.
+
+    Returns
+    -------
+    x : dict
+        Training values of every input, shape (num_points, size).
+    y : dict
+        Training values of every output, shape (num_points, size).
+    """
+    paths = []
+    for pattern in files:
+        # A pattern that matches nothing is skipped (a file path matches itself)
+        paths.extend(sorted(glob.glob(pattern)))
+
+    columns = {name: [] for name in inputs + outputs}
+    sizes = {}
+    for path in paths:
+        try:
+            data = read_columns(path, inputs + outputs)
+        except KeyError:
+            continue
+        if not data["_counter"]:
+            continue
+        data = {name: np.array(values, dtype=float).reshape(len(values), -1) for name, values in data.items()}
+        if any(sizes.setdefault(name, data[name].shape[1]) != data[name].shape[1] for name in columns):
+            continue
+        for name in columns:
+            columns[name].append(data[name])
+
+    if not any(len(values) for values in columns.values()):
+        raise ValueError("No recorder file of %s has all the variables %s." % (files, inputs + outputs))
+
+    columns = {name: np.concatenate(values) for name, values in columns.items()}
+    points = np.hstack([columns[name] for name in inputs])
+    _, selected = np.unique(points, axis=0, return_index=True)
+    selected.sort()
+
+    if max_points is not None and len(selected) > max_points:
+        if center is None:
+            selected = selected[-max_points:]
+        else:
+            center = np.hstack([np.broadcast_to(center[name], columns[name].shape[1:]) for name in inputs])
+            scale = np.maximum(np.std(points[selected], axis=0), 1e-12)
+            distance = np.linalg.norm((points[selected] - center) / scale, axis=1)
+            selected = np.sort(selected[np.argsort(distance)[:max_points]])
+
+    x = {name: columns[name][selected] for name in inputs}
+    y = {name: columns[name][selected] for name in outputs}
+    return x, y
+
+
+def initial_values(spec, inputs):
+    """
+    Return the initial values of the surrogate inputs of a case.
+
+    Parameters
+    ----------
+    spec : dict
+        Full case specification of hw3_wing_builder.
+    inputs : list of str
+        Model-level names of the surrogate inputs.
+
+    Returns
+    -------
+    dict or None
+        Initial value of every input, None if one is not in the specification.
+    """
+    from hw3_wing_builder import DEFAULT_SURFACE
+
+    surface = dict(DEFAULT_SURFACE, **spec["surface"])
+    values = {}
+    for name in inputs:
+        local = name[len(surface["name"]) + 1:] if name.startswith(surface["name"] + ".") else None
+        if name in spec["flight"]:
+            values[name] = np.atleast_1d(spec["flight"][name])
+        elif local in surface:
+            values[name] = np.atleast_1d(surface[local])
+        else:
+            return None
+    return values
+
+
+def local_name(name):
+    """
+    Return the name of a model-level variable within the surrogate group.
+    """
+    return name.replace(".", "_")
+
+
+class RMSEKrigingSurrogate(om.KrigingSurrogate):
+    """
+    KrigingSurrogate that keeps the error estimate of its last prediction.
+
+    Attributes
+    ----------
+    rmse : ndarray or None
+        Root mean squared error estimate of the last prediction, None before the first.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(eval_rmse=True, **kwargs)
+        self.rmse = None
+
+    def predict(self, x):
+        y, self.rmse = super().predict(x)
+        return y
+
+
+class SurrogateMetaModel(om.MetaModelUnStructuredComp):
+    """
+    MetaModelUnStructuredComp that also outputs the error estimate of the Kriging surrogates.
+
+    Every output with a surrogate that keeps the error estimate of its
+    predictions (RMSEKrigingSurrogate) gets an '<output>_rmse' output with
+    the estimate (zero otherwise).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # (name, shape, surrogate) of every surrogate output
+        self._rmse_sources = []
+
+    def add_output(self, name, val=1.0, training_data=None, surrogate=None, **kwargs):
+        super().add_output(name, val=val, training_data=training_data, surrogate=surrogate, **kwargs)
+        self._rmse_sources.append((name, np.shape(val), surrogate))
+
+    def add_rmse_outputs(self):
+        """
+        Add the '<output>_rmse' outputs, after all the surrogate outputs.
+        """
+        for name, shape, _ in self._rmse_sources:
+            # Plain output, not predicted by a surrogate
+            om.ExplicitComponent.add_output(self, name + "_rmse", val=np.zeros(shape))
+
+    def compute(self, inputs, outputs):
+        super().compute(inputs, outputs)
+        for name, shape, surrogate in self._rmse_sources:
+            rmse = getattr(surrogate, "rmse", None)
+            outputs[name + "_rmse"] = 0.0 if rmse is None else np.reshape(rmse, shape)
+
+
+class SurrogateAeroPoint(om.Group):
+    """
+    Group with the surrogates of the outputs of an AeroPoint.
+
+    The outputs are trained on recorded cases, see training_data. Its
+    inputs are promoted to the model-level names of the training inputs by
+    the wing builder, see promotes_inputs.
+    """
+
+    def initialize(self):
+        self.options.declare("point_name", types=str, desc="Name of the replaced AeroPoint")
+        self.options.declare("inputs", types=list, desc="Model-level names of the inputs")
+        self.options.declare("outputs", types=list, desc="Names of the outputs, starting with point_name")
+        self.options.declare("x", types=dict, desc="Training values of the inputs")
+        self.options.declare("y", types=dict, desc="Training values of the outputs")
+        self.options.declare("surrogate", default="kriging", values=SURROGATES, desc="Surrogate model")
+
+    @staticmethod
+    def promotes_inputs(inputs):
+        """
+        Return the promotions of the surrogate inputs to their model-level names.
+
+        Parameters
+        ----------
+        inputs : list of str
+            Model-level names of the inputs.
+
+        Returns
+        -------
+        list of tuple
+            (local name, model-level name) of every input.
+        """
+        return [(local_name(name), name) for name in inputs]
+
+    def _surrogate(self):
+        if self.options["surrogate"] == "kriging":
+            return RMSEKrigingSurrogate()
+        return om.NearestNeighbor(interpolant_type="rbf")
+
+    def setup(self):
+        point_name = self.options["point_name"]
+        x = self.options["x"]
+        y = self.options["y"]
+
+        # One meta model per subsystem of the outputs, e.g. wing_perf for aero_point_0.wing_perf.CD
+        subsystems = {}
+        for name in self.options["outputs"]:
+            if not name.startswith(point_name + "."):
+                raise ValueError("Surrogate output '%s' is not an output of %s." % (name, point_name))
+            path = name[len(point_name) + 1:].split(".")
+            if len(path) > 2:
+                raise ValueError("Surrogate output '%s' is too deep in %s." % (name, point_name))
+            subsystems.setdefault(path[0] if len(path) == 2 else None, []).append((path[-1], name))
+
+        for subsystem, outputs in subsystems.items():
+            meta_model = SurrogateMetaModel()
+            for name in self.options["inputs"]:
+                size = x[name].shape[1]
+                meta_model.add_input(local_name(name), val=np.zeros(size) if size > 1 else 0.0,
+                                     training_data=x[name] if size > 1 else x[name][:, 0])
+            for var, name in outputs:
+                size = y[name].shape[1]
+                meta_model.add_output(var, val=np.zeros(size) if size > 1 else 0.0,
+                                      training_data=y[name] if size > 1 else y[name][:, 0],
+                                      surrogate=self._surrogate())
+            meta_model.add_rmse_outputs()
+            self.add_subsystem(subsystem or "surrogate", meta_model, promotes_inputs=["*"],
+                               promotes_outputs=None if subsystem else ["*"])
+
+
+def surrogate_error(prob, options):
+    """
+    Return the largest error estimate of the surrogate outputs, relative to their values.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Run problem with a SurrogateAeroPoint.
+    options : dict
+        Surrogate options of the case.
+
+    Returns
+    -------
+    float
+        Largest rmse / |value| over the outputs, nan without error estimates.
+    """
+    if options["surrogate"] != "kriging":
+        return np.nan
+    return max(float(np.max(np.abs(prob.get_val(name + "_rmse")) / np.maximum(np.abs(prob.get_val(name)), 1e-30)))
+               for name in options["outputs"])
+
+
+def run_surrogate_case(spec, verify=True, verbose=True):
+    """
+    Optimize a case on its surrogate, falling back to the real VLM if the surrogate is not accurate enough.
+
+    The optimum of the surrogate is accepted when the error estimate of its
+    outputs and, with verify, their error against the real VLM at the
+    optimum are within max_error. Otherwise (or if the optimization of the
+    surrogate fails) the real case is optimized,
+    starting from the optimum of the surrogate.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification of hw3_wing_builder, with a "surrogate" entry.
+    verify : bool
+        If True, also evaluate the real VLM at the optimum of the surrogate.
+    verbose : bool
+        If True, print the errors and the model used.
+
+    Returns
+    -------
+    prob : om.Problem
+        Problem of the accepted optimum, with a SurrogateAeroPoint or the real AeroPoint.
+    info : dict
+        'fallback' (True if the real case was optimized), 'estimated_error',
+        'verified_error' (nan without verify) and the 'time' of each stage. Without
+        error estimate (RBF) nor verify, the surrogate optimum is accepted.
+    """
+    from hw3_continuation import transfer_design
+    from hw3_wing_builder import build_case, complete_spec
+
+    spec = complete_spec(spec)
+    options = complete_surrogate(spec["surrogate"])
+    real_spec = copy.deepcopy(spec)
+    real_spec["surrogate"] = None
+    info = {"fallback": False, "verified_error": np.nan, "time": {}}
+
+    start = time.perf_counter()
+    prob = build_case(spec)
+    prob.run_driver()
+    info["time"]["surrogate"] = time.perf_counter() - start
+    info["estimated_error"] = error = surrogate_error(prob, options)
+    if not prob.driver.result.success:
+        error = np.inf
+
+    if verify and not error > options["max_error"]:
+        start = time.perf_counter()
+        real = build_case(transfer_design(prob, real_spec))
+        real.run_model()
+        info["verified_error"] = max(
+            float(np.max(np.abs(real.get_val(name) - prob.get_val(name)) /
+                         np.maximum(np.abs(real.get_val(name)), 1e-30)))
+            for name in options["outputs"])
+        info["time"]["verify"] = time.perf_counter() - start
+        error = info["verified_error"]
+
+    if error > options["max_error"]:
+        start = time.perf_counter()
+        prob = build_case(transfer_design(prob, real_spec))
+        prob.run_driver()
+        info["time"]["fallback"] = time.perf_counter() - start
+        info["fallback"] = True
+
+    if verbose:
+        print("Surrogate error: estimated %.2e, verified %.2e (max %.0e), %s model used" % (
+            info["estimated_error"], info["verified_error"], options["max_error"],
+            "real" if info["fallback"] else "surrogate"))
+
+    return prob, info
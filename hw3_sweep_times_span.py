@@ -13,34 +13,49 @@ Assignment 3 - Problem 3 c) - Function Sweep times Span
  ========================================================================
 """
 
+import numpy as np
 import openmdao.api as om
 
 class SweepTimesSpan(om.ExplicitComponent):
     """
     Calculate sweep times span as an aerodynamic function.
 
+    The component is vectorized: with vec_size > 1 it evaluates vec_size
+    independent wings (or flight points) in one compute call.
+
+    Options
+    -------
+    vec_size : int
+        Number of sweep/span pairs evaluated at once.
+
     Parameters
     ----------
-    sweep : float
-        Wing sweep angle in degrees.
-    span : float
-        Wing span in meters.
+    sweep : numpy array
+        Wing sweep angle in degrees, shape (vec_size,).
+    span : numpy array
+        Wing span in meters, shape (vec_size,).
 
     Returns
     -------
-    sweep_times_span : float
-        Sweep times span value.
+    sweep_times_span : numpy array
+        Sweep times span value, shape (vec_size,).
 
     """
 
+    def initialize(self):
+        self.options.declare("vec_size", types=int, default=1, lower=1)
+
     def setup(self):
-        self.add_input("sweep", val=1.0, units="deg")
-        self.add_input("span", val=0.0, units="m")
-        #self.add_input("mesh")
-        self.add_output("sweep_times_span", val=0.0, units="deg*m")
+        n = self.options["vec_size"]
 
-        self.declare_partials("sweep_times_span", "sweep")
-        self.declare_partials("sweep_times_span", "span")
+        self.add_input("sweep", val=np.ones(n), units="deg")
+        self.add_input("span", val=np.zeros(n), units="m")
+        self.add_output("sweep_times_span", val=np.zeros(n), units="deg*m")
+
+        # Each output only depends on its own sweep and span, the jacobians are diagonal
+        arange = np.arange(n)
+        self.declare_partials("sweep_times_span", "sweep", rows=arange, cols=arange)
+        self.declare_partials("sweep_times_span", "span", rows=arange, cols=arange)
     
 
     def compute(self, inputs, outputs):
@@ -55,3 +70,105 @@ class SweepTimesSpan(om.ExplicitComponent):
 
         partials["sweep_times_span", "sweep"] = -span/sweep**2
         partials["sweep_times_span", "span"] = 1/sweep
+
+
+class MeshSweepSpan(om.ExplicitComponent):
+    """
+    Compute the leading-edge sweep and the span of a wing from its mesh.
+
+    The sweep is the angle of the least-squares line through the leading-edge
+    nodes of the (left) half-wing, so it follows the actual geometry when the
+    chord, twist or shear distributions bend the leading edge. Only the
+    leading-edge nodes enter the computation, so the cost and the number of
+    non-zero partials grow linearly with num_y.
+
+    Options
+    -------
+    num_x : int
+        Number of chordwise mesh points.
+    num_y : int
+        Number of spanwise mesh points.
+    symmetry : bool
+        True if the mesh only defines the left half of the wing.
+
+    Parameters
+    ----------
+    mesh : numpy array
+        Nodal coordinates of the wing, shape (num_x, num_y, 3).
+
+    Returns
+    -------
+    sweep : float
+        Leading-edge sweep angle in degrees.
+    span : float
+        Wing span in meters (full span, also for symmetric meshes).
+
+    """
+
+    def initialize(self):
+        self.options.declare("num_x", types=int)
+        self.options.declare("num_y", types=int)
+        self.options.declare("symmetry", types=bool, default=True)
+
+    def setup(self):
+        num_x = self.options["num_x"]
+        num_y = self.options["num_y"]
+
+        # Leading-edge nodes of the left half-wing, from the tip to the root
+        if self.options["symmetry"]:
+            self.half = np.arange(num_y)
+        else:
+            self.half = np.arange((num_y + 1) // 2)
+
+        self.add_input("mesh", val=np.zeros((num_x, num_y, 3)), units="m")
+        self.add_output("sweep", val=0.0, units="deg")
+        self.add_output("span", val=0.0, units="m")
+
+        # Flat indices of the x and y coordinates of the leading-edge nodes (mesh[0, j, :])
+        self.x_idx = self.half * 3
+        self.y_idx = self.half * 3 + 1
+        if self.options["symmetry"]:
+            self.span_idx = np.array([self.y_idx[0], self.y_idx[-1]])
+        else:
+            self.span_idx = np.array([1, (num_y - 1) * 3 + 1])
+
+        self.declare_partials("sweep", "mesh", rows=np.zeros(2 * len(self.half), dtype=int),
+                              cols=np.concatenate([self.x_idx, self.y_idx]))
+        self.declare_partials("span", "mesh", rows=np.zeros(2, dtype=int), cols=self.span_idx,
+                              val=np.array([-1.0, 1.0]) * (2.0 if self.options["symmetry"] else 1.0))
+
+    def _fit(self, mesh):
+        # Leading-edge x versus the spanwise distance u to the root
+        le = mesh[0, self.half, :]
+        x = le[:, 0]
+        u = le[-1, 1] - le[:, 1]
+
+        du = u - u.mean()
+        dx = x - x.mean()
+        s_uu = du.dot(du)
+        s_ux = du.dot(dx)
+
+        return du, dx, s_uu, s_ux / s_uu
+
+    def compute(self, inputs, outputs):
+        mesh = inputs["mesh"]
+
+        _, _, _, slope = self._fit(mesh)
+        outputs["sweep"] = np.arctan(slope) * 180.0 / np.pi
+
+        if self.options["symmetry"]:
+            outputs["span"] = 2.0 * (mesh[0, -1, 1] - mesh[0, 0, 1])
+        else:
+            outputs["span"] = mesh[0, -1, 1] - mesh[0, 0, 1]
+
+    def compute_partials(self, inputs, partials):
+        du, dx, s_uu, slope = self._fit(inputs["mesh"])
+
+        # d(slope)/dx_j and d(slope)/du_j of the least-squares slope. The slope
+        # does not change if u is shifted, so the root y only enters through
+        # its own node and d(slope)/dy_j = -d(slope)/du_j.
+        dslope_dx = du / s_uu
+        dslope_du = (dx - 2.0 * slope * du) / s_uu
+
+        dsweep_dslope = 180.0 / np.pi / (1.0 + slope**2)
+        partials["sweep", "mesh"] = dsweep_dslope * np.concatenate([dslope_dx, -dslope_du])
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Components generated from symbolic expressions
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import hashlib
+import importlib.util
+import os
+import tempfile
+
+import numpy as np
+import openmdao.api as om
+
+# Directory of the generated modules, can be changed with the HW3_SYMBOLIC_CACHE environment variable
+CACHE_DIR = os.environ.get("HW3_SYMBOLIC_CACHE", ".symbolic_cache")
+
+# Bump when the layout of the generated modules changes, so old modules are regenerated
+GENERATOR_VERSION = 1
+
+_MODULE_TEMPLATE = '''# Generated by hw3_symbolic, do not edit
+import numpy
+
+EXPRESSION = {expression!r}
+INPUTS = {inputs!r}
+DERIVATIVES = {derivatives!r}
+
+
+def value({args}):
+    return {value}
+
+
+def partials({args}):
+    return [{partials}]
+'''
+
+# Modules already loaded in this process, by key
+_loaded = {}
+
+
+def symbolic_key(expr, inputs):
+    """
+    Return the cache key of an expression and its inputs.
+
+    Parameters
+    ----------
+    expr : str or sympy expression
+        Expression of the inputs.
+    inputs : list of str
+        Names of the inputs, in the order of the arguments of the generated functions.
+
+    Returns
+    -------
+    str
+        Hexadecimal key.
+    """
+    text = "%d|%s|%s" % (GENERATOR_VERSION, str(expr), ",".join(inputs))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def generate_source(expr, inputs):
+    """
+    Differentiate an expression with sympy and return the source of its NumPy module.
+
+    Parameters
+    ----------
+    expr : str or sympy expression
+        Expression of the inputs.
+    inputs : list of str
+        Names of the inputs.
+
+    Returns
+    -------
+    str
+        Python source defining value(*inputs) and partials(*inputs).
+    """
+    # sympy is only needed (and imported) when a module is not cached yet
+    import sympy
+    from sympy.printing.numpy import NumPyPrinter
+
+    symbols = sympy.symbols(inputs)
+    local = dict(zip(inputs, symbols))
+    expression = sympy.sympify(expr, locals=local)
+    derivatives = [expression.diff(symbol) for symbol in symbols]
+
+    printer = NumPyPrinter()
+    return _MODULE_TEMPLATE.format(
+        expression=str(expression),
+        inputs=tuple(inputs),
+        derivatives={name: str(d) for name, d in zip(inputs, derivatives)},
+        args=", ".join(inputs),
+        value=printer.doprint(expression),
+        partials=", ".join(printer.doprint(d) for d in derivatives),
+    )
+
+
+def load_symbolic(expr, inputs, cache_dir=CACHE_DIR):
+    """
+    Return the NumPy module of an expression, generating it only if it is not cached.
+
+    Parameters
+    ----------
+    expr : str or sympy expression
+        Expression of the inputs.
+    inputs : list of str
+        Names of the inputs.
+    cache_dir : str
+        Directory of the generated modules.
+
+    Returns
+    -------
+    module
+        Module with value(*inputs), partials(*inputs) (list of the derivatives
+        with respect to each input), and the EXPRESSION and DERIVATIVES strings.
+    """
+    inputs = list(inputs)
+    key = symbolic_key(expr, inputs)
+    if key in _loaded:
+        return _loaded[key]
+
+    path = os.path.join(cache_dir, "sym_%s.py" % key)
+    if not os.path.exists(path):
+        source = generate_source(expr, inputs)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Write to a temporary file and rename it, so concurrent processes never load a partial module
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(source)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    spec = importlib.util.spec_from_file_location("sym_%s" % key, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    _loaded[key] = module
+    return module
+
+
+class SymbolicComp(om.ExplicitComponent):
+    """
+    Explicit component computing a symbolic expression and its exact partials.
+
+    The value and the derivatives are NumPy code generated from the expression
+    with sympy and cached on disk, so sympy is only imported the first time an
+    expression is used. The expression is evaluated element-wise, so inputs
+    and output can be arrays of any shape and the jacobians are diagonal.
+
+    A subclass can set EXPR, INPUTS and OUTPUT as class attributes, they are
+    the defaults of the expr, inputs and output options:
+
+        class Paraboloid_analytical(SymbolicComp):
+            EXPR = "(1 - x)**2 + 100*(y - x**2)**2"
+            INPUTS = ["x", "y"]
+            OUTPUT = "f_xy"
+
+    Options
+    -------
+    expr : str or sympy expression
+        Expression of the inputs.
+    inputs : list of str
+        Names of the inputs.
+    output : str
+        Name of the output.
+    shape : int or tuple
+        Shape of the inputs and of the output.
+    cache_dir : str
+        Directory of the generated modules.
+
+    """
+
+    # Defaults of the expr, inputs and output options
+    EXPR = None
+    INPUTS = None
+    OUTPUT = None
+
+    def initialize(self):
+        self.options.declare("expr", default=self.EXPR)
+        self.options.declare("inputs", default=self.INPUTS, types=list, allow_none=self.INPUTS is None)
+        self.options.declare("output", default=self.OUTPUT, types=str, allow_none=self.OUTPUT is None)
+        self.options.declare("shape", default=1, types=(int, tuple))
+        self.options.declare("cache_dir", default=CACHE_DIR, types=str)
+
+    def setup(self):
+        shape = self.options["shape"]
+        output = self.options["output"]
+
+        self._funcs = load_symbolic(self.options["expr"], self.options["inputs"], self.options["cache_dir"])
+
+        for name in self.options["inputs"]:
+            self.add_input(name, val=np.zeros(shape))
+        self.add_output(output, val=np.zeros(shape))
+
+        arange = np.arange(int(np.prod(shape)))
+        for name in self.options["inputs"]:
+            self.declare_partials(output, name, rows=arange, cols=arange)
+
+    def compute(self, inputs, outputs):
+        args = [inputs[name] for name in self.options["inputs"]]
+        outputs[self.options["output"]] = self._funcs.value(*args)
+
+    def compute_partials(self, inputs, partials):
+        shape = self.options["shape"]
+        output = self.options["output"]
+
+        args = [inputs[name] for name in self.options["inputs"]]
+        for name, derivative in zip(self.options["inputs"], self._funcs.partials(*args)):
+            # Constant derivatives come back as scalars
+            partials[output, name] = np.broadcast_to(derivative, shape).ravel()
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Mesh Convergence Study - Phase-resolved timing harness
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Phases of one analysis, in the order they are executed
+PHASES = ["mesh", "build", "setup", "final_setup", "solve"]
+
+# File where the results of the timing study are stored
+TIMING_FILE = "timing_study.json"
+
+
+class PhaseTimer(object):
+    """
+    Accumulate wall (perf_counter) and CPU (process_time) time per named phase.
+
+    Attributes
+    ----------
+    wall : dict
+        Wall time in seconds of each phase.
+    cpu : dict
+        CPU time in seconds of each phase.
+    """
+
+    def __init__(self):
+        self.wall = {}
+        self.cpu = {}
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the body of a with block as the given phase.
+
+        Parameters
+        ----------
+        name : str
+            Name of the phase, time spent on a repeated phase is added up.
+        """
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            self.wall[name] = self.wall.get(name, 0.0) + time.perf_counter() - wall_start
+            self.cpu[name] = self.cpu.get(name, 0.0) + time.process_time() - cpu_start
+
+    def total(self):
+        """
+        Return the wall time of all the phases.
+
+        Returns
+        -------
+        float
+            Sum of the wall time of every phase.
+        """
+        return sum(self.wall.values())
+
+
+def time_mesh_case(num_y, num_x=5, repeats=5):
+    """
+    Time every phase of one mesh size of the convergence study several times.
+
+    Parameters
+    ----------
+    num_y : int
+        Number of spanwise mesh points.
+    num_x : int
+        Number of chordwise mesh points.
+    repeats : int
+        Number of independent runs.
+
+    Returns
+    -------
+    samples : dict
+        For each of "wall" and "cpu", an array of shape (repeats,) per phase.
+    """
+    # Imported here so hw3_mesh_study can use PhaseTimer without a circular import
+    from hw3_mesh_study import generate_study_mesh, build_mesh_problem
+
+    samples = {"wall": {name: [] for name in PHASES}, "cpu": {name: [] for name in PHASES}}
+
+    for _ in range(repeats):
+        timer = PhaseTimer()
+        with timer.phase("mesh"):
+            # Without the mesh cache, or every repeat after the first would time a cache hit
+            mesh = generate_study_mesh(num_y, num_x, cached=False)
+        with timer.phase("build"):
+            prob = build_mesh_problem(mesh)
+        with timer.phase("setup"):
+            prob.setup()
+        with timer.phase("final_setup"):
+            prob.final_setup()
+        with timer.phase("solve"):
+            prob.run_driver()
+        prob.cleanup()
+
+        for name in PHASES:
+            samples["wall"][name].append(timer.wall[name])
+            samples["cpu"][name].append(timer.cpu[name])
+
+    for clock in samples:
+        for name in PHASES:
+            samples[clock][name] = np.array(samples[clock][name])
+
+    return samples
+
+
+def summarize(times):
+    """
+    Return robust statistics of a set of timing samples.
+
+    Parameters
+    ----------
+    times : array_like
+        Timing samples in seconds.
+
+    Returns
+    -------
+    stats : dict
+        Median, minimum, maximum and interquartile range of the samples.
+    """
+    times = np.asarray(times, dtype=float)
+    q25, median, q75 = np.percentile(times, [25, 50, 75])
+    return {
+        "median": float(median),
+        "min": float(times.min()),
+        "max": float(times.max()),
+        "iqr": float(q75 - q25),
+    }
+
+
+def fit_scaling_exponent(num_y_values, times):
+    """
+    Fit time ~ C * num_y**p on a log-log scale.
+
+    Parameters
+    ----------
+    num_y_values : array_like
+        Mesh sizes.
+    times : array_like
+        Time (usually the median) of each mesh size.
+
+    Returns
+    -------
+    p : float
+        Exponent fitted to all the points.
+    local : np.ndarray
+        Exponent between each pair of consecutive mesh sizes, which shows
+        where the higher order cost starts to dominate.
+    """
+    log_n = np.log(np.asarray(num_y_values, dtype=float))
+    log_t = np.log(np.maximum(np.asarray(times, dtype=float), 1e-12))
+
+    p = np.polyfit(log_n, log_t, 1)[0]
+    local = np.diff(log_t) / np.diff(log_n)
+
+    return float(p), local
+
+
+def run_timing_study(num_y_values, num_x=5, repeats=5, output=TIMING_FILE):
+    """
+    Time every phase of the convergence study and fit its scaling with num_y.
+
+    The cases are run one after the other in this process, running them in
+    parallel would make the timings depend on the load of the machine.
+
+    Parameters
+    ----------
+    num_y_values : list of int
+        Spanwise mesh sizes to run.
+    num_x : int
+        Chordwise mesh size used for every case.
+    repeats : int
+        Number of runs of each mesh size.
+    output : str or None
+        JSON file where the results are written, skipped if None.
+
+    Returns
+    -------
+    report : dict
+        Statistics of each phase and mesh size and the fitted exponents.
+    """
+    report = {"num_y": list(num_y_values), "num_x": num_x, "repeats": repeats, "phases": {}}
+
+    stats = []
+    for num_y in num_y_values:
+        samples = time_mesh_case(num_y, num_x, repeats)
+        stats.append({
+            clock: {name: summarize(samples[clock][name]) for name in PHASES}
+            for clock in samples
+        })
+
+    for name in PHASES + ["total"]:
+        report["phases"][name] = {}
+        for clock in ["wall", "cpu"]:
+            if name == "total":
+                medians = [sum(s[clock][phase]["median"] for phase in PHASES) for s in stats]
+                per_case = None
+            else:
+                medians = [s[clock][name]["median"] for s in stats]
+                per_case = [s[clock][name] for s in stats]
+
+            entry = {"median": medians, "stats": per_case}
+            if len(num_y_values) > 1:
+                p, local = fit_scaling_exponent(num_y_values, medians)
+                entry["exponent"] = p
+                entry["local_exponents"] = local.tolist()
+            report["phases"][name][clock] = entry
+
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+def print_timing_report(report):
+    """
+    Print the median wall time of each phase and its scaling exponents.
+
+    Parameters
+    ----------
+    report : dict
+        Report returned by run_timing_study.
+    """
+    names = PHASES + ["total"]
+    print("%6s" % "num_y" + "".join("%13s" % name for name in names))
+    for i, num_y in enumerate(report["num_y"]):
+        row = [report["phases"][name]["wall"]["median"][i] for name in names]
+        print("%6d" % num_y + "".join("%13.4f" % t for t in row))
+
+    if len(report["num_y"]) > 1:
+        print("%6s" % "p" + "".join("%13.2f" % report["phases"][name]["wall"]["exponent"] for name in names))
+        print("\nLocal exponent of the wall time between consecutive mesh sizes:")
+        for name in names:
+            local = report["phases"][name]["wall"]["local_exponents"]
+            print("%12s: " % name + " ".join("%6.2f" % p for p in local))
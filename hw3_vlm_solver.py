@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Selectable linear solver of the VLM circulation system
+
+The circulations of the vortex lattice are the solution of the dense AIC
+system solved by SolveMatrix in the aero_states group of AeroPoint, which
+factorizes the matrix in solve_nonlinear and again in linearize.
+VLMSolveMatrix solves it with either
+
+    "direct": the LU factorization, computed once per matrix and reused by
+              linearize and by all the linear solves of a derivative
+              computation (reuse_factorization), or
+    "gmres":  restarted GMRES, preconditioned by the sparse LU of the band of
+              the matrix within band spanwise stations (the strongly coupled
+              neighbouring panels), warm started from the previous solution.
+              The preconditioner is also computed once per matrix.
+
+SolverAeroPoint is an AeroPoint with VLMSolveMatrix in its aero_states
+group, used by the wing builder with the "vlm_solver" entry of a case:
+
+    spec["vlm_solver"] = {"solver": "gmres", "band": 8}
+
+    python hw3_vlm_solver.py
+
+times the analysis and total derivatives of a wing case with every solver.
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse.linalg import LinearOperator, gmres, splu
+from openaerostruct.aerodynamics.aero_groups import AeroPoint
+from openaerostruct.aerodynamics.solve_matrix import SolveMatrix
+from openaerostruct.aerodynamics.states import VLMStates
+
+# Linear solvers of the circulation system
+VLM_SOLVERS = ("direct", "gmres")
+
+
+class VLMSolveMatrix(SolveMatrix):
+    """
+    Solve the AIC linear system with a direct or a preconditioned GMRES solver.
+
+    Same inputs, outputs and partials as SolveMatrix.
+    """
+
+    def initialize(self):
+        super().initialize()
+        self.options.declare("solver", default="direct", values=VLM_SOLVERS,
+                             desc="Linear solver of the circulation system")
+        self.options.declare("reuse_factorization", default=True, types=bool,
+                             desc="Factorize (or precondition) every matrix only once")
+        self.options.declare("band", default=8, types=int,
+                             desc="Spanwise stations of the band of the GMRES preconditioner")
+        self.options.declare("tol", default=1e-10, desc="Relative tolerance of GMRES")
+        self.options.declare("restart", default=50, types=int, desc="Restart of GMRES")
+        self.options.declare("maxiter", default=20, types=int, desc="Maximum GMRES restart cycles")
+
+    def setup(self):
+        super().setup()
+
+        # Surface and spanwise station of every panel, the panels are ordered
+        # spanwise first within each surface
+        surface_ids = []
+        stations = []
+        for i, surface in enumerate(self.options["surfaces"]):
+            nx, ny = surface["mesh"].shape[:2]
+            surface_ids.append(np.full((nx - 1) * (ny - 1), i))
+            stations.append(np.tile(np.arange(ny - 1), nx - 1))
+        surface_ids = np.concatenate(surface_ids)
+        stations = np.concatenate(stations)
+
+        band = (surface_ids[:, None] == surface_ids[None, :]) & \
+               (np.abs(stations[:, None] - stations[None, :]) <= self.options["band"])
+        self._band_rows, self._band_cols = np.nonzero(band)
+
+        self._factor = None
+        self._factor_mtx = None
+        self.num_factorizations = 0
+        self.gmres_iterations = 0
+        self.gmres_failures = 0
+
+    def _factorize(self, mtx):
+        """
+        Return the LU factorization (direct) or the preconditioner (gmres) of a matrix.
+        """
+        if self.options["reuse_factorization"] and self._factor is not None and \
+                np.array_equal(mtx, self._factor_mtx):
+            return self._factor
+
+        if self.options["solver"] == "direct":
+            self._factor = lu_factor(mtx)
+        else:
+            size = self.system_size
+            band = sp.csc_matrix((mtx[self._band_rows, self._band_cols], (self._band_rows, self._band_cols)),
+                                 shape=(size, size))
+            self._factor = splu(band)
+        self._factor_mtx = mtx.copy()
+        self.num_factorizations += 1
+        return self._factor
+
+    def _solve(self, mtx, rhs, trans=False, x0=None):
+        factor = self._factorize(mtx)
+        if self.options["solver"] == "direct":
+            return lu_solve(factor, rhs, trans=1 if trans else 0)
+
+        size = self.system_size
+        op = mtx.T if trans else mtx
+        precond = LinearOperator((size, size), matvec=lambda vec: factor.solve(vec, trans="T" if trans else "N"))
+
+        iterations = [0]
+
+        def count(_):
+            iterations[0] += 1
+
+        x, info = gmres(op, rhs, x0=x0, M=precond, rtol=self.options["tol"], atol=0.0,
+                        restart=self.options["restart"], maxiter=self.options["maxiter"],
+                        callback=count, callback_type="pr_norm")
+        self.gmres_iterations += iterations[0]
+        if info != 0:
+            # Not converged, fall back to the dense solve
+            self.gmres_failures += 1
+            x = np.linalg.solve(op, rhs)
+        return x
+
+    def solve_nonlinear(self, inputs, outputs):
+        outputs["circulations"] = self._solve(inputs["mtx"], inputs["rhs"], x0=outputs["circulations"].copy())
+        if self.options["solver"] == "direct":
+            self.lu = self._factor
+
+    def linearize(self, inputs, outputs, partials):
+        system_size = self.system_size
+        self._linear_mtx = inputs["mtx"].copy()
+        self._factorize(self._linear_mtx)
+        if self.options["solver"] == "direct":
+            self.lu = self._factor
+
+        partials["circulations", "circulations"] = inputs["mtx"].flatten()
+        partials["circulations", "mtx"] = np.outer(np.ones(system_size), outputs["circulations"]).flatten()
+
+    def solve_linear(self, d_outputs, d_residuals, mode):
+        if mode == "fwd":
+            d_outputs["circulations"] = self._solve(self._linear_mtx, d_residuals["circulations"])
+        else:
+            d_residuals["circulations"] = self._solve(self._linear_mtx, d_outputs["circulations"], trans=True)
+
+
+class SolverVLMStates(VLMStates):
+    """
+    VLMStates group solving the circulations with VLMSolveMatrix.
+    """
+
+    def initialize(self):
+        super().initialize()
+        self.options.declare("solve_options", default={}, types=dict,
+                             desc="Options of VLMSolveMatrix")
+
+    def add_subsystem(self, name, subsys, **kwargs):
+        if name == "solve_matrix":
+            subsys = VLMSolveMatrix(surfaces=self.options["surfaces"], **self.options["solve_options"])
+        return super().add_subsystem(name, subsys, **kwargs)
+
+
+class SolverAeroPoint(AeroPoint):
+    """
+    AeroPoint group solving the circulations with VLMSolveMatrix.
+
+    Only the incompressible VLMStates is replaced, with compressibility
+    corrections the group is the same as AeroPoint.
+    """
+
+    def initialize(self):
+        super().initialize()
+        self.options.declare("solve_options", default={}, types=dict,
+                             desc="Options of VLMSolveMatrix")
+
+    def add_subsystem(self, name, subsys, **kwargs):
+        if name == "aero_states" and type(subsys) is VLMStates:
+            linear_solver = subsys.linear_solver
+            subsys = SolverVLMStates(surfaces=subsys.options["surfaces"], rotational=subsys.options["rotational"],
+                                     solve_options=self.options["solve_options"])
+            subsys.linear_solver = linear_solver
+        return super().add_subsystem(name, subsys, **kwargs)
+
+
+def vlm_system(num_y, num_x=5):
+    """
+    Return the AIC system of the default wing case on a mesh.
+
+    Parameters
+    ----------
+    num_y : int
+        Spanwise mesh size.
+    num_x : int
+        Chordwise mesh size.
+
+    Returns
+    -------
+    surface : dict
+        Surface dictionary of the case.
+    mtx : numpy array
+        AIC matrix.
+    rhs : numpy array
+        Right-hand side.
+    """
+    from hw3_wing_builder import build_problem, build_surface, complete_spec, set_case_values, POINT_NAME
+
+    spec = complete_spec({"mesh": {"num_y": num_y, "num_x": num_x, "wing_type": "rect", "symmetry": True},
+                          "recorder": None})
+    prob = build_problem(spec, headless=True, snapshot=False)
+    prob.setup()
+    set_case_values(prob, spec)
+    prob.run_model()
+    mtx = prob.get_val(POINT_NAME + ".aero_states.mtx").copy()
+    rhs = prob.get_val(POINT_NAME + ".aero_states.rhs").copy()
+    prob.cleanup()
+    return build_surface(spec), mtx, rhs
+
+
+def benchmark_vlm_solvers(num_ys=(51, 101, 201, 301, 501), num_x=5, solvers=None, num_rhs=2, repeats=5):
+    """
+    Time the circulation solve of one optimization iteration with every solver.
+
+    An iteration is a solve_nonlinear, a linearize and num_rhs reverse
+    linear solves (one per response) of the circulation system, on the AIC
+    matrix of the default wing case. The rest of the model is the same for
+    every solver and is left out.
+
+    Parameters
+    ----------
+    num_ys : list of int
+        Spanwise mesh sizes.
+    num_x : int
+        Chordwise mesh size.
+    solvers : dict or None
+        Options of VLMSolveMatrix by label, None for the stock SolveMatrix
+        ("stock"), the direct and the gmres solvers.
+    num_rhs : int
+        Number of linear solves per iteration.
+    repeats : int
+        Number of timed iterations, the median is reported.
+
+    Returns
+    -------
+    results : list of dict
+        num_y, system size, solver label, median time per iteration, GMRES
+        iterations per solve and maximum relative error of the circulations
+        of every case.
+    """
+    import openmdao.api as om
+
+    if solvers is None:
+        solvers = {"stock": None, "direct": {"solver": "direct"}, "gmres": {"solver": "gmres"}}
+
+    rng = np.random.default_rng(0)
+    results = []
+    for num_y in num_ys:
+        surface, mtx, rhs = vlm_system(num_y, num_x)
+        exact = np.linalg.solve(mtx, rhs)
+        seeds = rng.standard_normal((num_rhs, len(rhs)))
+
+        for label, options in solvers.items():
+            prob = om.Problem(reports=False)
+            if options is None:
+                comp = SolveMatrix(surfaces=[surface])
+            else:
+                comp = VLMSolveMatrix(surfaces=[surface], **options)
+            prob.model.add_subsystem("solve_matrix", comp)
+            prob.setup()
+            prob.final_setup()
+
+            samples = []
+            error = 0.0
+            for i in range(repeats):
+                # New matrix every iteration, as in an optimization
+                inputs = {"mtx": mtx * (1.0 + 1e-3 * i), "rhs": rhs}
+                # Previous solution as the initial guess
+                outputs = {"circulations": exact.copy()}
+                start = time.perf_counter()
+                comp.solve_nonlinear(inputs, outputs)
+                comp.linearize(inputs, outputs, {})
+                for seed in seeds:
+                    d_residuals = {"circulations": None}
+                    comp.solve_linear({"circulations": seed}, d_residuals, "rev")
+                samples.append(time.perf_counter() - start)
+                error = max(error, np.max(np.abs(outputs["circulations"] * (1.0 + 1e-3 * i) - exact)) /
+                            np.max(np.abs(exact)))
+
+            iterations = getattr(comp, "gmres_iterations", 0)
+            results.append({
+                "num_y": num_y,
+                "system_size": len(rhs),
+                "solver": label,
+                "time": float(np.median(samples)),
+                "gmres_iterations": iterations / ((1.0 + num_rhs) * repeats),
+                "error": float(error),
+            })
+            prob.cleanup()
+
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    num_ys = [int(arg) for arg in sys.argv[1:]] or (51, 101, 201, 301, 501)
+    results = benchmark_vlm_solvers(num_ys)
+
+    print("%6s %6s %-8s %12s %10s %10s" % ("num_y", "size", "solver", "iteration", "GMRES it", "error"))
+    for result in results:
+        print("%6d %6d %-8s %10.4f s %10.1f %10.1e" % (
+            result["num_y"], result["system_size"], result["solver"], result["time"],
+            result["gmres_iterations"], result["error"]))
+
+    # Smallest system where GMRES beats the direct solve
+    for num_y in num_ys:
+        times = {result["solver"]: result["time"] for result in results if result["num_y"] == num_y}
+        if times["gmres"] < times["direct"]:
+            print("GMRES is faster than the direct solve from num_y = %d" % num_y)
+            break
+    else:
+        print("The direct solve is faster on all the meshes")
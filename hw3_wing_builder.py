@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+"""
+Assignment 3 - Wing case builder and pool of set-up problems
+
+ ========================================================================
+   Instituto Superior Técnico - Aircraft Optimal Design - 2023
+
+   96375 Filipe Valquaresma
+   filipevalquaresma@tecnico.ulisboa.pt
+
+   95782 Diogo Faustino
+   diogovicentefaustino@tecnico.ulisboa.pt
+ ========================================================================
+"""
+
+import copy
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+import openmdao.api as om
+from openaerostruct.geometry.geometry_group import Geometry
+from openaerostruct.aerodynamics.aero_groups import AeroPoint
+from hw3_async_recorder import AsyncRecorder
+from hw3_coloring import apply_total_coloring
+from hw3_geometry_cache import CachedGeometry, geometry_cache_supported
+from hw3_headless import new_problem, add_snapshot, is_headless
+from hw3_instrument import instrument_problem
+from hw3_mesh_cache import cached_generate_mesh, mesh_key
+from hw3_multipoint import ProcessAeroPoints
+from hw3_restart import warm_start
+from hw3_surrogate import SurrogateAeroPoint, complete_surrogate, initial_values, training_data
+from hw3_sweep_times_span import SweepTimesSpan, MeshSweepSpan
+from hw3_vlm_solver import SolverAeroPoint
+
+# Name of the analysis point of every case
+POINT_NAME = "aero_point_0"
+
+# Surface options shared by all the wing cases of the assignment
+DEFAULT_SURFACE = {
+    # Wing definition
+    "name": "wing",  # name of the surface
+    "symmetry": True,  # if true, model one half of wing reflected across the plane y = 0
+    "S_ref_type": "projected",  # how we compute the wing area, can be 'wetted' or 'projected'
+    "span": 11.0,
+    "root_chord": (16.2 / 11.0),
+    "fem_model_type": "tube",
+    # Aerodynamic performance of the lifting surface at an angle of attack of 0 (alpha=0).
+    # These CL0 and CD0 values are added to the CL and CD obtained from aerodynamic analysis of the surface
+    # to get the total CL and CD. These CL0 and CD0 values do not vary with alpha.
+    "CL0": 0.0,  # CL of the surface at alpha=0
+    "CD0": 0.015,  # CD of the surface at alpha=0
+    # Airfoil properties for viscous drag calculation
+    "k_lam": 0.05,  # percentage of chord with laminar flow, used for viscous drag
+    "t_over_c_cp": np.array([0.12, 0.08, 0.06, 0.06, 0.05, 0.05, 0.04, 0.04, 0.03, 0.03]),
+    # thickness over chord ratio (2412)
+    "c_max_t": 0.3,  # chordwise location of maximum (NACA2412) thickness
+    "with_viscous": True,  # if true, compute viscous drag
+    "with_wave": False,  # if true, compute wave drag
+}
+
+# Surface options that become inputs of the Geometry group. Only their size
+# is fixed at setup, their value is an initial value set on the set-up problem.
+GEOMETRY_INPUTS = ["twist_cp", "chord_cp", "t_over_c_cp", "xshear_cp", "yshear_cp", "zshear_cp",
+                   "sweep", "span", "dihedral", "taper"]
+
+# Units of the flight conditions
+FLIGHT_UNITS = {
+    "v": "m/s",
+    "alpha": "deg",
+    "rho": "kg/m**3",
+    "cg": "m",
+}
+
+# Default case: rectangular wing at the flight conditions of the assignment
+DEFAULT_SPEC = {
+    "mesh": {"num_y": 21, "num_x": 5, "wing_type": "rect", "symmetry": True},
+    "surface": {},
+    # https://aerotoolbox.com/atmcalc/ assuming T_offset = 0
+    "flight": {"v": 63.0, "alpha": 5.0, "rho": 1.00649, "cg": np.zeros(3)},
+    "design_vars": {},
+    "constraints": {},
+    "objective": {},
+    # Flight points of a multipoint case, [{"flight": {...}, "weight": w}, ...], each flight
+    # updating the default one. None for a single point with the flight conditions above
+    "points": None,
+    # How the points of a multipoint case run: "processes" in local worker processes (see
+    # hw3_multipoint), "mpi" in an om.ParallelGroup, in parallel under MPI (mpirun -n <number
+    # of points>) and in sequence otherwise
+    "point_execution": "processes",
+    # Number of worker processes of "processes", the number of cores if None (at most one per point)
+    "point_workers": None,
+    # Bounds of the SweepTimesSpan constraint, None to leave it out
+    "sweep_constraint": None,
+    "driver": {"optimizer": "SLSQP", "tol": 1e-9},
+    # Case recorder file of the driver, None for no recording
+    "recorder": "aero.db",
+    # "sqlite" for om.SqliteRecorder (read with om.CaseReader), "async" for an AsyncRecorder (unique
+    # file per problem and process, in its own format read by hw3_restart and hw3_columnar)
+    "recorder_type": "sqlite",
+    # Derivative mode of the problem: "auto" (from the design variable and response sizes), "fwd" or "rev"
+    "mode": "auto",
+    # Keyword arguments of approx_totals to approximate the total derivatives, e.g. {"method": "fd"}
+    # or {"method": "cs"}, None for the analytic derivatives of OpenAeroStruct
+    "approx_totals": None,
+    # Options of the VLMSolveMatrix solver of the circulations, e.g. {"solver": "gmres"},
+    # None for the SolveMatrix of OpenAeroStruct, see hw3_vlm_solver
+    "vlm_solver": None,
+    # Surrogate of the aerodynamic point trained from recorded cases, None for the real VLM,
+    # see hw3_surrogate
+    "surrogate": None,
+    # If True, use the cached total Jacobian coloring of the case, see hw3_coloring
+    "coloring": False,
+    # Prefix of the per-component call count and time reports written by every run_driver,
+    # None for no instrumentation, see hw3_instrument
+    "instrument": None,
+    # If True, the geometry group skips its solve and linearization when its inputs are
+    # unchanged (only with the OpenMDAO versions it supports), see hw3_geometry_cache
+    "geometry_cache": False,
+    # Restart from a recorded case: {"file": recorder file or glob pattern, "which": "last" or "best"}
+    "warm_start": None,
+}
+
+
+def complete_spec(spec):
+    """
+    Return a copy of a case specification with the missing entries taken from DEFAULT_SPEC.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact case specification, see DEFAULT_SPEC.
+
+    Returns
+    -------
+    dict
+        Full case specification.
+    """
+    full = copy.deepcopy(DEFAULT_SPEC)
+    for key, val in spec.items():
+        if key in ("mesh", "flight", "driver") and val is not None:
+            full[key].update(copy.deepcopy(val))
+        else:
+            full[key] = copy.deepcopy(val)
+    return full
+
+
+def build_surface(spec):
+    """
+    Return the OpenAeroStruct surface dictionary of a case.
+
+    Parameters
+    ----------
+    spec : dict
+        Full case specification.
+
+    Returns
+    -------
+    surface : dict
+        Surface dictionary, with the (cached) mesh of the case.
+    """
+    surface = copy.deepcopy(DEFAULT_SURFACE)
+    surface.update(spec["surface"])
+
+    mesh = cached_generate_mesh(spec["mesh"])
+    if isinstance(mesh, tuple):
+        # The CRM wing also returns its jig twist
+        mesh, twist_cp = mesh
+        surface.setdefault("twist_cp", np.array(twist_cp))
+    surface["mesh"] = mesh
+
+    return surface
+
+
+def _jsonable(val):
+    if isinstance(val, np.ndarray):
+        return val.tolist()
+    if isinstance(val, np.generic):
+        return val.item()
+    raise TypeError("Cannot serialize %r" % (val,))
+
+
+def setup_key(spec):
+    """
+    Return the key of the set-up problem of a case.
+
+    Two cases with the same key only differ in flight conditions and initial
+    values of the design variables, so they can share a set-up problem.
+
+    Parameters
+    ----------
+    spec : dict
+        Full case specification.
+
+    Returns
+    -------
+    str
+        Hexadecimal key of the case structure.
+    """
+    surface = {}
+    for name, val in spec["surface"].items():
+        if name in GEOMETRY_INPUTS:
+            surface[name] = list(np.shape(val))
+        else:
+            surface[name] = val
+
+    structure = {
+        "mesh": mesh_key(spec["mesh"]),
+        "surface": surface,
+        "flight": sorted(spec["flight"]),
+        "points": None if spec["points"] is None else
+        [{"flight": sorted(point.get("flight", {})), "weight": point_weight(spec, i)}
+         for i, point in enumerate(spec["points"])],
+        "point_execution": spec["point_execution"],
+        "point_workers": spec["point_workers"],
+        "design_vars": spec["design_vars"],
+        "constraints": spec["constraints"],
+        "objective": spec["objective"],
+        "sweep_constraint": spec["sweep_constraint"],
+        "driver": spec["driver"],
+        "recorder": spec["recorder"],
+        "recorder_type": spec["recorder_type"],
+        "mode": spec["mode"],
+        "approx_totals": spec["approx_totals"],
+        "vlm_solver": spec["vlm_solver"],
+        "surrogate": spec["surrogate"],
+        "coloring": spec["coloring"],
+        "instrument": spec["instrument"],
+        "geometry_cache": spec["geometry_cache"],
+    }
+    text = json.dumps(structure, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def point_weight(spec, i):
+    """
+    Return the objective weight of a flight point of a multipoint case, 1 / num_points by default.
+    """
+    return spec["points"][i].get("weight", 1.0 / len(spec["points"]))
+
+
+def point_flights(spec):
+    """
+    Return the analysis points of a case and their flight conditions.
+
+    Parameters
+    ----------
+    spec : dict
+        Full case specification.
+
+    Returns
+    -------
+    list of tuple
+        (name, flight conditions) of every point, POINT_NAME and the flight
+        conditions of the case for a single point case.
+    """
+    if spec["points"] is None:
+        return [(POINT_NAME, spec["flight"])]
+    flights = []
+    for i, point in enumerate(spec["points"]):
+        flight = dict(spec["flight"])
+        flight.update(point.get("flight", {}))
+        flights.append(("aero_point_%d" % i, flight))
+    return flights
+
+
+def _aero_point(spec, surface):
+    # Aero point group, which contains the actual aerodynamic analyses
+    if spec["vlm_solver"] is None:
+        return AeroPoint(surfaces=[surface])
+    return SolverAeroPoint(surfaces=[surface], solve_options=spec["vlm_solver"])
+
+
+def build_problem(spec, headless=None, snapshot=True):
+    """
+    Build the problem of a wing case, without setting it up.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification, see DEFAULT_SPEC.
+    headless : bool or None
+        If True, no reports are written, None to use the HW3_HEADLESS environment variable.
+    snapshot : bool
+        In headless mode, record a model snapshot for the N2 diagram, see hw3_headless.
+
+    Returns
+    -------
+    prob : om.Problem
+        Problem with the geometry, the aerodynamic point, the driver and the
+        design variables, constraints and objective of the case.
+    """
+    spec = complete_spec(spec)
+    surface = build_surface(spec)
+    name = surface["name"]
+
+    # Create the OpenMDAO problem
+    prob = new_problem(headless)
+
+    if spec["points"] is None:
+        # Create an independent variable component that will supply the flow conditions to the problem
+        indep_var_comp = om.IndepVarComp()
+        for var, val in spec["flight"].items():
+            indep_var_comp.add_output(var, val=val, units=FLIGHT_UNITS.get(var))
+        prob.model.add_subsystem("prob_vars", indep_var_comp, promotes=["*"])
+
+    # Points of a multipoint case in worker processes, each with its own geometry
+    processes = spec["points"] is not None and spec["point_execution"] == "processes"
+
+    if spec["surrogate"] is None and not processes:
+        # Create and add a group that handles the geometry for the aerodynamic lifting surface
+        if spec["geometry_cache"] and geometry_cache_supported():
+            geom_group = CachedGeometry(surface=surface)
+        else:
+            geom_group = Geometry(surface=surface)
+        prob.model.add_subsystem(name, geom_group)
+
+    if spec["surrogate"] is not None:
+        if spec["points"] is not None:
+            raise ValueError("The surrogate of the aero point does not support multipoint cases.")
+        if spec["sweep_constraint"] is not None:
+            raise ValueError("The surrogate of the aero point has no mesh for the sweep constraint.")
+
+        # Replace the geometry and the aero point by surrogates of the outputs of the point,
+        # fed directly by the flight conditions and geometry inputs they were trained on
+        options = complete_surrogate(spec["surrogate"])
+        x, y = training_data(options["files"], options["inputs"], options["outputs"],
+                             center=initial_values(spec, options["inputs"]), max_points=options["max_points"])
+        aero_group = SurrogateAeroPoint(point_name=POINT_NAME, inputs=options["inputs"], outputs=options["outputs"],
+                                        x=x, y=y, surrogate=options["surrogate"])
+        prob.model.add_subsystem(POINT_NAME, aero_group,
+                                 promotes_inputs=SurrogateAeroPoint.promotes_inputs(options["inputs"]))
+    elif spec["points"] is None:
+        flow_inputs = [var for var in ["v", "alpha", "rho", "cg"] if var in spec["flight"]]
+        prob.model.add_subsystem(POINT_NAME, _aero_point(spec, surface), promotes_inputs=flow_inputs)
+    elif processes:
+        if spec["sweep_constraint"] is not None:
+            raise ValueError("The points in worker processes have no mesh for the sweep constraint, "
+                             "use \"point_execution\": \"mpi\".")
+
+        # Multipoint case: the points only depend on the geometry inputs and their flight
+        # conditions, the inputs <point>.v, <point>.alpha, ..., so they are solved at the
+        # same time in worker processes
+        inputs, outputs = ProcessAeroPoints.promotes(spec)
+        prob.model.add_subsystem("points", ProcessAeroPoints(spec=spec, max_workers=spec["point_workers"]),
+                                 promotes_inputs=inputs, promotes_outputs=outputs)
+    else:
+        # Multipoint case: the points share the geometry and only depend on it, so they
+        # are solved in parallel under MPI (mpirun -n <number of points>), in sequence
+        # otherwise. Their flight conditions are the inputs <point>.v, <point>.alpha, ...
+        points = prob.model.add_subsystem("points", om.ParallelGroup(), promotes=["*"])
+        for point, flight in point_flights(spec):
+            points.add_subsystem(point, _aero_point(spec, surface))
+
+    if spec["points"] is not None:
+        for point, flight in point_flights(spec):
+            for var, val in flight.items():
+                prob.model.set_input_defaults(point + "." + var, val=val, units=FLIGHT_UNITS.get(var))
+
+        # Weighted C_D of the points, the objective of a multipoint case
+        terms = []
+        for i, (point, _) in enumerate(point_flights(spec)):
+            terms.append("%r*CD_%d" % (float(point_weight(spec, i)), i))
+        prob.model.add_subsystem("multipoint", om.ExecComp("CD_weighted = " + " + ".join(terms)),
+                                 promotes_outputs=["CD_weighted"])
+        for i, (point, _) in enumerate(point_flights(spec)):
+            prob.model.connect(point + ".wing_perf.CD", "multipoint.CD_%d" % i)
+
+    if spec["surrogate"] is None and not processes:
+        for point, _ in point_flights(spec):
+            # Connect the mesh from the geometry component to the analysis point, also with
+            # the modified names within the 'aero_states' group
+            prob.model.connect(name + ".mesh", point + "." + name + ".def_mesh")
+            prob.model.connect(name + ".mesh", point + ".aero_states." + name + "_def_mesh")
+            prob.model.connect(name + ".t_over_c", point + "." + name + "_perf." + "t_over_c")
+
+    if spec["sweep_constraint"] is not None:
+        # Add the SweepTimesSpan constraint component, fed by the sweep and span measured
+        # on the mesh of the geometry group
+        num_x, num_y = surface["mesh"].shape[:2]
+        prob.model.add_subsystem("sweep_geom", MeshSweepSpan(num_x=num_x, num_y=num_y,
+                                                             symmetry=surface["symmetry"]))
+        prob.model.add_subsystem("sweep_constraint", SweepTimesSpan(), promotes_outputs=["sweep_times_span"])
+        prob.model.connect(name + ".mesh", "sweep_geom.mesh")
+        prob.model.connect("sweep_geom.sweep", "sweep_constraint.sweep")
+        prob.model.connect("sweep_geom.span", "sweep_constraint.span")
+        prob.model.add_constraint("sweep_times_span", **spec["sweep_constraint"])
+
+    # Add the design variables, constraints, and objective to the problem
+    for var, options in spec["design_vars"].items():
+        prob.model.add_design_var(var, **options)
+    for var, options in spec["constraints"].items():
+        prob.model.add_constraint(var, **options)
+    for var, options in spec["objective"].items():
+        prob.model.add_objective(var, **options)
+
+    if spec["approx_totals"] is not None:
+        prob.model.approx_totals(**spec["approx_totals"])
+
+    # Set the Scipy Optimizer (SLSQP by default) as the driver of the problem
+    prob.driver = om.ScipyOptimizeDriver()
+    for option, val in spec["driver"].items():
+        prob.driver.options[option] = val
+
+    if spec["recorder"] is not None:
+        if spec["recorder_type"] == "async":
+            recorder = AsyncRecorder(spec["recorder"])
+        else:
+            recorder = om.SqliteRecorder(spec["recorder"])
+        prob.driver.add_recorder(recorder)
+        prob.driver.recording_options['record_derivatives'] = True
+        prob.driver.recording_options['includes'] = ['*']
+
+    if snapshot and is_headless(headless):
+        add_snapshot(prob)
+
+    return prob
+
+
+def uses_complex_step(spec):
+    """
+    Return True if a case approximates its total derivatives with complex step.
+
+    Parameters
+    ----------
+    spec : dict
+        Full case specification.
+
+    Returns
+    -------
+    bool
+        True if the problem must be set up with complex vectors.
+    """
+    return spec["approx_totals"] is not None and spec["approx_totals"].get("method") == "cs"
+
+
+def set_case_values(prob, spec):
+    """
+    Set the flight conditions and initial geometry of a case on a set-up problem.
+
+    Parameters
+    ----------
+    prob : om.Problem
+        Set-up problem of the case (or of a case with the same setup_key).
+    spec : dict
+        Full case specification.
+    """
+    name = spec["surface"].get("name", DEFAULT_SURFACE["name"])
+
+    if spec["points"] is None:
+        for var, val in spec["flight"].items():
+            prob.set_val(var, val, units=FLIGHT_UNITS.get(var))
+    else:
+        for point, flight in point_flights(spec):
+            for var, val in flight.items():
+                prob.set_val(point + "." + var, val, units=FLIGHT_UNITS.get(var))
+
+    # Every geometry input of the model is reset, also those the spec leaves at
+    # their defaults: a pooled problem still holds the values of its last run.
+    # Those missing from the surface get the value they were declared with.
+    surface = build_surface(spec)
+    names = {name + "." + var: var for var in GEOMETRY_INPUTS}
+    meta = prob.model.get_io_metadata(iotypes="input", metadata_keys=["val"], return_rel_names=False)
+    values = {}
+    for var_meta in meta.values():
+        var = names.get(var_meta["prom_name"])
+        if var is not None:
+            values[var_meta["prom_name"]] = surface[var] if var in surface else var_meta["val"]
+    for prom_name, val in values.items():
+        prob.set_val(prom_name, val)
+
+
+class ProblemPool(object):
+    """
+    Pool of set-up problems, keyed by the structure of the case.
+
+    A case that only changes the flight conditions or the initial values of
+    a previous case reuses its set-up problem instead of building it again.
+
+    Parameters
+    ----------
+    max_size : int
+        Maximum number of problems kept, the least recently used is dropped.
+    """
+
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self._problems = OrderedDict()
+
+    def get(self, spec):
+        """
+        Return a set-up problem of a case with its values set.
+
+        Parameters
+        ----------
+        spec : dict
+            Compact or full case specification, see DEFAULT_SPEC.
+
+        Returns
+        -------
+        prob : om.Problem
+            Set-up problem ready to run.
+        """
+        spec = complete_spec(spec)
+        key = setup_key(spec)
+
+        prob = self._problems.get(key)
+        if prob is None:
+            prob = build_problem(spec)
+            prob.setup(mode=spec["mode"], force_alloc_complex=uses_complex_step(spec))
+            set_case_values(prob, spec)
+            if spec["coloring"]:
+                apply_total_coloring(prob, key)
+            if spec["instrument"] is not None:
+                instrument_problem(prob, spec["instrument"])
+            self._problems[key] = prob
+            while len(self._problems) > self.max_size:
+                _, old = self._problems.popitem(last=False)
+                old.cleanup()
+        else:
+            self._problems.move_to_end(key)
+
+        set_case_values(prob, spec)
+        if spec["warm_start"] is not None:
+            warm_start(prob, spec["warm_start"]["file"], spec["warm_start"].get("which", "last"))
+        return prob
+
+    def clear(self):
+        """
+        Clean up and drop every problem of the pool.
+        """
+        for prob in self._problems.values():
+            prob.cleanup()
+        self._problems.clear()
+
+    def __len__(self):
+        return len(self._problems)
+
+
+_pool = ProblemPool()
+
+
+def build_case(spec):
+    """
+    Return the set-up problem of a case from the default pool.
+
+    Parameters
+    ----------
+    spec : dict
+        Compact or full case specification, see DEFAULT_SPEC.
+
+    Returns
+    -------
+    prob : om.Problem
+        Set-up problem ready to run.
+    """
+    return _pool.get(spec)
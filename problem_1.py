@@ -1,17 +1,12 @@
 import openmdao.api as om
 from openmdao.devtools import iprofile as tool
-import sympy as sym
+from hw3_symbolic import load_symbolic
 
-#Derivatives of multivariable function
+#Derivatives of multivariable function (sympy only runs the first time, the result is cached on disk)
 
-x , y = sym.symbols('x y')
-f = (1 - x)**2 + 100*(y - x**2)**2
+rosenbrock = load_symbolic('(1 - x)**2 + 100*(y - x**2)**2', ['x', 'y'])
 
-#Differentiating partially w.r.t x
-derivative_x = f.diff(x)
-derivative_y = f.diff(y)
-
-print('f\' wrt x =', derivative_x, '\nf\' wrt y =', derivative_y)
+print('f\' wrt x =', rosenbrock.DERIVATIVES['x'], '\nf\' wrt y =', rosenbrock.DERIVATIVES['y'])
 
 class Rosenbrock(om.ExplicitComponent):
     def setup(self):
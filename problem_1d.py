@@ -1,6 +1,6 @@
 import openmdao.api as om
 from openmdao.devtools import iprofile as tool
-import sympy as sym
+from hw3_symbolic import SymbolicComp
 
 class Paraboloid(om.ExplicitComponent):
     def setup(self):
@@ -36,29 +36,11 @@ class constraint(om.ExplicitComponent):
 
         outputs['g_xy'] = x + y
 
-class Paraboloid_analytical(om.ExplicitComponent):
-
-    def setup(self):
-        self.add_input('x', val=0.0)
-        self.add_input('y', val=0.0)
-
-        self.add_output('f_xy', val=0.0)
-
-    def setup_partials(self):
-        # Finite difference all partials.
-        self.declare_partials(of='f_xy', wrt=['x','y'], method='exact')
-
-    def compute(self, inputs, outputs):
-        x = inputs['x']
-        y = inputs['y']
-
-        outputs['f_xy'] = (1 - x)**2 + 100*(y - x**2)**2
-
-    def compute_partials(self, inputs, partials):
-        x=inputs['x']
-        y=inputs['y']
-        partials['f_xy', 'x'] = -400*x*(-x**2 + y) + 2*x - 2
-        partials['f_xy', 'y'] = -200*x**2 + 200*y
+class Paraboloid_analytical(SymbolicComp):
+    # Exact partials generated from the expression (sympy only runs the first time, the result is cached on disk)
+    EXPR = '(1 - x)**2 + 100*(y - x**2)**2'
+    INPUTS = ['x', 'y']
+    OUTPUT = 'f_xy'
 
 #methods = [('*compute*', (Paraboloid,Paraboloid_analytical)),('*constraint*', (constraint,))]
 #tool.setup(methods=methods)
@@ -2,7 +2,7 @@ import numpy as np
 
 import openmdao.api as om
 
-from openaerostruct.geometry.utils import generate_mesh
+from hw3_mesh_cache import cached_generate_mesh
 from openaerostruct.geometry.geometry_group import Geometry
 from openaerostruct.aerodynamics.aero_groups import AeroPoint
 
@@ -10,7 +10,7 @@ from openaerostruct.aerodynamics.aero_groups import AeroPoint
 mesh_dict = {"num_y": 7, "num_x": 2, "wing_type": "CRM", "symmetry": True, "num_twist_cp": 5}
 
 # Generate the aerodynamic mesh based on the previous dictionary
-mesh, twist_cp = generate_mesh(mesh_dict)
+mesh, twist_cp = cached_generate_mesh(mesh_dict)
 # Create a dictionary with info and options about the aerodynamic
 # lifting surface
 surface = {